@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from scheduler import Overloaded
+
+
+def length_buckets(lengths: List[int], token_budget: int, max_batch_size: int) -> List[List[int]]:
+    """Group indices sorted by length so each group's padded size fits the token budget"""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    buckets = []
+    current = []
+    for idx in order:
+        padded_tokens = (len(current) + 1) * lengths[idx]
+        if current and (padded_tokens > token_budget or len(current) >= max_batch_size):
+            buckets.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+class MicroBatcher:
+    """Coalesces concurrent single requests into one batched model call.
+
+    Callers ``await submit(item)``; a collector task waits for the first
+    item, keeps collecting until ``max_batch_size`` items are queued or
+    ``window_ms`` has passed, runs ``handler(items)`` once through ``run``
+    (a worker thread by default) and resolves every caller's future with
+    its own result. When ``max_queue_size`` items are already waiting,
+    ``submit`` raises ``Overloaded`` instead of queueing.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        window_ms: float = 5.0,
+        name: str = "batcher",
+        history_size: int = 2048,
+        max_queue_size: int = 0,
+        run: Optional[Callable[[Callable, List[Any]], Awaitable[List[Any]]]] = None,
+        retry_after: float = 1.0,
+    ):
+        self.handler = handler
+        self.run = run
+        self.max_queue_size = max_queue_size
+        self.retry_after = retry_after
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.name = name
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._batch_sizes = deque(maxlen=history_size)
+        self._queue_waits_ms = deque(maxlen=history_size)
+        self._batch_durations_ms = deque(maxlen=history_size)
+        self._total_batches = 0
+        self._total_items = 0
+        self._total_errors = 0
+        self._total_rejected = 0
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name=self.name)
+        logging.info(
+            f"[{self.name}] started: max_batch_size={self.max_batch_size}, "
+            f"window_ms={self.window * 1000:.1f}"
+        )
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} is shutting down"))
+
+    async def submit(self, item: Any) -> Any:
+        if self._queue is None:
+            raise RuntimeError(f"{self.name} is not started")
+        if self.max_queue_size and self._queue.qsize() >= self.max_queue_size:
+            self._total_rejected += 1
+            raise Overloaded(self.name, self.retry_after)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self._queue_waits_ms.append((started - enqueued) * 1000)
+
+            items = [item for item, _, _ in batch]
+            try:
+                if self.run is not None:
+                    results = await self.run(self.handler, items)
+                else:
+                    results = await loop.run_in_executor(None, self.handler, items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name}: handler returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                self._total_errors += 1
+                logging.exception(f"[{self.name}] batch of {len(items)} failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self._batch_sizes.append(len(items))
+                self._batch_durations_ms.append((time.perf_counter() - started) * 1000)
+                self._total_batches += 1
+                self._total_items += len(items)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        def summary(values):
+            if not values:
+                return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+            arr = np.fromiter(values, dtype=np.float64)
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            return {
+                "mean": round(float(arr.mean()), 3),
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(arr.max()), 3),
+            }
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "total_rejected": self._total_rejected,
+            "total_batches": self._total_batches,
+            "total_items": self._total_items,
+            "total_errors": self._total_errors,
+            "avg_batch_size": round(self._total_items / self._total_batches, 3) if self._total_batches else 0.0,
+            "batch_size": summary(self._batch_sizes),
+            "queue_wait_ms": summary(self._queue_waits_ms),
+            "batch_duration_ms": summary(self._batch_durations_ms),
+        }
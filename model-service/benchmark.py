@@ -0,0 +1,304 @@
+"""Inference benchmark for model-service.
+
+Drives predict_sentiment / predict_topics in-process and/or the HTTP
+endpoints with real scraped reviews (parser/banki_ru/gazprombank_reviews.csv,
+parser/ready_xlsx_10241.xlsx) or synthetic Russian text when those files
+are missing, sweeping batch sizes and text lengths. Results are printed as
+JSON (or written with --output) so runs can be compared across commits.
+
+    python benchmark.py inproc --batch-sizes 1,8,32,128 --lengths 16,64,256
+    python benchmark.py http --url http://localhost:3002 --concurrency 16
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_CORPORA = [
+    os.path.join(REPO_ROOT, "parser", "banki_ru", "gazprombank_reviews.csv"),
+    os.path.join(REPO_ROOT, "parser", "ready_xlsx_10241.xlsx"),
+]
+
+SKIP_PUBLISH_HEADER = "X-Skip-Publish"
+
+SYNTHETIC_VOCAB = (
+    "банк карта кэшбек приложение перевод вклад ипотека кредит отделение банкомат комиссия "
+    "поддержка оператор очередь сотрудник деньги счет процент ставка лимит страховка зарплата "
+    "быстро удобно долго плохо хорошо отлично ужасно вежливо грубо непонятно вернули списали "
+    "одобрили отказали заблокировали позвонили ответили обещали рекомендую разочарован доволен"
+).split()
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS за всё время жизни процесса"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def current_rss_mb() -> Optional[float]:
+    """Текущий RSS процесса (Linux, /proc); None, если недоступен"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def rss_metrics(before: Optional[float], after: Optional[float]) -> dict:
+    if before is None or after is None:
+        return {}
+    return {"rss_mb_before": round(before, 1), "rss_mb_after": round(after, 1), "rss_mb_delta": round(after - before, 1)}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def load_corpus(paths: List[str], limit: int) -> List[str]:
+    texts = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            import pandas as pd
+
+            df = pd.read_excel(path) if path.endswith((".xlsx", ".xls")) else pd.read_csv(path)
+        except Exception as e:
+            print(f"Skipping corpus {path}: {e}", file=sys.stderr)
+            continue
+        column = df["text"].dropna().astype(str)
+        texts.extend(t for t in column if t.strip())
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def synthetic_corpus(size: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(SYNTHETIC_VOCAB) for _ in range(rng.randint(5, 200))).capitalize() + "."
+        for _ in range(size)
+    ]
+
+
+def shape_texts(corpus: List[str], words: int, count: int, rng: random.Random) -> List[str]:
+    """Тексты длиной ровно ``words`` слов, склеенные из отзывов корпуса"""
+    result = []
+    for _ in range(count):
+        tokens = []
+        while len(tokens) < words:
+            tokens.extend(rng.choice(corpus).split())
+        result.append(" ".join(tokens[:words]))
+    return result
+
+
+def summarize(latencies_ms: List[float], items: int, elapsed: float) -> Dict[str, float]:
+    arr = np.asarray(latencies_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {
+        "calls": len(latencies_ms),
+        "items": items,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_items_per_s": round(items / elapsed, 2) if elapsed else 0.0,
+        "latency_ms_p50": round(float(p50), 3),
+        "latency_ms_p95": round(float(p95), 3),
+        "latency_ms_p99": round(float(p99), 3),
+        "latency_ms_mean": round(float(arr.mean()), 3),
+    }
+
+
+def bench_callable(fn: Callable[[List[str]], object], texts: List[str], batch_size: int, warmup: int) -> dict:
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    for batch in batches[:warmup]:
+        fn(batch)
+
+    latencies = []
+    started = time.perf_counter()
+    for batch in batches:
+        call_started = time.perf_counter()
+        fn(batch)
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    return summarize(latencies, len(texts), time.perf_counter() - started)
+
+
+def run_inproc(args, corpus: List[str]) -> List[dict]:
+    # Кэш выключен, иначе повторяющиеся тексты мерили бы кэш, а не модель
+    os.environ["PREDICTION_CACHE_ENABLED"] = "false"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import server
+
+    load_started = time.perf_counter()
+    server.load_models(warm=True)
+    load_s = time.perf_counter() - load_started
+    if server.sentiment_model is None:
+        raise SystemExit("Sentiment model failed to load, see log above")
+
+    targets = {
+        "predict_sentiment": server.predict_sentiment,
+        "predict_topics": server.predict_topics,
+    }
+    rng = random.Random(args.seed)
+    results = []
+    for words in args.lengths:
+        texts = shape_texts(corpus, words, args.items, rng)
+        for batch_size in args.batch_sizes:
+            for name in args.targets:
+                if name not in targets:
+                    continue
+                # Пиковый RSS процесса копится с начала прогона, поэтому по конфигурации — текущий до/после
+                rss_before = current_rss_mb()
+                metrics = bench_callable(targets[name], texts, batch_size, args.warmup)
+                results.append({
+                    "mode": "inproc",
+                    "target": name,
+                    "backend": server.sentiment_backend.name,
+                    "text_words": words,
+                    "batch_size": batch_size,
+                    **metrics,
+                    **rss_metrics(rss_before, current_rss_mb()),
+                })
+                print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+    results.append({"mode": "inproc", "target": "load_models", "elapsed_s": round(load_s, 3)})
+    return results
+
+
+def run_http(args, corpus: List[str]) -> List[dict]:
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+
+    session = requests.Session()
+    # Результаты бенчмарка не должны попадать в processed_data
+    session.headers[SKIP_PUBLISH_HEADER] = "1"
+    adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount("http://", adapter)
+
+    def post(path: str, payload: dict):
+        call_started = time.perf_counter()
+        resp = session.post(f"{args.url}{path}", json=payload, timeout=args.timeout)
+        return (time.perf_counter() - call_started) * 1000, resp.status_code != 200
+
+    def drive(path: str, payloads: List[dict], items: int, concurrency: int) -> dict:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda payload: post(path, payload), payloads))
+        metrics = summarize([o[0] for o in outcomes], items, time.perf_counter() - started)
+        metrics["errors"] = sum(o[1] for o in outcomes)
+        return metrics
+
+    rng = random.Random(args.seed)
+    results = []
+    for words in args.lengths:
+        texts = shape_texts(corpus, words, args.items, rng)
+
+        if "predict_single" in args.targets:
+            payloads = [{"text": text} for text in texts]
+            results.append({
+                "mode": "http",
+                "target": "/predict_single",
+                "text_words": words,
+                "concurrency": args.concurrency,
+                **drive("/predict_single", payloads, len(texts), args.concurrency),
+            })
+            print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+
+        if "predict" in args.targets:
+            for batch_size in args.batch_sizes:
+                payloads = [
+                    {"data": [{"id": i + j, "text": t} for j, t in enumerate(texts[i:i + batch_size])]}
+                    for i in range(0, len(texts), batch_size)
+                ]
+                results.append({
+                    "mode": "http",
+                    "target": "/predict",
+                    "text_words": words,
+                    "batch_size": batch_size,
+                    "concurrency": 1,
+                    **drive("/predict", payloads, len(texts), 1),
+                })
+                print(json.dumps(results[-1], ensure_ascii=False), file=sys.stderr)
+
+    try:
+        results.append({"mode": "http", "target": "/stats", "stats": session.get(f"{args.url}/stats", timeout=10).json()})
+    except Exception as e:
+        print(f"Failed to fetch /stats: {e}", file=sys.stderr)
+    return results
+
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="model-service inference benchmark")
+    parser.add_argument("mode", choices=["inproc", "http", "all"])
+    parser.add_argument("--url", default="http://localhost:3002")
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 8, 32, 128])
+    parser.add_argument("--lengths", type=int_list, default=[16, 64, 256], help="длина текстов в словах")
+    parser.add_argument("--items", type=int, default=512, help="текстов на каждую комбинацию")
+    parser.add_argument("--targets", default="predict_sentiment,predict_topics,predict_single,predict")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--corpus", action="append", help="CSV/XLSX с колонкой text (по умолчанию — данные парсеров)")
+    parser.add_argument("--corpus-limit", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="путь для JSON-отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+    args.targets = [t.strip() for t in args.targets.split(",")]
+
+    corpus = load_corpus(args.corpus or DEFAULT_CORPORA, args.corpus_limit)
+    corpus_source = "files"
+    if not corpus:
+        corpus = synthetic_corpus(2000, args.seed)
+        corpus_source = "synthetic"
+
+    results = []
+    if args.mode in ("inproc", "all"):
+        results.extend(run_inproc(args, corpus))
+    if args.mode in ("http", "all"):
+        results.extend(run_http(args, corpus))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {"source": corpus_source, "size": len(corpus)},
+        "config": {
+            "mode": args.mode,
+            "batch_sizes": args.batch_sizes,
+            "lengths": args.lengths,
+            "items": args.items,
+            "concurrency": args.concurrency,
+            "targets": args.targets,
+        },
+        "results": results,
+        "process_peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""Offline bulk scoring of review files.
+
+Streams CSV, XLSX, JSONL or Parquet input (e.g. the files the parsers write
+via save_results) in chunks of --chunk-size rows, scores every chunk with
+the in-process model functions in --workers forked processes and writes one
+part file per chunk (Parquet or JSONL) into the output directory. Memory
+stays bounded by chunk size x in-flight chunks regardless of input size.
+
+Progress is recorded in <output>/_checkpoint.json after each chunk is
+written (and, with --kafka, confirmed by the broker), in input order, so a
+crashed run restarted with the same arguments resumes from the first chunk
+that wasn't completed.
+
+    python bulk_score.py ../parser/banki_ru/gazprombank_reviews.csv scored/ --format parquet --workers 4
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+
+CHECKPOINT_NAME = "_checkpoint.json"
+INPUT_FORMATS = ("csv", "xlsx", "jsonl", "parquet")
+OUTPUT_FORMATS = ("parquet", "jsonl")
+
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    fmt = {"xls": "xlsx", "ndjson": "jsonl", "pq": "parquet"}.get(ext, ext)
+    if fmt not in INPUT_FORMATS:
+        raise ValueError(f"Unsupported input format '{ext}', expected one of {INPUT_FORMATS}")
+    return fmt
+
+
+def iter_rows(path: str, fmt: str) -> Iterator[dict]:
+    if fmt == "csv":
+        csv.field_size_limit(sys.maxsize)
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "xlsx":
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name) if name is not None else f"column_{i}" for i, name in enumerate(next(rows, []))]
+            for values in rows:
+                yield dict(zip(header, values))
+        finally:
+            workbook.close()
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=10000):
+            yield from batch.to_pylist()
+
+
+def iter_chunks(path: str, fmt: str, chunk_size: int) -> Iterator[List[dict]]:
+    rows = iter_rows(path, fmt)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def input_fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return hashlib.sha256(f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def load_checkpoint(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def source_types(path: str, fmt: str) -> dict:
+    """Типы исходных колонок Parquet-входа; даты и время пишутся строками (см. _plain)"""
+    if fmt != "parquet":
+        return {}
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    return {
+        field.name: pa.string() if pa.types.is_temporal(field.type) else field.type
+        for field in pq.read_schema(path)
+    }
+
+
+def part_schema(rows: List[dict], types: dict):
+    """Явная схема part-файла: одинаковые типы во всех частях, даже если колонка в чанке пустая.
+
+    Исходные колонки берут тип из Parquet-входа, остальные (CSV, XLSX, JSONL)
+    пишутся строками; колонки разметки имеют фиксированные типы.
+    """
+    import pyarrow as pa
+
+    scored = {
+        "sentiment": pa.int64(),
+        "sentiment_label": pa.string(),
+        "sentiment_proba": pa.list_(pa.float64()),
+        "sentiment_stage": pa.string(),
+        "tags": pa.list_(pa.string()),
+        "tag_scores": pa.list_(pa.float64()),
+    }
+    columns = list(dict.fromkeys(key for row in rows for key in row if key not in scored))
+    return pa.schema(
+        [pa.field(name, types.get(name, pa.string())) for name in columns]
+        + [pa.field(name, type_) for name, type_ in scored.items()]
+    )
+
+
+def write_part(rows: List[dict], path: str, fmt: str, types: Optional[dict] = None):
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = part_schema(rows, types or {})
+        text_columns = [field.name for field in schema if pa.types.is_string(field.type)]
+        rows = [{**row, **{name: _as_text(row.get(name)) for name in text_columns}} for row in rows]
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), tmp, compression="zstd")
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, default=str))
+                f.write("\n")
+    os.replace(tmp, path)
+
+
+# Состояние воркер-процесса: модели загружены в родителе до fork и делятся copy-on-write
+_server = None
+_options = None
+
+
+def _init_worker(threads: int):
+    if _server.sentiment_backend is not None:
+        _server.sentiment_backend.set_num_threads(threads)
+
+
+def score_chunk(index: int, rows: List[dict]) -> dict:
+    """Размечает чанк, пишет part-файл и (опционально) публикует в Kafka"""
+    started = time.perf_counter()
+    text_column = _options["text_column"]
+    scored = [i for i, row in enumerate(rows) if isinstance(row.get(text_column), str) and row[text_column].strip()]
+    texts = [rows[i][text_column] for i in scored]
+
+    output = [{k: _plain(v) for k, v in row.items()} for row in rows]
+    for row in output:
+        row.update(
+            sentiment=None, sentiment_label=None, sentiment_proba=None, sentiment_stage=None, tags=None, tag_scores=None
+        )
+    if texts:
+        preds, probs, topics_batch, topic_scores_batch, stages = _server.predict_texts(texts)
+        for i, pred, prob, topics, topic_scores, stage in zip(scored, preds, probs, topics_batch, topic_scores_batch, stages):
+            output[i].update(
+                sentiment=int(pred),
+                sentiment_label=_server.map_sentiment_to_text(int(pred)),
+                sentiment_proba=[round(float(p), 4) for p in prob],
+                sentiment_stage=stage,
+                tags=topics,
+                tag_scores=topic_scores,
+            )
+
+    part = os.path.join(_options["output"], f"part-{index:06d}.{_options['output_format']}")
+    write_part(output, part, _options["output_format"], _options["source_types"])
+
+    if _options["kafka"] and texts:
+        from producer import build_message_batch
+
+        messages = [
+            {
+                "text": row[text_column],
+                "date": row.get(_options["date_column"]) or datetime.now().astimezone().isoformat(),
+                "sentiment": row["sentiment"],
+                "tags": row["tags"],
+                "source": row.get("source"),
+            }
+            for row in (output[i] for i in scored)
+        ]
+        if build_message_batch(messages, wait=True)["status"] != "ok":
+            raise RuntimeError(f"Kafka publish of chunk {index} failed")
+
+    return {"index": index, "rows": len(rows), "scored": len(texts), "seconds": time.perf_counter() - started}
+
+
+def main():
+    global _server, _options
+
+    parser = argparse.ArgumentParser(description="Offline bulk scoring of review files")
+    parser.add_argument("input", help="CSV / XLSX / JSONL / Parquet")
+    parser.add_argument("output", help="каталог для part-файлов и чекпоинта")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="parquet")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--date-column", default="date")
+    parser.add_argument("--kafka", action="store_true", help="публиковать результаты в processed_data")
+    parser.add_argument("--restart", action="store_true", help="игнорировать существующий чекпоинт")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    fmt = args.input_format or detect_format(args.input)
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = os.path.join(args.output, CHECKPOINT_NAME)
+    fingerprint = input_fingerprint(args.input)
+    checkpoint = {} if args.restart else load_checkpoint(checkpoint_path)
+    if checkpoint and (
+        checkpoint.get("fingerprint") != fingerprint
+        or checkpoint.get("chunk_size") != args.chunk_size
+        or checkpoint.get("output_format") != args.output_format
+    ):
+        raise SystemExit(
+            f"{checkpoint_path} belongs to another input, chunk size or output format; "
+            f"use --restart or another output directory"
+        )
+    if checkpoint.get("done"):
+        logging.info(f"Nothing to do: {args.input} is already scored into {args.output}")
+        return 0
+    checkpoint = checkpoint or {
+        "input": os.path.abspath(args.input),
+        "fingerprint": fingerprint,
+        "chunk_size": args.chunk_size,
+        "output_format": args.output_format,
+        "next_chunk": 0,
+        "rows_done": 0,
+        "done": False,
+    }
+    start_chunk = checkpoint["next_chunk"]
+    if start_chunk:
+        logging.info(f"Resuming from chunk {start_chunk} ({checkpoint['rows_done']} rows already scored)")
+
+    # Как в serve.py: модели грузятся один раз до fork, torch в мастере однопоточный
+    from cpu_topology import available_cores
+
+    cores = available_cores()
+    workers = max(1, args.workers)
+    import torch
+    torch.set_num_threads(1)
+    os.environ.setdefault("PREDICTION_CACHE_ENABLED", "false")
+    import server
+
+    server.load_models(warm=False)
+    if server.sentiment_model is None:
+        logging.error("Sentiment model failed to load")
+        return 1
+    _server = server
+    _options = {
+        "text_column": args.text_column,
+        "date_column": args.date_column,
+        "output": args.output,
+        "output_format": args.output_format,
+        "source_types": source_types(args.input, fmt) if args.output_format == "parquet" else {},
+        "kafka": args.kafka,
+    }
+
+    started = time.perf_counter()
+    rows_this_run = 0
+    context = multiprocessing.get_context("fork")
+    with context.Pool(workers, initializer=_init_worker, initargs=(max(1, cores // workers),)) as pool:
+        pending = deque()
+        chunks = enumerate(iter_chunks(args.input, fmt, args.chunk_size))
+        for index, rows in itertools.islice(chunks, start_chunk, None):
+            pending.append(pool.apply_async(score_chunk, (index, rows)))
+            # Не больше двух чанков в работе на воркер — память не растёт с размером входа
+            while len(pending) >= workers * 2:
+                rows_this_run += _complete(pending.popleft().get(), checkpoint, checkpoint_path)
+                _report(checkpoint, rows_this_run, started)
+        while pending:
+            rows_this_run += _complete(pending.popleft().get(), checkpoint, checkpoint_path)
+            _report(checkpoint, rows_this_run, started)
+
+    checkpoint["done"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    elapsed = time.perf_counter() - started
+    summary = {
+        "input": args.input,
+        "output": args.output,
+        "rows": checkpoint["rows_done"],
+        "rows_this_run": rows_this_run,
+        "chunks": checkpoint["next_chunk"],
+        "workers": workers,
+        "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(rows_this_run / elapsed, 1) if elapsed else 0.0,
+    }
+    print(json.dumps(summary, ensure_ascii=False))
+    return 0
+
+
+def _complete(result: dict, checkpoint: dict, checkpoint_path: str) -> int:
+    checkpoint["next_chunk"] = result["index"] + 1
+    checkpoint["rows_done"] += result["rows"]
+    save_checkpoint(checkpoint_path, checkpoint)
+    return result["rows"]
+
+
+def _report(checkpoint: dict, rows_this_run: int, started: float):
+    elapsed = time.perf_counter() - started
+    logging.info(
+        f"chunk {checkpoint['next_chunk']}: {checkpoint['rows_done']} rows total, "
+        f"{rows_this_run / elapsed:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста перед хэшированием: NFC + схлопывание пробелов"""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def artifacts_fingerprint(paths: Sequence[str]) -> str:
+    """Fingerprint of model artifacts built from file names, sizes and mtimes"""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    digest.update(f"{os.path.relpath(full, path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+        elif os.path.exists(path):
+            st = os.stat(path)
+            digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns};".encode())
+        else:
+            digest.update(f"{path}:missing;".encode())
+    return digest.hexdigest()[:16]
+
+
+class _DiskTier:
+    """SQLite-backed shared tier, safe to open from several worker processes.
+
+    The connection is opened lazily and dropped in forked children, so a
+    tier created before a fork is never shared with the workers.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = None
+        os.register_at_fork(after_in_child=self._after_fork)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_cache ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, value BLOB NOT NULL, "
+            "size INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS prediction_cache_expires ON prediction_cache (expires_at)")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM prediction_cache WHERE expires_at > ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})",
+                    [now, *chunk],
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def set_many(self, rows: List[tuple]):
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prediction_cache (key, fingerprint, value, size, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+
+    def purge_versions(self, fingerprint: str) -> int:
+        """Удаляет записи других версий моделей (вызывается только при смене fingerprint)"""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM prediction_cache WHERE fingerprint != ?", (fingerprint,)
+            ).rowcount
+
+    def trim(self) -> int:
+        """Удаляет просроченные записи и самые старые сверх лимита размера"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM prediction_cache WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM prediction_cache").fetchone()[0]
+            if total > self.max_bytes:
+                overflow = total - self.max_bytes
+                removed += self._conn.execute(
+                    "DELETE FROM prediction_cache WHERE key IN ("
+                    "SELECT key FROM (SELECT key, size, SUM(size) OVER "
+                    "(ORDER BY expires_at ROWS UNBOUNDED PRECEDING) AS running FROM prediction_cache) "
+                    "WHERE running - size < ?)",
+                    (overflow,),
+                ).rowcount
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM prediction_cache"
+            ).fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+class PredictionCache:
+    """Content-addressed LRU/TTL cache for per-text model outputs.
+
+    Keys are sha256(fingerprint, namespace, normalized text); values must be
+    JSON-serializable. The in-process tier is bounded by ``max_bytes``; an
+    optional SQLite tier at ``disk_path`` is shared by every worker on the
+    host.
+
+    The fingerprint belongs to the models the process actually loaded: the
+    loader computes it from the artifacts before reading them and passes it
+    to bind(). Until then the cache is bypassed. Artifacts are never
+    re-checked on the request path, so results of the loaded models are
+    never stored under the fingerprint of files that changed on disk later.
+    Expired and over-limit disk rows are trimmed by a background thread
+    (start_maintenance), not by requests.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 1024 * 1024 * 1024,
+        maintenance_interval: float = 60.0,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.maintenance_interval = maintenance_interval
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        self.fingerprint: Optional[str] = None
+        self._maintenance_stop = threading.Event()
+        self._maintenance_thread: Optional[threading.Thread] = None
+
+        self._disk = None
+        if disk_path:
+            try:
+                self._disk = _DiskTier(disk_path, disk_max_bytes)
+            except Exception as e:
+                logging.warning(f"Prediction cache disk tier disabled ({disk_path}): {e}")
+                self._disk = None
+
+    def bind(self, fingerprint: str):
+        """Привязывает кэш к загруженным моделям; при смене версии сбрасывает память и чистит диск"""
+        with self._lock:
+            if fingerprint == self.fingerprint:
+                return
+            if self.fingerprint is not None:
+                logging.info(f"Models changed ({self.fingerprint} -> {fingerprint}), invalidating prediction cache")
+                self.invalidations += 1
+            self.fingerprint = fingerprint
+            self._entries.clear()
+            self._bytes = 0
+        if self._disk is not None:
+            try:
+                self._disk.purge_versions(fingerprint)
+            except Exception as e:
+                logging.warning(f"Prediction cache disk purge failed: {e}")
+
+    def maintain(self):
+        """Один проход обслуживания: TTL и лимит размера дискового уровня"""
+        if self._disk is None:
+            return
+        try:
+            removed = self._disk.trim()
+            if removed:
+                logging.debug(f"Prediction cache disk trim removed {removed} rows")
+        except Exception as e:
+            logging.warning(f"Prediction cache disk trim failed: {e}")
+
+    def start_maintenance(self):
+        if self._disk is None or (self._maintenance_thread is not None and self._maintenance_thread.is_alive()):
+            return
+        self._maintenance_stop.clear()
+
+        def loop():
+            while not self._maintenance_stop.wait(self.maintenance_interval):
+                self.maintain()
+
+        self.maintain()
+        self._maintenance_thread = threading.Thread(target=loop, name="prediction-cache-maintenance", daemon=True)
+        self._maintenance_thread.start()
+
+    def stop_maintenance(self):
+        self._maintenance_stop.set()
+
+    def _key(self, fingerprint: str, namespace: str, text: str) -> str:
+        payload = f"{fingerprint}\x00{namespace}\x00{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _put(self, key: str, value: Any, size: int, expires_at: float):
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def get_or_compute(
+        self,
+        namespace: str,
+        texts: List[str],
+        compute: Callable[[List[str]], List[Any]],
+    ) -> List[Any]:
+        """Returns one value per text, calling ``compute`` only for unique misses"""
+        fingerprint = self.fingerprint
+        if fingerprint is None:
+            # Модели ещё не привязаны (bind) — кэшировать не под чем
+            return list(compute(list(texts)))
+        keys = [self._key(fingerprint, namespace, text) for text in texts]
+        results: List[Any] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        now = time.time()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] <= now:
+                    self._entries.pop(key)
+                    self._bytes -= entry[1]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.setdefault(key, []).append(i)
+                    continue
+                self._entries.move_to_end(key)
+                results[i] = entry[0]
+                self.hits += 1
+
+        if missing and self._disk is not None:
+            try:
+                found = self._disk.get_many(list(missing))
+            except Exception as e:
+                logging.warning(f"Prediction cache disk read failed: {e}")
+                found = {}
+            with self._lock:
+                for key, blob in found.items():
+                    value = json.loads(blob)
+                    for i in missing.pop(key):
+                        results[i] = value
+                        self.disk_hits += 1
+                    self._put(key, value, len(blob), now + self.ttl_seconds)
+
+        if not missing:
+            return results
+
+        miss_keys = list(missing)
+        values = compute([texts[missing[key][0]] for key in miss_keys])
+        expires_at = time.time() + self.ttl_seconds
+        disk_rows = []
+        with self._lock:
+            self.misses += sum(len(missing[key]) for key in miss_keys)
+            # Модели сменились во время вычисления — результат не сохраняем ни под одной версией
+            store = fingerprint == self.fingerprint
+            for key, value in zip(miss_keys, values):
+                for i in missing[key]:
+                    results[i] = value
+                if not store:
+                    continue
+                blob = json.dumps(value, ensure_ascii=False).encode("utf-8")
+                self._put(key, value, len(blob), expires_at)
+                disk_rows.append((key, fingerprint, blob, len(blob), expires_at))
+
+        if self._disk is not None:
+            try:
+                self._disk.set_many(disk_rows)
+            except Exception as e:
+                logging.warning(f"Prediction cache disk write failed: {e}")
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            result = {
+                "fingerprint": self.fingerprint,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+        if self._disk is not None:
+            try:
+                result["disk"] = self._disk.stats()
+            except Exception as e:
+                result["disk"] = {"error": str(e)}
+        return result
@@ -0,0 +1,200 @@
+"""Confidence cascade for sentiment: a linear model on the TF-IDF features
+first, the transformer only for items it is unsure about.
+
+The fast model is a multinomial LogisticRegression over the topic model's
+vectorizer.pkl, distilled from the transformer's own labels (or trained on
+review ratings). Items whose top fast-model probability is below
+CASCADE_THRESHOLD are escalated to the transformer. A CASCADE_AUDIT_RATE
+sample of the fast decisions is also scored by the transformer so /stats
+can report how often the cascade agrees with the transformer.
+
+Training and threshold sweep:
+    python cascade.py train --csv ../parser/banki_ru/gazprombank_reviews.csv
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import random
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+STAGE_FAST = "fast"
+STAGE_TRANSFORMER = "transformer"
+SWEEP_THRESHOLDS = (0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+
+
+def fast_proba(model, vectorizer, texts: List[str], num_labels: int) -> np.ndarray:
+    """Вероятности fast-модели в порядке меток трансформера (0..num_labels-1)"""
+    proba = model.predict_proba(vectorizer.transform(texts))
+    probs = np.zeros((len(texts), num_labels), dtype=np.float32)
+    probs[:, [int(c) for c in model.classes_]] = proba
+    return probs
+
+
+class CascadeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items = 0
+        self.escalated = 0
+        self.audited = 0
+        self.audit_agreed = 0
+
+    def record(self, items: int, escalated: int):
+        with self._lock:
+            self.items += items
+            self.escalated += escalated
+
+    def record_audit(self, audited: int, agreed: int):
+        with self._lock:
+            self.audited += audited
+            self.audit_agreed += agreed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "items": self.items,
+                "escalated": self.escalated,
+                "escalation_rate": round(self.escalated / self.items, 4) if self.items else None,
+                "audited": self.audited,
+                "audit_agreement": round(self.audit_agreed / self.audited, 4) if self.audited else None,
+            }
+
+
+def cascade_predict(
+    texts: List[str],
+    fast_fn: Callable[[List[str]], np.ndarray],
+    transformer_fn: Callable[[List[str]], Tuple[list, np.ndarray]],
+    threshold: float,
+    audit_rate: float = 0.0,
+    stats: Optional[CascadeStats] = None,
+    rng: Optional[random.Random] = None,
+) -> Tuple[List[int], np.ndarray, List[str]]:
+    """Sentiment через каскад; возвращает метки, вероятности и стадию для каждого текста"""
+    probs = fast_fn(texts)
+    confident = probs.max(axis=1) >= threshold
+    escalate = np.flatnonzero(~confident)
+    fast_idx = np.flatnonzero(confident)
+
+    audit = []
+    if audit_rate > 0 and len(fast_idx):
+        rng = rng or random
+        audit = [i for i in fast_idx.tolist() if rng.random() < audit_rate]
+
+    # Эскалация и аудит одним прогоном трансформера
+    run_idx = escalate.tolist() + audit
+    if run_idx:
+        _, transformer_probs = transformer_fn([texts[i] for i in run_idx])
+        n_escalated = len(escalate)
+        if audit:
+            audited = transformer_probs[n_escalated:].argmax(axis=1)
+            agreed = int((audited == probs[audit].argmax(axis=1)).sum())
+            if stats is not None:
+                stats.record_audit(len(audit), agreed)
+        probs[escalate] = transformer_probs[:n_escalated]
+
+    if stats is not None:
+        stats.record(len(texts), len(escalate))
+    stages = np.where(confident, STAGE_FAST, STAGE_TRANSFORMER).tolist()
+    return probs.argmax(axis=1).tolist(), probs, stages
+
+
+def rating_to_label(rating) -> Optional[int]:
+    try:
+        rating = int(float(rating))
+    except (TypeError, ValueError):
+        return None
+    return 0 if rating <= 2 else 1 if rating == 3 else 2
+
+
+def threshold_sweep(fast_probs: np.ndarray, reference: np.ndarray) -> List[dict]:
+    """Доля эскалаций и согласие каскада с трансформером для набора порогов"""
+    fast_labels = fast_probs.argmax(axis=1)
+    confidence = fast_probs.max(axis=1)
+    report = []
+    for threshold in SWEEP_THRESHOLDS:
+        confident = confidence >= threshold
+        final = np.where(confident, fast_labels, reference)
+        report.append({
+            "threshold": threshold,
+            "escalation_rate": round(float(1 - confident.mean()), 4),
+            "agreement_with_transformer": round(float((final == reference).mean()), 4),
+        })
+    return report
+
+
+def train(args):
+    import pandas as pd
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    frames = [pd.read_excel(p) if p.endswith(".xlsx") else pd.read_csv(p) for p in args.csv]
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df["text"].astype(str).str.strip().astype(bool) & df["text"].notna()].drop_duplicates("text")
+    if args.limit:
+        df = df.sample(min(args.limit, len(df)), random_state=42)
+    texts = df["text"].astype(str).tolist()
+
+    with open(args.vectorizer, "rb") as f:
+        vectorizer = pickle.load(f)
+
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from sentiment_backend import TorchBackend, run_backend
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model_path).eval()
+    backend = TorchBackend(model, "cpu")
+    teacher = np.concatenate([
+        run_backend(backend, tokenizer, texts[i:i + 64]) for i in range(0, len(texts), 64)
+    ]).argmax(axis=1)
+    logging.info(f"Transformer labels for {len(texts)} reviews: {np.bincount(teacher).tolist()}")
+
+    if args.labels == "rating":
+        labels = np.array([rating_to_label(r) for r in df["rating"]], dtype=object)
+        keep = np.array([label is not None for label in labels])
+        texts, teacher, labels = [t for t, k in zip(texts, keep) if k], teacher[keep], labels[keep].astype(int)
+    else:
+        labels = teacher
+
+    X = vectorizer.transform(texts)
+    X_train, X_test, y_train, _, _, teacher_test = train_test_split(
+        X, labels, teacher, test_size=args.test_size, random_state=42, stratify=labels
+    )
+    clf = LogisticRegression(C=args.C, max_iter=2000, class_weight="balanced")
+    clf.fit(X_train, y_train)
+
+    num_labels = model.config.num_labels
+    test_probs = np.zeros((X_test.shape[0], num_labels), dtype=np.float32)
+    test_probs[:, [int(c) for c in clf.classes_]] = clf.predict_proba(X_test)
+    report = {
+        "train_size": X_train.shape[0],
+        "test_size": X_test.shape[0],
+        "labels": args.labels,
+        "fast_only_agreement": round(float((test_probs.argmax(axis=1) == teacher_test).mean()), 4),
+        "sweep": threshold_sweep(test_probs, teacher_test),
+    }
+
+    with open(args.out, "wb") as f:
+        pickle.dump(clf, f)
+    with open(os.path.splitext(args.out)[0] + ".report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    parser = argparse.ArgumentParser(description="Fast sentiment model for the cascade")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--csv", action="append", required=True, help="CSV/XLSX с колонкой text (и rating)")
+    parser.add_argument("--labels", choices=["transformer", "rating"], default="transformer")
+    parser.add_argument("--vectorizer", default=os.environ.get("VECTORIZER_PATH", "vectorizer.pkl"))
+    parser.add_argument("--model-path", default=os.environ.get("SENTIMENT_MODEL_PATH", "sentimentmodel"))
+    parser.add_argument("--out", default="fast_sentiment.pkl")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--C", type=float, default=4.0)
+    train(parser.parse_args())
@@ -1,31 +1,32 @@
 import requests
 
-BASE_URL = "http://0.0.0.0:8000"
+BASE_URL = "http://0.0.0.0:3002"
 single_example = {"text": "Очень доволен приложением банка"}
 
-resp = requests.post(f"{BASE_URL}/predict", json=single_example)
+resp = requests.post(f"{BASE_URL}/predict_single", json=single_example)
 if resp.status_code == 200:
     data = resp.json()
     print("Text:", data["text"])
     print("Class:", data["label"])
     print("Probabilities:", data["probabilities"])
+    print("Tags:", data["tags"])
 else:
     print("Error: ", resp.text)
 
 batch_example = {
-    "texts": [
-        "Очень доволен приложением банка",
-        "Приложение виснет, поддержка ужас",
-        "Обычный опыт, ничего особенного"
+    "data": [
+        {"id": 1, "text": "Очень доволен приложением банка"},
+        {"id": 2, "text": "Приложение виснет, поддержка ужас"},
+        {"id": 3, "text": "Обычный опыт, ничего особенного"},
     ]
 }
 
-resp = requests.post(f"{BASE_URL}/predict_batch", json=batch_example)
+resp = requests.post(f"{BASE_URL}/predict", json=batch_example)
 if resp.status_code == 200:
     data = resp.json()
-    for elem in data["results"]:
-        print(f"Text: {elem['text']}")
-        print(f"Class: {elem['label']}")
-        print(f"Probabilities: {elem['probabilities']}")
+    for elem in data["predictions"]:
+        print(f"Id: {elem['id']}")
+        print(f"Topics: {elem['topics']}")
+        print(f"Sentiments: {elem['sentiments']}")
 else:
     print("Error:", resp.text)
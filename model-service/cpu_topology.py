@@ -0,0 +1,82 @@
+"""CPU thread and core placement for inference processes.
+
+TORCH_INTEROP_THREADS   inter-op pool size, set once per process before any inference
+CPU_AFFINITY            off  - no pinning (default)
+                        auto - split the cores the container may use between the workers
+                        0-3,8-11 - restrict to these cores, then split them between the workers
+"""
+import logging
+import os
+from typing import List, Optional
+
+TORCH_INTEROP_THREADS = int(os.environ.get("TORCH_INTEROP_THREADS", "1"))
+CPU_AFFINITY = os.environ.get("CPU_AFFINITY", "off").strip().lower()
+
+
+def allowed_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cores() -> int:
+    return len(affinity_pool() or allowed_cores())
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cores = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def affinity_pool() -> Optional[List[int]]:
+    """Ядра, которые делятся между воркерами, или None, если пиннинг выключен"""
+    if CPU_AFFINITY in ("", "off", "none", "false"):
+        return None
+    allowed = allowed_cores()
+    if CPU_AFFINITY == "auto":
+        return allowed
+    cores = [core for core in parse_cpu_list(CPU_AFFINITY) if core in allowed]
+    if not cores:
+        raise ValueError(f"CPU_AFFINITY={CPU_AFFINITY} has no cores available to this process ({allowed})")
+    return cores
+
+
+def worker_cores(slot: int, workers: int, pool: List[int]) -> List[int]:
+    """Непрерывный срез ядер для воркера slot; при нехватке ядер воркеры делят их по кругу"""
+    if workers >= len(pool):
+        return [pool[slot % len(pool)]]
+    share, extra = divmod(len(pool), workers)
+    start = slot * share + min(slot, extra)
+    return pool[start:start + share + (1 if slot < extra else 0)]
+
+
+def pin_current_process(cores: List[int]) -> bool:
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, cores)
+    except OSError as e:
+        logging.warning(f"Could not pin process {os.getpid()} to cores {cores}: {e}")
+        return False
+    return True
+
+
+def configure_interop_threads(threads: int = TORCH_INTEROP_THREADS):
+    """Размер inter-op пула torch; задаётся один раз до первого инференса"""
+    import torch
+
+    try:
+        torch.set_num_interop_threads(max(1, threads))
+    except RuntimeError as e:
+        # Уже задан (или пул уже запущен) — оставляем как есть
+        logging.debug(f"torch inter-op threads left at {torch.get_num_interop_threads()}: {e}")
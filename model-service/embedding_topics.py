@@ -0,0 +1,167 @@
+"""Multi-label topic head on the sentiment transformer's pooled embeddings.
+
+With TOPIC_SOURCE=embedding, topics come from a per-class logistic head
+over the mean-pooled last hidden state that the sentiment forward pass
+already computes. The TF-IDF vectorizer and the sklearn topic model are
+then not loaded, and every review is tokenized and encoded once.
+
+The head is stored in topic_head.npz (coef, intercept, class_names). It is
+trained on the sklearn topic model's own labels (or on a tags column):
+    python embedding_topics.py train --csv ../parser/banki_ru/gazprombank_reviews.csv
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+from typing import List, Sequence
+
+import numpy as np
+
+
+class TopicHead:
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, class_names: Sequence[str]):
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.class_names = list(class_names)
+        if self.coef.shape[0] != len(self.class_names) or self.intercept.shape != (len(self.class_names),):
+            raise ValueError(
+                f"topic head shape mismatch: coef {self.coef.shape}, intercept {self.intercept.shape}, "
+                f"{len(self.class_names)} classes"
+            )
+
+    @property
+    def dim(self) -> int:
+        return self.coef.shape[1]
+
+    @classmethod
+    def load(cls, path: str) -> "TopicHead":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["coef"], data["intercept"], data["class_names"].tolist())
+
+    def save(self, path: str):
+        np.savez(path, coef=self.coef, intercept=self.intercept, class_names=np.asarray(self.class_names))
+
+    def predict_proba(self, embeddings: np.ndarray) -> np.ndarray:
+        """Вероятности тем (n_samples, n_classes), независимая сигмоида на класс"""
+        logits = np.asarray(embeddings, dtype=np.float32) @ self.coef.T + self.intercept
+        return (1.0 / (1.0 + np.exp(-logits))).astype(np.float32)
+
+
+def parse_tags(value) -> List[str]:
+    """Теги из ячейки: JSON-список или строка через запятую"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(tag).strip() for tag in value if str(tag).strip()]
+    value = str(value).strip()
+    if value.startswith("["):
+        try:
+            return [str(tag).strip() for tag in json.loads(value) if str(tag).strip()]
+        except ValueError:
+            pass
+    return [tag.strip() for tag in value.split(",") if tag.strip()]
+
+
+def fit_head(X: np.ndarray, Y: np.ndarray, class_names: Sequence[str], C: float) -> TopicHead:
+    """Независимая логистическая регрессия на каждый класс"""
+    from sklearn.linear_model import LogisticRegression
+
+    coef = np.zeros((Y.shape[1], X.shape[1]), dtype=np.float32)
+    intercept = np.zeros(Y.shape[1], dtype=np.float32)
+    for j, name in enumerate(class_names):
+        positives = int(Y[:, j].sum())
+        if positives in (0, len(Y)):
+            # Класс не встречается (или встречается всегда) — константный скор
+            intercept[j] = -20.0 if positives == 0 else 20.0
+            logging.warning(f"Topic '{name}' has {positives}/{len(Y)} positives, constant head used")
+            continue
+        clf = LogisticRegression(C=C, max_iter=2000, class_weight="balanced")
+        clf.fit(X, Y[:, j])
+        coef[j] = clf.coef_[0]
+        intercept[j] = clf.intercept_[0]
+    return TopicHead(coef, intercept, class_names)
+
+
+def train(args):
+    import pandas as pd
+    from sklearn.metrics import f1_score
+    from sklearn.model_selection import train_test_split
+
+    frames = [pd.read_excel(p) if p.endswith(".xlsx") else pd.read_csv(p) for p in args.csv]
+    df = pd.concat(frames, ignore_index=True)
+    df = df[df["text"].notna() & df["text"].astype(str).str.strip().astype(bool)].drop_duplicates("text")
+    if args.limit:
+        df = df.sample(min(args.limit, len(df)), random_state=42)
+    texts = df["text"].astype(str).tolist()
+
+    with open(args.class_info, "r", encoding="utf-8") as f:
+        class_names = json.load(f)["class_names"]
+
+    if args.tags_column:
+        index = {name: j for j, name in enumerate(class_names)}
+        Y = np.zeros((len(texts), len(class_names)), dtype=np.int8)
+        for i, value in enumerate(df[args.tags_column]):
+            for tag in parse_tags(value):
+                if tag in index:
+                    Y[i, index[tag]] = 1
+    else:
+        with open(args.topic_model, "rb") as f:
+            topic_model = pickle.load(f)
+        with open(args.vectorizer, "rb") as f:
+            vectorizer = pickle.load(f)
+        Y = np.asarray(topic_model.predict(vectorizer.transform(texts)), dtype=np.int8)
+    logging.info(f"Topic labels for {len(texts)} reviews: {dict(zip(class_names, Y.sum(axis=0).tolist()))}")
+
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from sentiment_backend import TorchBackend
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model_path).eval()
+    backend = TorchBackend(model, "cpu")
+    embeddings = []
+    for start in range(0, len(texts), 64):
+        batch = tokenizer(
+            texts[start:start + 64], truncation=True, padding=True, max_length=args.max_length, return_tensors="np"
+        )
+        embeddings.append(backend.encode(dict(batch))[1])
+    X = np.concatenate(embeddings)
+
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=args.test_size, random_state=42)
+    head = fit_head(X_train, Y_train, class_names, args.C)
+    predicted = (head.predict_proba(X_test) >= 0.5).astype(np.int8)
+    report = {
+        "train_size": len(X_train),
+        "test_size": len(X_test),
+        "labels": args.tags_column or "sklearn",
+        "embedding_dim": head.dim,
+        "micro_f1": round(float(f1_score(Y_test, predicted, average="micro", zero_division=0)), 4),
+        "per_class_f1": {
+            name: round(float(f1_score(Y_test[:, j], predicted[:, j], zero_division=0)), 4)
+            for j, name in enumerate(class_names)
+        },
+    }
+
+    head.save(args.out)
+    with open(os.path.splitext(args.out)[0] + ".report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    parser = argparse.ArgumentParser(description="Topic head on transformer embeddings")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--csv", action="append", required=True, help="CSV/XLSX с колонкой text")
+    parser.add_argument("--tags-column", help="колонка с темами; без неё метки берутся из sklearn-модели")
+    parser.add_argument("--class-info", default=os.environ.get("CLASS_INFO_PATH", "class_info.json"))
+    parser.add_argument("--topic-model", default=os.environ.get("TOPIC_MODEL_PATH", "sklearn_model.pkl"))
+    parser.add_argument("--vectorizer", default=os.environ.get("VECTORIZER_PATH", "vectorizer.pkl"))
+    parser.add_argument("--model-path", default=os.environ.get("SENTIMENT_MODEL_PATH", "sentimentmodel"))
+    parser.add_argument("--max-length", type=int, default=int(os.environ.get("SENTIMENT_MAX_LENGTH", "256")))
+    parser.add_argument("--out", default="topic_head.npz")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--C", type=float, default=1.0)
+    train(parser.parse_args())
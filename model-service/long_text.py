@@ -0,0 +1,137 @@
+import logging
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+POOLING_MODES = ("mean", "max", "logsumexp")
+
+
+def split_windows(
+    tokenizer,
+    texts: List[str],
+    window: int,
+    stride: int,
+    max_windows: int = 0,
+) -> Tuple[Dict[str, list], np.ndarray]:
+    """Режет тексты на перекрывающиеся окна по ``window`` токенов.
+
+    Соседние окна делят ``stride`` токенов, чтобы фраза на границе окна
+    целиком попала хотя бы в одно из них. Короткий текст даёт одно окно без
+    паддинга. Если окон больше ``max_windows``, остаются равномерно
+    распределённые по тексту, включая первое и последнее.
+
+    Возвращает признаки окон (списки без паддинга) и индекс документа для
+    каждого окна.
+    """
+    encoded = tokenizer(
+        texts,
+        truncation=True,
+        max_length=window,
+        stride=stride,
+        return_overflowing_tokens=True,
+    )
+    doc_index = np.asarray(encoded.pop("overflow_to_sample_mapping"), dtype=np.int64)
+    features = {key: list(encoded[key]) for key in encoded.keys()}
+
+    if max_windows > 0:
+        counts = np.bincount(doc_index, minlength=len(texts))
+        if counts.max() > max_windows:
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            keep = []
+            for doc, (start, count) in enumerate(zip(starts, counts)):
+                if count <= max_windows:
+                    keep.extend(range(start, start + count))
+                else:
+                    keep.extend(start + np.unique(np.linspace(0, count - 1, max_windows).round().astype(int)))
+            keep = np.asarray(keep, dtype=np.int64)
+            features = {key: [values[i] for i in keep] for key, values in features.items()}
+            doc_index = doc_index[keep]
+            logging.debug(f"Window cap {max_windows} applied, {len(counts)} docs -> {len(keep)} windows")
+
+    return features, doc_index
+
+
+def pool_logits(logits: np.ndarray, doc_index: np.ndarray, n_docs: int, mode: str = "mean") -> np.ndarray:
+    """Сводит логиты окон (n_windows, n_labels) к логитам документов (n_docs, n_labels).
+
+    mean      - среднее по окнам
+    max       - поклассовый максимум: один резко негативный фрагмент решает
+    logsumexp - гладкий максимум, logsumexp по окнам минус log(n_windows)
+    """
+    if mode not in POOLING_MODES:
+        raise ValueError(f"Unknown pooling '{mode}', expected one of {POOLING_MODES}")
+    logits = np.asarray(logits, dtype=np.float64)
+    counts = np.bincount(doc_index, minlength=n_docs).astype(np.float64)[:, None]
+    pooled_max = np.full((n_docs, logits.shape[1]), -np.inf)
+    np.maximum.at(pooled_max, doc_index, logits)
+
+    if mode == "max":
+        pooled = pooled_max
+    elif mode == "mean":
+        pooled = np.zeros((n_docs, logits.shape[1]))
+        np.add.at(pooled, doc_index, logits)
+        pooled /= counts
+    else:
+        sums = np.zeros((n_docs, logits.shape[1]))
+        np.add.at(sums, doc_index, np.exp(logits - pooled_max[doc_index]))
+        pooled = pooled_max + np.log(sums) - np.log(counts)
+    return pooled.astype(np.float32)
+
+
+def _run_windows(
+    tokenizer,
+    features: Dict[str, list],
+    run: Callable[[Dict[str, np.ndarray]], Tuple[np.ndarray, ...]],
+    buckets: Callable[[List[int]], List[List[int]]],
+) -> List[np.ndarray]:
+    """Прогоняет окна общими батчами; ``run`` возвращает кортеж массивов (n, k)"""
+    lengths = [len(ids) for ids in features["input_ids"]]
+    outputs = None
+    for bucket in buckets(lengths):
+        batch = tokenizer.pad([{key: features[key][i] for key in features} for i in bucket], return_tensors="np")
+        results = run(dict(batch))
+        if outputs is None:
+            outputs = [np.empty((len(lengths), r.shape[1]), dtype=np.float32) for r in results]
+        for output, result in zip(outputs, results):
+            output[bucket] = result
+    return outputs
+
+
+def windowed_logits(
+    tokenizer,
+    texts: List[str],
+    run_logits: Callable[[Dict[str, np.ndarray]], np.ndarray],
+    buckets: Callable[[List[int]], List[List[int]]],
+    window: int,
+    stride: int,
+    pooling: str = "mean",
+    max_windows: int = 0,
+) -> np.ndarray:
+    """Логиты документов по скользящим окнам.
+
+    Окна всех документов сортируются по длине и пакуются в общие батчи
+    (``buckets`` — разбиение по бюджету токенов), поэтому стоимость зависит
+    от суммарного числа токенов, а не от числа документов x длины паддинга.
+    """
+    features, doc_index = split_windows(tokenizer, texts, window, stride, max_windows)
+    (window_logits,) = _run_windows(tokenizer, features, lambda batch: (run_logits(batch),), buckets)
+    return pool_logits(window_logits, doc_index, len(texts), pooling)
+
+
+def windowed_encode(
+    tokenizer,
+    texts: List[str],
+    run_encode: Callable[[Dict[str, np.ndarray]], Tuple[np.ndarray, np.ndarray]],
+    buckets: Callable[[List[int]], List[List[int]]],
+    window: int,
+    stride: int,
+    pooling: str = "mean",
+    max_windows: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Как windowed_logits, но ещё и эмбеддинги документов (среднее по окнам)"""
+    features, doc_index = split_windows(tokenizer, texts, window, stride, max_windows)
+    window_logits, window_embeddings = _run_windows(tokenizer, features, run_encode, buckets)
+    return (
+        pool_logits(window_logits, doc_index, len(texts), pooling),
+        pool_logits(window_embeddings, doc_index, len(texts), "mean"),
+    )
@@ -1,16 +1,23 @@
 from kafka import KafkaProducer
+import fcntl
+import hashlib
 import json
 import logging
-import uuid
-import json
-import logging
-import time
 import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 from datetime import datetime, timezone
-from kafka.admin import KafkaAdminClient, NewTopic
+from kafka.admin import KafkaAdminClient, NewPartitions, NewTopic
 from kafka.errors import TopicAlreadyExistsError, NoBrokersAvailable
 
+from scheduler import Overloaded
+from wire import WIRE_FORMATS, BinaryCodec, JsonCodec, content_type_of
+
 load_dotenv()
 
 KAFKA_BROKER_DOCKER = os.getenv("KAFKA_BROKER_DOCKER")
@@ -18,10 +25,27 @@ KAFKA_BROKER_URL = os.getenv("KAFKA_BROKER_URL")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC")
 PRODUCER_CLIENT_ID = os.getenv("PRODUCER_CLIENT_ID")
 
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "20"))
+KAFKA_BATCH_SIZE_BYTES = int(os.getenv("KAFKA_BATCH_SIZE_BYTES", str(256 * 1024)))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "gzip") or None
+KAFKA_QUEUE_MAX_MESSAGES = int(os.getenv("KAFKA_QUEUE_MAX_MESSAGES", "10000"))
+KAFKA_ENQUEUE_TIMEOUT_MS = float(os.getenv("KAFKA_ENQUEUE_TIMEOUT_MS", "100"))
+KAFKA_SEND_CHUNK = int(os.getenv("KAFKA_SEND_CHUNK", "500"))
+KAFKA_FLUSH_TIMEOUT_S = float(os.getenv("KAFKA_FLUSH_TIMEOUT_S", "10"))
+KAFKA_RETRY_BACKOFF_MAX_S = float(os.getenv("KAFKA_RETRY_BACKOFF_MAX_S", "30"))
+KAFKA_OUTBOX_PATH = os.getenv("KAFKA_OUTBOX_PATH", "/tmp/model-service-kafka-outbox.sqlite3")
+KAFKA_OUTBOX_MAX_BYTES = int(os.getenv("KAFKA_OUTBOX_MAX_BYTES", str(512 * 1024 * 1024)))
+KAFKA_PARTITIONS = int(os.getenv("KAFKA_PARTITIONS", "6"))
+KAFKA_MAX_MESSAGE_BYTES = int(os.getenv("KAFKA_MAX_MESSAGE_BYTES", str(900 * 1024)))
+KAFKA_PARTITION_KEY = os.getenv("KAFKA_PARTITION_KEY", "text")
+KAFKA_KEY_BUCKETS = int(os.getenv("KAFKA_KEY_BUCKETS", "64"))
+KAFKA_WIRE_FORMAT = os.getenv("KAFKA_WIRE_FORMAT", "binary")
+
 
 
 
-def ensure_topic_exists():
+def ensure_topic_exists(topic=None):
+    topic = topic or KAFKA_TOPIC
     for i in range(10):
         try:
             admin_client = KafkaAdminClient(
@@ -30,20 +54,21 @@ def ensure_topic_exists():
             )
 
             topic_list = [NewTopic(
-                name=KAFKA_TOPIC,
-                num_partitions=1,
+                name=topic,
+                num_partitions=KAFKA_PARTITIONS,
                 replication_factor=1
             )]
 
             admin_client.create_topics(new_topics=topic_list, validate_only=False)
-            logging.info(f"Kafka topic '{KAFKA_TOPIC}' created")
+            logging.info(f"Kafka topic '{topic}' created")
             admin_client.close()
-            return
+            return True
 
         except TopicAlreadyExistsError:
-            logging.info(f"Kafka topic '{KAFKA_TOPIC}' already exists")
+            logging.info(f"Kafka topic '{topic}' already exists")
+            ensure_partitions(admin_client, topic)
             admin_client.close()
-            return
+            return True
 
         except NoBrokersAvailable:
             logging.warning(f"[{i+1}/10] Kafka broker not available, retrying in 3s...")
@@ -53,9 +78,31 @@ def ensure_topic_exists():
             logging.error(f"Unexpected error: {e}")
             time.sleep(3)
 
+    return False
+
+
+def ensure_partitions(admin_client, topic):
+    """Доращивает число партиций существующего топика до KAFKA_PARTITIONS (уменьшить нельзя)"""
+    try:
+        described = admin_client.describe_topics([topic])
+        current = len(described[0]["partitions"]) if described else 0
+        if 0 < current < KAFKA_PARTITIONS:
+            admin_client.create_partitions({topic: NewPartitions(total_count=KAFKA_PARTITIONS)})
+            logging.info(f"Kafka topic '{topic}' partitions: {current} -> {KAFKA_PARTITIONS}")
+    except Exception as e:
+        logging.warning(f"Failed to grow partitions of '{topic}': {e}")
+
+
 _producer = None
 
-ensure_topic_exists()
+
+def _reset_producer():
+    global _producer
+    _producer = None
+
+
+os.register_at_fork(after_in_child=_reset_producer)
+
 
 def get_producer():
     global _producer
@@ -64,7 +111,13 @@ def get_producer():
             _producer = KafkaProducer(
                 bootstrap_servers=KAFKA_BROKER_DOCKER,
                 client_id=PRODUCER_CLIENT_ID,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8')
+                linger_ms=KAFKA_LINGER_MS,
+                batch_size=KAFKA_BATCH_SIZE_BYTES,
+                compression_type=KAFKA_COMPRESSION,
+                acks="all",
+                max_request_size=max(KAFKA_MAX_MESSAGE_BYTES + 64 * 1024, 1024 * 1024),
+                retries=5,
+                max_in_flight_requests_per_connection=1,
             )
         except Exception as e:
             logging.warning(f"Kafka producer not available: {e}")
@@ -72,12 +125,427 @@ def get_producer():
     return _producer
 
 
+def encode_value(data) -> bytes:
+    if hasattr(data, "dict"):
+        data = data.dict()
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def partition_key(message: dict) -> bytes:
+    """Стабильный ключ сообщения: хэш текста (или источника), сведённый к KAFKA_KEY_BUCKETS корзинам.
+
+    Один и тот же отзыв всегда попадает в одну корзину, а значит и в одну
+    партицию; корзин больше, чем партиций, чтобы murmur2-партиционер
+    продюсера распределял их равномерно.
+    """
+    if KAFKA_PARTITION_KEY == "source":
+        field = str(message.get("source") or "unknown")
+    else:
+        field = str(message.get("text", ""))
+    bucket = int.from_bytes(hashlib.blake2b(field.encode("utf-8"), digest_size=8).digest(), "big") % KAFKA_KEY_BUCKETS
+    return str(bucket).encode()
+
+
+def get_codec(name: str):
+    if name not in WIRE_FORMATS:
+        raise ValueError(f"Unknown KAFKA_WIRE_FORMAT '{name}', expected one of {WIRE_FORMATS}")
+    return BinaryCodec() if name == "binary" else JsonCodec(encode_value)
+
+
+def chunk_batch(
+    messages: List[dict],
+    max_bytes: int,
+    codec=None,
+    rejected: Optional[List[Tuple[int, str]]] = None,
+) -> List[Tuple[bytes, bytes]]:
+    """Группирует сообщения по ключу и упаковывает в батчи размером не больше max_bytes.
+
+    Возвращает пары (key, value) в порядке первого появления ключа.
+    Сообщение, которое само по себе больше лимита или не кодируется,
+    отбрасывается с ошибкой в логе; если передан ``rejected``, туда
+    добавляется (индекс сообщения, причина).
+    """
+    codec = codec or JsonCodec(encode_value)
+    groups: "OrderedDict[bytes, list]" = OrderedDict()
+    for index, message in enumerate(messages):
+        try:
+            part = codec.prepare(message)
+        except (TypeError, ValueError) as e:
+            logging.error(f"[Kafka] Message cannot be encoded as {codec.name}, dropped: {e}")
+            if rejected is not None:
+                rejected.append((index, f"cannot be encoded as {codec.name}: {e}"))
+            continue
+        groups.setdefault(partition_key(message), []).append((index, part))
+
+    envelope = codec.envelope_size()
+    records = []
+    for key, parts in groups.items():
+        chunk, size = [], envelope
+        for index, part in parts:
+            part_size = codec.size(part)
+            if envelope + part_size > max_bytes:
+                logging.error(f"[Kafka] Message of {part_size} bytes exceeds KAFKA_MAX_MESSAGE_BYTES, dropped")
+                if rejected is not None:
+                    rejected.append((index, f"{part_size} bytes exceeds KAFKA_MAX_MESSAGE_BYTES"))
+                continue
+            if chunk and size + part_size > max_bytes:
+                records.append((key, codec.pack(chunk)))
+                chunk, size = [], envelope
+            chunk.append(part)
+            size += part_size
+        if chunk:
+            records.append((key, codec.pack(chunk)))
+    return records
+
+
+class _Outbox:
+    """Size-capped SQLite spool for messages Kafka didn't accept.
+
+    Rows are replayed in insertion order. Several worker processes may
+    share one file; replay is serialized with an flock on ``<path>.lock``.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = None
+        os.register_at_fork(after_in_child=self._after_fork)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kafka_outbox ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, key BLOB, payload BLOB NOT NULL, "
+            "size INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(kafka_outbox)")}
+        if "key" not in columns:
+            self._conn.execute("ALTER TABLE kafka_outbox ADD COLUMN key BLOB")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def append(self, records: List[Tuple[bytes, bytes]]) -> int:
+        """Дописывает сообщения по порядку, пока не упрётся в лимит; возвращает число записанных"""
+        if not records:
+            return 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                used = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM kafka_outbox").fetchone()[0]
+                accepted = 0
+                for _, payload in records:
+                    if used + len(payload) > self.max_bytes:
+                        break
+                    used += len(payload)
+                    accepted += 1
+                self._conn.executemany(
+                    "INSERT INTO kafka_outbox (key, payload, size, created_at) VALUES (?, ?, ?, ?)",
+                    [(key, payload, len(payload), now) for key, payload in records[:accepted]],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return accepted
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT EXISTS (SELECT 1 FROM kafka_outbox)").fetchone()[0] == 1
+
+    def peek(self, limit: int) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, key, payload FROM kafka_outbox ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+
+    def delete_through(self, seq: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM kafka_outbox WHERE seq <= ?", (seq,))
+
+    def replay_lease(self):
+        """Неблокирующая межпроцессная блокировка реплея; None, если её держит другой воркер"""
+        handle = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def stats(self) -> dict:
+        with self._lock:
+            messages, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM kafka_outbox"
+            ).fetchone()
+        return {"path": self.path, "messages": messages, "bytes": size, "max_bytes": self.max_bytes}
+
+
+class KafkaPublisher:
+    """Background Kafka publishing with a bounded queue and a disk outbox.
+
+    ``publish`` only enqueues individual reviews, so request handlers never
+    wait for the broker. A single thread drains up to ``chunk_size`` reviews,
+    packs them into keyed batches (JSON or binary, see wire.py) under
+    ``max_message_bytes`` (see chunk_batch), lets the producer batch and
+    compress them (linger_ms/batch_size/compression_type) and checks
+    delivery after a flush. Records the broker didn't confirm go to
+    the outbox; while the outbox is non-empty new messages are appended
+    behind it, and it is replayed in order once Kafka is reachable again.
+    Delivery is at-least-once: a chunk that times out mid-flush is resent.
+
+    When the queue is full ``publish`` raises Overloaded (HTTP 429); this
+    happens only if Kafka and the outbox both stop accepting messages.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        max_queue_size: int = 10000,
+        enqueue_timeout: float = 0.1,
+        chunk_size: int = 500,
+        max_message_bytes: int = 900 * 1024,
+        wire_format: str = "json",
+        flush_timeout: float = 10.0,
+        outbox_path: Optional[str] = None,
+        outbox_max_bytes: int = 512 * 1024 * 1024,
+        retry_backoff_max: float = 30.0,
+        retry_after: float = 1.0,
+    ):
+        self.topic = topic
+        self.enqueue_timeout = enqueue_timeout
+        self.chunk_size = chunk_size
+        self.max_message_bytes = max_message_bytes
+        self.codec = get_codec(wire_format)
+        self.flush_timeout = flush_timeout
+        self.outbox_path = outbox_path
+        self.outbox_max_bytes = outbox_max_bytes
+        # Файл outbox открывается в start(), а не при импорте: импорт модуля не трогает диск
+        self.outbox: Optional[_Outbox] = None
+        self.retry_backoff_max = retry_backoff_max
+        self.retry_after = retry_after
+        self.max_queue_size = max_queue_size
+        # Ёмкость очереди проверяется в publish под _space, чтобы батч принимался целиком
+        self._queue: "queue.Queue" = queue.Queue()
+        self._space = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backoff = 0.0
+        self._next_replay = 0.0
+        self._counters = {
+            "enqueued": 0, "sent": 0, "spilled": 0, "replayed": 0,
+            "rejected": 0, "send_failures": 0, "dropped_on_shutdown": 0,
+        }
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.outbox is None and self.outbox_path:
+            try:
+                self.outbox = _Outbox(self.outbox_path, self.outbox_max_bytes)
+            except Exception as e:
+                logging.warning(f"[Kafka] Outbox {self.outbox_path} unavailable, publishing without it: {e}")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="kafka-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        producer = _producer
+        if producer is not None:
+            try:
+                producer.close(timeout=self.flush_timeout)
+            except Exception as e:
+                logging.warning(f"[Kafka] Producer close failed: {e}")
+
+    def publish(self, messages: List[dict]):
+        """Ставит батч в очередь целиком или не ставит ничего (Overloaded), чтобы ретрай клиента не дублировал записи"""
+        if not messages:
+            return
+        with self._space:
+            # Батч больше всей очереди принимается, только когда она пуста
+            admitted = self._space.wait_for(
+                lambda: self._queue.qsize() + len(messages) <= self.max_queue_size or self._queue.empty(),
+                timeout=self.enqueue_timeout,
+            )
+            if not admitted:
+                self._counters["rejected"] += 1
+                raise Overloaded("kafka", self.retry_after)
+            for message in messages:
+                self._queue.put_nowait(message)
+            self._counters["enqueued"] += len(messages)
+
+    def admit(self, count: int):
+        """Проверка без ожидания: поместится ли батч из count сообщений; иначе Overloaded.
+
+        Вызывается до инференса, чтобы при недоступной Kafka и полном outbox
+        клиент получил 429 сразу, а не после того, как модель уже отработала.
+        """
+        if self._queue.qsize() + count > self.max_queue_size and not self._queue.empty():
+            with self._space:
+                self._counters["rejected"] += 1
+            raise Overloaded("kafka", self.retry_after)
+
+    def publish_and_wait(self, messages: List[dict]) -> Tuple[bool, List[Tuple[int, str]]]:
+        """Синхронная публикация мимо очереди и outbox.
+
+        Возвращает (подтверждено ли брокером всё отправленное, [(индекс, причина)]
+        сообщений, которые не были отправлены, потому что не кодируются или
+        больше KAFKA_MAX_MESSAGE_BYTES).
+        """
+        dropped: List[Tuple[int, str]] = []
+        records = chunk_batch(messages, self.max_message_bytes, self.codec, rejected=dropped)
+        failed = self._send(records) if records else []
+        self._counters["sent"] += len(records) - len(failed)
+        return not failed, sorted(dropped)
+
+    def _drain(self) -> list:
+        try:
+            items = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(items) < self.chunk_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._space:
+            self._space.notify_all()
+        return items
+
+    def _send(self, records: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+        """Отправляет (key, value) записи и ждёт подтверждения; возвращает неподтверждённые по порядку"""
+        producer = get_producer()
+        if producer is None:
+            return records
+        futures = []
+        try:
+            for key, value in records:
+                headers = [("content-type", content_type_of(value))]
+                futures.append(producer.send(self.topic, key=key, value=value, headers=headers))
+            producer.flush(timeout=self.flush_timeout)
+        except Exception as e:
+            logging.warning(f"[Kafka] Send failed: {e}")
+        failed = [r for r, f in zip(records, futures) if not (f.is_done and f.succeeded())]
+        failed.extend(records[len(futures):])
+        if failed:
+            self._counters["send_failures"] += 1
+        return failed
+
+    def _register_failure(self):
+        self._backoff = min(self.retry_backoff_max, max(0.5, self._backoff * 2))
+        self._next_replay = time.monotonic() + self._backoff
+
+    def _spill(self, records: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+        """Пишет записи в outbox; возвращает то, что не поместилось"""
+        if self.outbox is None:
+            return records
+        try:
+            accepted = self.outbox.append(records)
+        except Exception as e:
+            logging.error(f"[Kafka] Outbox write failed: {e}")
+            return records
+        self._counters["spilled"] += accepted
+        if accepted < len(records):
+            logging.warning(f"[Kafka] Outbox is full ({self.outbox.max_bytes} bytes), holding {len(records) - accepted} records in memory")
+        return records[accepted:]
+
+    def _replay(self, max_chunks: int = 10):
+        if self.outbox is None or time.monotonic() < self._next_replay or not self.outbox.has_pending():
+            return
+        lease = self.outbox.replay_lease()
+        if lease is None:
+            return
+        try:
+            for _ in range(max_chunks):
+                rows = self.outbox.peek(self.chunk_size)
+                if not rows:
+                    break
+                if self._send([(key, payload) for _, key, payload in rows]):
+                    self._register_failure()
+                    return
+                self.outbox.delete_through(rows[-1][0])
+                self._counters["replayed"] += len(rows)
+            self._backoff = 0.0
+        finally:
+            lease.close()
+
+    def _run(self):
+        held: List[Tuple[bytes, bytes]] = []
+        while True:
+            values = held or chunk_batch(self._drain(), self.max_message_bytes, self.codec)
+            held = []
+            if not values:
+                if self._stopping.is_set() and self._queue.empty():
+                    break
+                self._replay()
+                continue
+
+            outbox_pending = self.outbox is not None and self.outbox.has_pending()
+            if outbox_pending or time.monotonic() < self._next_replay:
+                # Пока в outbox есть сообщения или брокер недавно отказал, новые пишутся за ними
+                failed = values
+            else:
+                failed = self._send(values)
+                if failed:
+                    self._register_failure()
+                else:
+                    self._backoff = 0.0
+            self._counters["sent"] += len(values) - len(failed)
+
+            if failed:
+                held = self._spill(failed)
+                if held:
+                    if self._stopping.is_set():
+                        self._counters["dropped_on_shutdown"] += len(held)
+                        logging.error(f"[Kafka] {len(held)} records could not be delivered or spooled on shutdown")
+                        held = []
+                    else:
+                        self._stopping.wait(max(self._backoff, 0.5))
+            self._replay()
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "queue_size": self._queue.qsize(),
+            "queue_max_size": self.max_queue_size,
+            "retry_backoff_s": self._backoff,
+            "wire_format": self.codec.name,
+            "outbox": self.outbox.stats() if self.outbox is not None else None,
+        }
+
+
+publisher = KafkaPublisher(
+    topic=KAFKA_TOPIC,
+    max_queue_size=KAFKA_QUEUE_MAX_MESSAGES,
+    enqueue_timeout=KAFKA_ENQUEUE_TIMEOUT_MS / 1000,
+    chunk_size=KAFKA_SEND_CHUNK,
+    max_message_bytes=KAFKA_MAX_MESSAGE_BYTES,
+    wire_format=KAFKA_WIRE_FORMAT,
+    flush_timeout=KAFKA_FLUSH_TIMEOUT_S,
+    outbox_path=KAFKA_OUTBOX_PATH or None,
+    outbox_max_bytes=KAFKA_OUTBOX_MAX_BYTES,
+    retry_backoff_max=KAFKA_RETRY_BACKOFF_MAX_S,
+)
+
 
 def build_message(
     text,
     date,
     sentiment,
     tags,
+    source=None,
 ):
     message = {
         "text": text,
@@ -85,28 +553,26 @@ def build_message(
         "sentiment": sentiment,
         "tags": tags,
     }
+    if source is not None:
+        message["source"] = source
 
     return message
 
 
 def build_message_batch(
-    messages
+    messages,
+    wait=False,
 ):
-    try:
-        result = {
-            "batch":[]
-        }
-        for message in messages:
-            result["batch"].append(build_message(
-                text = message.get("text", "The text is missing"),
-                date = message.get("date", "The date is missing"),
-                sentiment = message.get("sentiment", "The sentiment is missing"),
-                tags = message.get("tags", ["The tags are missing"]),
-            ))
-        return send_to_kafka(result)
-    except Exception as e:
-        logging.error("Error while sending the batch")
-        logging.error(e)
+    batch = []
+    for message in messages:
+        batch.append(build_message(
+            text = message.get("text", "The text is missing"),
+            date = message.get("date", "The date is missing"),
+            sentiment = message.get("sentiment", "The sentiment is missing"),
+            tags = message.get("tags", ["The tags are missing"]),
+            source = message.get("source"),
+        ))
+    return send_to_kafka(batch, wait=wait)
 
 
 def serialize_bytes(obj):
@@ -114,36 +580,25 @@ def serialize_bytes(obj):
         return obj.decode("utf-8", errors="replace")
     raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
-def send_to_kafka(data):
-    producer = get_producer()
-    if producer is None:
-        logging.info(f"Kafka not available, skipping log: {data}")
-        return {"status": "skipped", "messages_sent": 0}
+def send_to_kafka(data, wait=False):
+    """Ставит отзыв(ы) в очередь фоновой публикации; брокера не ждёт.
 
-    try:
-        messages = []
-
-        if isinstance(data, list):
-            for el in data:
-                if hasattr(el, "dict"):
-                    el = el.dict()
-                messages.append(el)
-                producer.send(KAFKA_TOPIC, value=el)
-        else:
-            if hasattr(data, "dict"):
-                data = data.dict()
-            messages.append(data)
-            producer.send(KAFKA_TOPIC, value=data)
-
-        producer.flush()
-        logging.info(f"[Kafka] Sent {len(messages)} messages to topic '{KAFKA_TOPIC}'")
+    Принимает список отзывов, один отзыв или {"batch": [...]}; разбиение на
+    Kafka-сообщения по размеру и ключу делает фоновый поток. С ``wait=True``
+    отправляет сразу и ждёт подтверждения брокера (для worker.py, который
+    коммитит оффсеты только после успешной публикации); в ``dropped`` —
+    (индекс, причина) сообщений, отброшенных как некодируемые или слишком большие.
+    """
+    if isinstance(data, dict) and "batch" in data:
+        data = data["batch"]
+    messages = data if isinstance(data, list) else [data]
+    if wait:
+        ok, dropped = publisher.publish_and_wait(messages)
         return {
-            "status": "ok",
-            "code": 200,
-            "messages_sent": len(messages),
-            "sample": messages[0] if messages else None,
+            "status": "ok" if ok else "failed",
+            "messages_sent": len(messages) - len(dropped) if ok else 0,
+            # Сообщения, которые не будут доставлены никогда: вызывающий не должен считать их опубликованными
+            "dropped": dropped,
         }
-
-    except Exception as e:
-        logging.exception(f"[Kafka] Ошибка отправки: {e}")
-        return {"status": "failed", "error": str(e)}
\ No newline at end of file
+    publisher.publish(messages)
+    return {"status": "queued", "messages_queued": len(messages)}
@@ -0,0 +1,74 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+# Компонент не отработал штатно, но сервис может обслуживать запросы без него
+DEGRADED = "degraded"
+SERVING_STATES = (READY, DEGRADED)
+
+
+class Readiness:
+    """Состояние загрузки компонентов сервиса для /readyz.
+
+    Сервис готов, когда все критичные компоненты в состоянии ``ready``
+    (или ``degraded``); некритичные (например, провижининг Kafka-топика)
+    только отображаются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components: Dict[str, dict] = {}
+        self.started_at = time.time()
+
+    def register(self, name: str, critical: bool = True):
+        with self._lock:
+            self._components[name] = {
+                "state": PENDING,
+                "critical": critical,
+                "duration_s": None,
+                "error": None,
+            }
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            return self._components[name]["state"]
+
+    @contextmanager
+    def track(self, name: str):
+        """Помечает компонент loading → ready/failed и замеряет длительность загрузки"""
+        started = time.perf_counter()
+        with self._lock:
+            self._components[name].update(state=LOADING, error=None)
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self._components[name].update(
+                    state=FAILED, error=str(e), duration_s=round(time.perf_counter() - started, 3)
+                )
+            raise
+        with self._lock:
+            self._components[name].update(state=READY, duration_s=round(time.perf_counter() - started, 3))
+
+    def degrade(self, name: str, error: str):
+        """Помечает компонент degraded: ошибка видна в /readyz, но готовность не блокируется"""
+        with self._lock:
+            self._components[name].update(state=DEGRADED, error=error)
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(c["state"] in SERVING_STATES for c in self._components.values() if c["critical"])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            components = {name: dict(c) for name, c in self._components.items()}
+        return {
+            "ready": all(c["state"] in SERVING_STATES for c in components.values() if c["critical"]),
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "components": components,
+        }
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+
+class Overloaded(Exception):
+    """Очередь полосы заполнена — запрос отклоняется сразу (HTTP 429)"""
+
+    def __init__(self, lane: str, retry_after: float):
+        super().__init__(f"{lane} queue is full")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Запрос не успевает к дедлайну (HTTP 503)"""
+
+    def __init__(self, lane: str, retry_after: float):
+        super().__init__(f"{lane} request deadline exceeded")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class _Job:
+    """Задание в очереди; future трогается только из его event loop.
+
+    ``abandoned`` выставляет ожидающая корутина (дедлайн, отмена клиента):
+    воркер-поток читает этот флаг вместо future.cancelled().
+    """
+
+    __slots__ = ("lane", "fn", "args", "future", "loop", "deadline", "enqueued", "abandoned")
+
+    def __init__(self, lane, fn, args, future, loop, deadline):
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.loop = loop
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+        self.abandoned = False
+
+
+class InferenceScheduler:
+    """Dedicated inference executor with bounded priority lanes.
+
+    Jobs are admitted into the ``interactive`` or ``bulk`` lane; a full lane
+    rejects immediately with ``Overloaded``. Worker threads always prefer the
+    interactive lane, but after ``interactive_burst`` consecutive interactive
+    jobs a waiting bulk job is taken so bulk work can't starve. A job whose
+    deadline cannot be met (estimated from recent service times) or has
+    already passed is rejected with ``DeadlineExceeded`` without running.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_queue: Optional[Dict[str, int]] = None,
+        interactive_burst: int = 8,
+        retry_after: float = 1.0,
+        history_size: int = 2048,
+    ):
+        self.workers = max(1, workers)
+        self.max_queue = {INTERACTIVE: 256, BULK: 16, **(max_queue or {})}
+        self.interactive_burst = max(1, interactive_burst)
+        self.retry_after = retry_after
+
+        self._queues = {lane: deque() for lane in LANES}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._interactive_streak = 0
+
+        self._service_time = {lane: 0.0 for lane in LANES}
+        self._counters = {
+            lane: {"admitted": 0, "completed": 0, "failed": 0, "shed_full": 0, "shed_deadline": 0}
+            for lane in LANES
+        }
+        self._queue_waits_ms = {lane: deque(maxlen=history_size) for lane in LANES}
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Inference scheduler started: workers={self.workers}, max_queue={self.max_queue}")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            pending = [job for lane in LANES for job in self._queues[lane]]
+            for lane in LANES:
+                self._queues[lane].clear()
+            self._cond.notify_all()
+        for job in pending:
+            self._resolve(job, exc=RuntimeError("inference scheduler is shutting down"))
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _estimated_wait(self, lane: str) -> float:
+        """Грубая оценка ожидания: работа впереди в очереди / число воркеров"""
+        ahead = len(self._queues[INTERACTIVE]) * self._service_time[INTERACTIVE]
+        if lane == BULK:
+            ahead += len(self._queues[BULK]) * self._service_time[BULK]
+        return (ahead + self._service_time[lane]) / self.workers
+
+    async def run(self, lane: str, fn: Callable, *args, deadline: Optional[float] = None) -> Any:
+        """Выполняет fn(*args) в полосе lane; deadline — абсолютное время по time.monotonic()"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _Job(lane, fn, args, future, loop, deadline)
+
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("inference scheduler is not started")
+            if len(self._queues[lane]) >= self.max_queue[lane]:
+                self._counters[lane]["shed_full"] += 1
+                raise Overloaded(lane, self.retry_after)
+            if deadline is not None and time.monotonic() + self._estimated_wait(lane) > deadline:
+                self._counters[lane]["shed_deadline"] += 1
+                raise DeadlineExceeded(lane, max(self.retry_after, self._estimated_wait(lane)))
+            self._queues[lane].append(job)
+            self._counters[lane]["admitted"] += 1
+            self._cond.notify()
+
+        try:
+            if deadline is None:
+                return await future
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            job.abandoned = True
+            future.cancel()
+            raise DeadlineExceeded(lane, self.retry_after)
+        except asyncio.CancelledError:
+            job.abandoned = True
+            raise
+
+    def _next_job(self) -> Optional[_Job]:
+        interactive, bulk = self._queues[INTERACTIVE], self._queues[BULK]
+        if bulk and (not interactive or self._interactive_streak >= self.interactive_burst):
+            self._interactive_streak = 0
+            return bulk.popleft()
+        if interactive:
+            self._interactive_streak += 1 if bulk else 0
+            return interactive.popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if not self._running:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+
+                started = time.monotonic()
+                self._queue_waits_ms[job.lane].append((started - job.enqueued) * 1000)
+                if job.abandoned:
+                    continue
+                expired = job.deadline is not None and started > job.deadline
+                if expired:
+                    self._counters[job.lane]["shed_deadline"] += 1
+
+            if expired:
+                self._resolve(job, exc=DeadlineExceeded(job.lane, self.retry_after))
+                continue
+
+            result = error = None
+            try:
+                result = job.fn(*job.args)
+            except Exception as e:
+                error = e
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._counters[job.lane]["failed" if error is not None else "completed"] += 1
+                previous = self._service_time[job.lane]
+                self._service_time[job.lane] = elapsed if previous == 0 else 0.8 * previous + 0.2 * elapsed
+            self._resolve(job, result=result, exc=error)
+
+    @staticmethod
+    def _resolve(job: _Job, result: Any = None, exc: Optional[BaseException] = None):
+        """Завершает future в его event loop; done()/cancelled() тоже проверяются только там"""
+        def apply():
+            if job.future.done():
+                return
+            if exc is not None:
+                job.future.set_exception(exc)
+            else:
+                job.future.set_result(result)
+
+        try:
+            job.loop.call_soon_threadsafe(apply)
+        except RuntimeError:
+            pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            snapshot = {
+                lane: (
+                    np.fromiter(self._queue_waits_ms[lane], dtype=np.float64),
+                    len(self._queues[lane]),
+                    self._service_time[lane],
+                    dict(self._counters[lane]),
+                )
+                for lane in LANES
+            }
+        lanes = {}
+        for lane, (waits, depth, service_time, counters) in snapshot.items():
+            if waits.size:
+                p50, p95, p99 = np.percentile(waits, [50, 95, 99])
+            else:
+                p50 = p95 = p99 = 0.0
+            lanes[lane] = {
+                "queue_depth": depth,
+                "max_queue": self.max_queue[lane],
+                "avg_service_ms": round(service_time * 1000, 3),
+                "queue_wait_ms": {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)},
+                **counters,
+            }
+        return {"workers": self.workers, "interactive_burst": self.interactive_burst, "lanes": lanes}
@@ -0,0 +1,372 @@
+"""Inference backends for the sentiment transformer.
+
+SENTIMENT_BACKEND selects how logits are computed:
+    torch      - eager PyTorch (default)
+    onnx       - ONNX Runtime on an exported fp32 graph
+    onnx-int8  - ONNX Runtime on a dynamically INT8-quantized graph
+
+The ONNX graph is exported from the loaded torch model on first use and
+reused from SENTIMENT_ONNX_DIR afterwards. Besides the logits it outputs
+the mean-pooled last hidden state ("embeddings"), so a single forward pass
+serves both sentiment and the embedding topic head / /embed.
+
+Parity check against the torch path:
+    python sentiment_backend.py parity --backend onnx-int8 [--csv reviews.csv]
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Ускорение torch-бэкенда: трассировка TorchScript или torch.compile
+TORCH_OPTIMIZATIONS = ("off", "trace", "compile")
+MODEL_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+ONNX_OPSET = 14
+EMBEDDINGS_OUTPUT = "embeddings"
+
+# Допуски по вероятностям относительно torch-бэкенда
+PARITY_ATOL = {"torch": 1e-6, "onnx": 1e-4, "onnx-int8": 0.05}
+PARITY_MIN_LABEL_AGREEMENT = 0.97
+
+REFERENCE_TEXTS = [
+    "Очень доволен приложением банка, всё работает быстро и понятно.",
+    "Приложение постоянно виснет, поддержка не отвечает уже неделю. Ужас!",
+    "Обычный опыт, ничего особенного.",
+    "Открыл вклад под хороший процент, менеджер всё подробно объяснил.",
+    "Списали комиссию за обслуживание карты, хотя обещали бесплатное.",
+    "Кэшбек начисляют вовремя, категории удобные.",
+    "В отделении огромная очередь, работает одно окно, сотрудники грубят.",
+    "Ипотеку одобрили за два дня, ставка ниже, чем в других банках.",
+    "Банкомат съел карту, деньги вернули только через месяц.",
+    "Зарплатная карта, пользуюсь несколько лет, претензий нет.",
+    "Кредитную карту навязали при оформлении кредита, страховку не вернули.",
+    "Нормальный банк, но мобильное приложение могло бы быть удобнее. "
+    "Переводы по СБП проходят без проблем, а вот выписку найти сложно.",
+]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def mean_pool(hidden, attention_mask):
+    """Среднее скрытых состояний по непаддинговым токенам (torch-тензоры)"""
+    mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+    return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+
+
+def pooled_module(model, input_names: List[str]):
+    """nn.Module с позиционными входами, отдающий (логиты, mean-pooled эмбеддинги)"""
+    import torch
+
+    class LogitsAndEmbeddings(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.classifier = model
+
+        def forward(self, *args):
+            inputs = dict(zip(input_names, args))
+            outputs = self.classifier(**inputs, output_hidden_states=True)
+            return outputs.logits, mean_pool(outputs.hidden_states[-1], inputs["attention_mask"])
+
+    return LogitsAndEmbeddings().eval()
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model, device):
+        import torch
+
+        self.torch = torch
+        self.model = model
+        self.device = device
+        self.optimization = "off"
+        self._runner = None
+        self._runner_inputs = None
+
+    def set_num_threads(self, threads: int):
+        self.torch.set_num_threads(threads)
+
+    def optimize(self, mode: str, sample: Dict[str, np.ndarray]):
+        """Трассирует (trace) или компилирует (compile) модель на примере батча"""
+        if mode not in TORCH_OPTIMIZATIONS:
+            raise ValueError(f"Unknown optimization '{mode}', expected one of {TORCH_OPTIMIZATIONS}")
+        if mode == "off":
+            self.reset_optimization()
+            return
+        torch = self.torch
+        input_names = [name for name in MODEL_INPUTS if name in sample]
+        module = pooled_module(self.model, input_names)
+        if mode == "trace":
+            example = tuple(torch.from_numpy(np.asarray(sample[name])).to(self.device) for name in input_names)
+            with torch.no_grad():
+                runner = torch.jit.trace(module, example, strict=False, check_trace=False)
+        else:
+            runner = torch.compile(module, dynamic=True)
+        self._runner, self._runner_inputs, self.optimization = runner, input_names, mode
+
+    def reset_optimization(self):
+        self._runner, self._runner_inputs, self.optimization = None, None, "off"
+
+    def logits(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        if self._runner is not None:
+            return self.encode(batch)[0]
+        torch = self.torch
+        inputs = {k: torch.from_numpy(np.asarray(v)).to(self.device) for k, v in batch.items()}
+        with torch.inference_mode():
+            return self.model(**inputs).logits.float().cpu().numpy()
+
+    def encode(self, batch: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Логиты и mean-pooled эмбеддинги последнего слоя за один прогон"""
+        torch = self.torch
+        inputs = {k: torch.from_numpy(np.asarray(v)).to(self.device) for k, v in batch.items()}
+        with torch.inference_mode():
+            if self._runner is not None:
+                logits, embeddings = self._runner(*(inputs[name] for name in self._runner_inputs))
+            else:
+                outputs = self.model(**inputs, output_hidden_states=True)
+                logits, embeddings = outputs.logits, mean_pool(outputs.hidden_states[-1], inputs["attention_mask"])
+            return logits.float().cpu().numpy(), embeddings.float().cpu().numpy()
+
+
+class OnnxBackend:
+    """ONNX Runtime backend.
+
+    The session (and its thread pool) is created lazily and dropped in
+    forked children, because ORT thread pools don't survive a fork.
+    """
+
+    def __init__(self, onnx_path: str, name: str = "onnx", intra_op_threads: int = 0):
+        self.name = name
+        self.onnx_path = onnx_path
+        self.intra_op_threads = intra_op_threads
+        self._session = None
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        os.register_at_fork(after_in_child=self._drop_session)
+
+    def _drop_session(self):
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import onnxruntime as ort
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = self.intra_op_threads
+            self._session = ort.InferenceSession(
+                self.onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+        return self._session
+
+    def set_num_threads(self, threads: int):
+        self.intra_op_threads = threads
+        self._session = None
+
+    def logits(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        feed = {name: np.asarray(batch[name], dtype=np.int64) for name in self.input_names if name in batch}
+        return self.session.run(["logits"], feed)[0]
+
+    def encode(self, batch: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        if EMBEDDINGS_OUTPUT not in self.output_names:
+            raise RuntimeError(f"ONNX graph {self.onnx_path} has no '{EMBEDDINGS_OUTPUT}' output")
+        feed = {name: np.asarray(batch[name], dtype=np.int64) for name in self.input_names if name in batch}
+        logits, embeddings = self.session.run(["logits", EMBEDDINGS_OUTPUT], feed)
+        return logits, embeddings
+
+
+def export_onnx(model, tokenizer, path: str):
+    """Экспорт torch-модели в ONNX с динамическими осями batch/sequence.
+
+    Граф отдаёт логиты и mean-pooled эмбеддинги (EMBEDDINGS_OUTPUT).
+    """
+    import torch
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    sample = tokenizer(["пример отзыва", "ещё один пример отзыва для экспорта"], padding=True, return_tensors="pt")
+    input_names = [name for name in MODEL_INPUTS if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    dynamic_axes[EMBEDDINGS_OUTPUT] = {0: "batch"}
+
+    model = model.to("cpu").eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            pooled_module(model, input_names),
+            tuple(sample[name] for name in input_names),
+            path,
+            input_names=input_names,
+            output_names=["logits", EMBEDDINGS_OUTPUT],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True,
+        )
+    logging.info(f"Sentiment model exported to ONNX: {path}")
+
+
+def quantize_onnx(source_path: str, target_path: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source_path, target_path, weight_type=QuantType.QInt8)
+    logging.info(f"Sentiment model quantized to INT8: {target_path}")
+
+
+def _has_embeddings_output(path: str) -> bool:
+    import onnx
+
+    graph = onnx.load(path, load_external_data=False).graph
+    return any(output.name == EMBEDDINGS_OUTPUT for output in graph.output)
+
+
+def create_backend(name: str, model, tokenizer, device, onnx_dir: str):
+    """Создаёт бэкенд по имени, при необходимости экспортируя ONNX-граф"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SENTIMENT_BACKEND '{name}', expected one of {BACKENDS}")
+    if name == "torch":
+        return TorchBackend(model, device)
+
+    fp32_path = os.path.join(onnx_dir, "model.onnx")
+    int8_path = os.path.join(onnx_dir, "model.int8.onnx")
+    if os.path.exists(fp32_path) and not _has_embeddings_output(fp32_path):
+        # Граф из старой версии без выхода эмбеддингов — экспортируем заново
+        logging.info(f"{fp32_path} has no '{EMBEDDINGS_OUTPUT}' output, re-exporting")
+        for stale in (fp32_path, int8_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+    if not os.path.exists(fp32_path):
+        export_onnx(model, tokenizer, fp32_path)
+        model.to(device)
+    if name == "onnx":
+        return OnnxBackend(fp32_path, name=name)
+
+    if not os.path.exists(int8_path):
+        quantize_onnx(fp32_path, int8_path)
+    return OnnxBackend(int8_path, name=name)
+
+
+def run_backend(backend, tokenizer, texts: List[str], max_length: int = 256) -> np.ndarray:
+    batch = tokenizer(texts, truncation=True, padding=True, max_length=max_length, return_tensors="np")
+    return softmax(backend.logits(dict(batch)))
+
+
+def check_parity(
+    reference,
+    candidate,
+    tokenizer,
+    texts: List[str],
+    atol: Optional[float] = None,
+    min_label_agreement: float = PARITY_MIN_LABEL_AGREEMENT,
+    batch_size: int = 32,
+) -> dict:
+    """Сравнивает метки и вероятности кандидата с эталонным бэкендом"""
+    atol = PARITY_ATOL.get(candidate.name, 1e-4) if atol is None else atol
+    ref_probs, cand_probs = [], []
+    ref_time = cand_time = 0.0
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+        started = time.perf_counter()
+        ref_probs.append(run_backend(reference, tokenizer, chunk))
+        ref_time += time.perf_counter() - started
+        started = time.perf_counter()
+        cand_probs.append(run_backend(candidate, tokenizer, chunk))
+        cand_time += time.perf_counter() - started
+
+    ref_probs = np.concatenate(ref_probs)
+    cand_probs = np.concatenate(cand_probs)
+    diff = np.abs(ref_probs - cand_probs)
+    label_agreement = float((ref_probs.argmax(axis=1) == cand_probs.argmax(axis=1)).mean())
+    max_abs_diff = float(diff.max())
+
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "num_texts": len(texts),
+        "atol": atol,
+        "max_abs_diff": max_abs_diff,
+        "mean_abs_diff": float(diff.mean()),
+        "label_agreement": label_agreement,
+        "reference_ms_per_text": ref_time * 1000 / len(texts),
+        "candidate_ms_per_text": cand_time * 1000 / len(texts),
+        "passed": max_abs_diff <= atol and label_agreement >= min_label_agreement,
+    }
+
+
+def load_reference_texts(csv_path: Optional[str], limit: int) -> List[str]:
+    """Непустые значения колонки text; только stdlib csv, pandas в образе нет"""
+    if not csv_path:
+        return list(REFERENCE_TEXTS)
+    import csv
+    import sys
+
+    csv.field_size_limit(sys.maxsize)
+    texts = []
+    # utf-8-sig: парсеры сохраняют CSV с BOM
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            text = row.get("text")
+            if text and text.strip():
+                texts.append(text)
+                if len(texts) >= limit:
+                    break
+    return texts
+
+
+def check_shape_parity(reference, candidate, batches: Dict[Tuple[int, int], Dict[str, np.ndarray]], atol: float) -> dict:
+    """Сверяет логиты кандидата с эталоном на каждой форме (batch, tokens); ошибка прогона — тоже расхождение"""
+    failed = {}
+    max_abs_diff = 0.0
+    for shape, batch in batches.items():
+        try:
+            diff = float(np.abs(reference.logits(batch) - candidate.logits(batch)).max())
+        except Exception as e:
+            failed[f"{shape[0]}x{shape[1]}"] = f"{type(e).__name__}: {e}"
+            continue
+        max_abs_diff = max(max_abs_diff, diff)
+        if not diff <= atol:
+            failed[f"{shape[0]}x{shape[1]}"] = f"max_abs_diff {diff:.2e}"
+    return {
+        "num_shapes": len(batches),
+        "atol": atol,
+        "max_abs_diff": max_abs_diff,
+        "failed_shapes": failed,
+        "passed": not failed,
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    parser = argparse.ArgumentParser(description="Export / parity check for sentiment backends")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--backend", default=os.environ.get("SENTIMENT_BACKEND", "onnx-int8"), choices=BACKENDS)
+    parser.add_argument("--model-path", default=os.environ.get("SENTIMENT_MODEL_PATH", "/app/sentimentmodel"))
+    parser.add_argument("--onnx-dir", default=os.environ.get("SENTIMENT_ONNX_DIR", "/app/onnx"))
+    parser.add_argument("--csv", help="CSV с колонкой text для эталонного набора")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--atol", type=float)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model_path).eval()
+    cpu = torch.device("cpu")
+
+    backend = create_backend(args.backend, model, tokenizer, cpu, args.onnx_dir)
+    if args.command == "parity":
+        texts = load_reference_texts(args.csv, args.limit)
+        report = check_parity(TorchBackend(model, cpu), backend, tokenizer, texts, atol=args.atol)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        raise SystemExit(0 if report["passed"] else 1)
@@ -0,0 +1,142 @@
+"""Pre-fork entry point for model-service.
+
+The master process loads the sentiment model, vectorizer and topic model
+once, freezes the GC so refcount/GC bookkeeping doesn't dirty the shared
+pages, binds the listening socket and forks MODEL_SERVICE_WORKERS uvicorn
+workers. Model weights are shared copy-on-write; every worker gets its own
+inference threads, batcher and Kafka producer, sized to its share of the
+available cores; with CPU_AFFINITY each worker is also pinned to its own
+slice of cores (see cpu_topology.py). Crashed workers are restarted.
+
+    python serve.py
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from cpu_topology import affinity_pool, available_cores, configure_interop_threads, pin_current_process, worker_cores
+
+HOST = os.environ.get("MODEL_SERVICE_HOST", "0.0.0.0")
+PORT = int(os.environ.get("MODEL_SERVICE_PORT", "3002"))
+WORKERS = os.environ.get("MODEL_SERVICE_WORKERS", "auto")
+THREADS_PER_WORKER = os.environ.get("TORCH_THREADS_PER_WORKER", "auto")
+LOG_LEVEL = os.environ.get("MODEL_SERVICE_LOG_LEVEL", "info")
+RESTART_BACKOFF_S = 1.0
+
+
+def resolve_workers(cores: int) -> int:
+    if WORKERS == "auto":
+        return cores
+    return max(1, int(WORKERS))
+
+
+def resolve_threads(cores: int, workers: int) -> int:
+    if THREADS_PER_WORKER == "auto":
+        return max(1, cores // workers)
+    return max(1, int(THREADS_PER_WORKER))
+
+
+def bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(server, sock: socket.socket, threads: int, cores=None):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    if cores and pin_current_process(cores):
+        if THREADS_PER_WORKER == "auto":
+            threads = len(cores)
+        logging.info(f"[worker {os.getpid()}] pinned to cores {cores}")
+    server.configure_threads(threads)
+    logging.info(f"[worker {os.getpid()}] intra-op threads: {threads}")
+
+    config = uvicorn.Config(server.app, log_level=LOG_LEVEL, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    cores = available_cores()
+    workers = resolve_workers(cores)
+    threads = resolve_threads(cores, workers)
+
+    # До fork torch работает в одном потоке: пул OpenMP, поднятый в мастере,
+    # не переживает fork и может подвесить воркеров.
+    import torch
+    torch.set_num_threads(1)
+    configure_interop_threads()
+    pool = affinity_pool()
+
+    import server
+
+    started = time.perf_counter()
+    server.load_models(warm=False)
+    logging.info(f"Models loaded in master in {time.perf_counter() - started:.2f}s")
+
+    sock = bind_socket()
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    shutting_down = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(server, sock, threads, worker_cores(slot, workers, pool) if pool else None)
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        logging.info(f"Started worker {slot} (pid {pid})")
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logging.info(f"Serving on {HOST}:{PORT} with {workers} workers x {threads} threads ({cores} cores)")
+    for slot in range(workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None or shutting_down:
+            continue
+        logging.warning(f"Worker {slot} (pid {pid}) exited with status {status}, restarting")
+        time.sleep(RESTART_BACKOFF_S)
+        spawn(slot)
+
+    sock.close()
+    logging.info("All workers stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
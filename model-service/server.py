@@ -1,85 +1,567 @@
+import asyncio
 import json
 import os
 import pickle
-from typing import List
+import threading
+import time
+from typing import List, Optional, Tuple
 
-import torch
-from fastapi import FastAPI, HTTPException
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from producer import build_message_batch
+from starlette.concurrency import run_in_threadpool
+from batching import MicroBatcher, length_buckets
+from cache import PredictionCache, artifacts_fingerprint
+from readiness import PENDING, Readiness
+from topics import FALLBACK_TOPIC, decode_topics, load_topic_thresholds, positive_class_proba
+from scheduler import BULK, INTERACTIVE, DeadlineExceeded, InferenceScheduler, Overloaded
+from cascade import STAGE_TRANSFORMER, CascadeStats, cascade_predict, fast_proba
+from cpu_topology import affinity_pool, available_cores, configure_interop_threads, pin_current_process
+from embedding_topics import TopicHead
+from topic_arrays import has_arrays, load_arrays
+from long_text import POOLING_MODES, windowed_encode, windowed_logits
+from sentiment_backend import REFERENCE_TEXTS, softmax
+from producer import build_message_batch, ensure_topic_exists, publisher
 from datetime import datetime, timezone
 
 MODEL_PATH = os.environ.get("SENTIMENT_MODEL_PATH", r"full_path_to_model")
+TOPIC_MODEL_PATH = os.environ.get("TOPIC_MODEL_PATH", "/app/sklearn_model.pkl")
+VECTORIZER_PATH = os.environ.get("VECTORIZER_PATH", "/app/vectorizer.pkl")
+TOPIC_ARRAYS_DIR = os.environ.get("TOPIC_ARRAYS_DIR", "/app/topic_arrays")
+CLASS_INFO_PATH = os.environ.get("CLASS_INFO_PATH", "/app/class_info.json")
+TOPIC_THRESHOLDS_PATH = os.environ.get(
+    "TOPIC_THRESHOLDS_PATH", os.path.join(os.path.dirname(CLASS_INFO_PATH), "topic_thresholds.json")
+)
+TOPIC_DECODE_MODE = os.environ.get("TOPIC_DECODE_MODE", "predict").lower()
+TOPIC_SOURCE = os.environ.get("TOPIC_SOURCE", "sklearn").lower()
+TOPIC_HEAD_PATH = os.environ.get("TOPIC_HEAD_PATH", "/app/topic_head.npz")
+EMBED_MAX_TEXTS = int(os.environ.get("EMBED_MAX_TEXTS", "1024"))
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get("PREDICT_BATCH_WINDOW_MS", "5"))
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get("PREDICT_MAX_BATCH_SIZE", "32"))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+INFERENCE_INTERACTIVE_QUEUE = int(os.environ.get("INFERENCE_INTERACTIVE_QUEUE", "256"))
+INFERENCE_BULK_QUEUE = int(os.environ.get("INFERENCE_BULK_QUEUE", "16"))
+INFERENCE_INTERACTIVE_BURST = int(os.environ.get("INFERENCE_INTERACTIVE_BURST", "8"))
+INFERENCE_INTERACTIVE_TIMEOUT_MS = float(os.environ.get("INFERENCE_INTERACTIVE_TIMEOUT_MS", "2000"))
+INFERENCE_BULK_TIMEOUT_MS = float(os.environ.get("INFERENCE_BULK_TIMEOUT_MS", "120000"))
+INFERENCE_RETRY_AFTER_S = float(os.environ.get("INFERENCE_RETRY_AFTER_S", "1"))
+# Заголовок, отключающий публикацию результатов запроса в Kafka (ставит benchmark.py)
+SKIP_PUBLISH_HEADER = "X-Skip-Publish"
+PREDICT_STREAM_BATCH_SIZE = int(os.environ.get("PREDICT_STREAM_BATCH_SIZE", "256"))
+PREDICT_STREAM_MAX_LINE_BYTES = int(os.environ.get("PREDICT_STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+SENTIMENT_MAX_LENGTH = int(os.environ.get("SENTIMENT_MAX_LENGTH", "256"))
+SENTIMENT_TOKEN_BUDGET = int(os.environ.get("SENTIMENT_TOKEN_BUDGET", "8192"))
+SENTIMENT_MAX_SUBBATCH = int(os.environ.get("SENTIMENT_MAX_SUBBATCH", "64"))
+SENTIMENT_BACKEND = os.environ.get("SENTIMENT_BACKEND", "torch").lower()
+SENTIMENT_ONNX_DIR = os.environ.get("SENTIMENT_ONNX_DIR", "/app/onnx")
+SENTIMENT_COMPILE = os.environ.get("SENTIMENT_COMPILE", "off").lower()
+WARMUP_SHAPES = os.environ.get("WARMUP_SHAPES", "auto").lower()
+WARMUP_ITERATIONS = int(os.environ.get("WARMUP_ITERATIONS", "3"))
+SENTIMENT_PARITY_CHECK = os.environ.get("SENTIMENT_PARITY_CHECK", "true").lower() in ("1", "true", "yes")
+SENTIMENT_LONG_TEXT = os.environ.get("SENTIMENT_LONG_TEXT", "false").lower() in ("1", "true", "yes")
+SENTIMENT_WINDOW_STRIDE = int(os.environ.get("SENTIMENT_WINDOW_STRIDE", "64"))
+SENTIMENT_WINDOW_POOLING = os.environ.get("SENTIMENT_WINDOW_POOLING", "mean").lower()
+SENTIMENT_MAX_WINDOWS = int(os.environ.get("SENTIMENT_MAX_WINDOWS", "16"))
+SENTIMENT_CASCADE = os.environ.get("SENTIMENT_CASCADE", "false").lower() in ("1", "true", "yes")
+FAST_SENTIMENT_PATH = os.environ.get("FAST_SENTIMENT_PATH", "/app/fast_sentiment.pkl")
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "0.85"))
+CASCADE_AUDIT_RATE = float(os.environ.get("CASCADE_AUDIT_RATE", "0.02"))
+PREDICTION_CACHE_ENABLED = os.environ.get("PREDICTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_MAX_BYTES = int(os.environ.get("PREDICTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", "86400"))
+PREDICTION_CACHE_DISK_PATH = os.environ.get("PREDICTION_CACHE_DISK_PATH", "")
+PREDICTION_CACHE_DISK_MAX_BYTES = int(os.environ.get("PREDICTION_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+PREDICTION_CACHE_MAINTENANCE_S = float(os.environ.get("PREDICTION_CACHE_MAINTENANCE_S", "60"))
+MODEL_ARTIFACT_PATHS = [
+    MODEL_PATH, TOPIC_MODEL_PATH, VECTORIZER_PATH, CLASS_INFO_PATH, TOPIC_THRESHOLDS_PATH, TOPIC_HEAD_PATH,
+    TOPIC_ARRAYS_DIR, FAST_SENTIMENT_PATH
+]
+
+# Модели загружаются в фоне при старте (load_models), чтобы процесс сразу
+# принимал соединения; до готовности /readyz и эндпоинты инференса отвечают 503.
+device = None
+tokenizer = None
+sentiment_model = None
+sentiment_backend = None
+topic_model = None
+vectorizer = None
+topic_class_names = []
+topic_thresholds = None
+topic_head = None
+fast_sentiment_model = None
+cascade_stats = CascadeStats()
+intra_op_threads = None
+warmup_report = None
+# Fingerprint артефактов, снятый перед их чтением: им помечаются записи кэша предсказаний
+models_fingerprint = None
+
+readiness = Readiness()
+readiness.register("sentiment_model")
+readiness.register("topic_model", critical=False)
+readiness.register("warmup")
+readiness.register("kafka_topic", critical=False)
+if SENTIMENT_CASCADE and TOPIC_SOURCE != "embedding":
+    readiness.register("fast_sentiment", critical=False)
+_load_lock = threading.Lock()
+
+
+def load_sentiment_model():
+    global device, tokenizer, sentiment_model, sentiment_backend
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    import sentiment_backend as backends
+
+    if SENTIMENT_LONG_TEXT and SENTIMENT_WINDOW_POOLING not in POOLING_MODES:
+        raise RuntimeError(f"SENTIMENT_WINDOW_POOLING must be one of {POOLING_MODES}")
+    if SENTIMENT_LONG_TEXT and not 0 <= SENTIMENT_WINDOW_STRIDE < SENTIMENT_MAX_LENGTH // 2:
+        raise RuntimeError("SENTIMENT_WINDOW_STRIDE must be smaller than half of SENTIMENT_MAX_LENGTH")
+
+    if torch.backends.mps.is_available():
+        device = torch.device("mps")
+    elif torch.cuda.is_available():
+        device = torch.device("cuda")
+    else:
+        device = torch.device("cpu")
+    print("Using device:", device)
 
-if torch.backends.mps.is_available():
-    device = torch.device("mps")
-elif torch.cuda.is_available():
-    device = torch.device("cuda")
-else:
-    device = torch.device("cpu")
-print("Using device:", device)
-
-try:
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-    sentiment_model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH).to(device)
-    print("Sentiment model loaded successfully")
-except Exception as e:
-    raise RuntimeError(f"Ошибка при загрузке sentiment модели/tokenizer из {MODEL_PATH}: {e}")
-
-try:
-    with open('/app/sklearn_model.pkl', 'rb') as f:
-        topic_model = pickle.load(f)
-    with open('/app/vectorizer.pkl', 'rb') as f:
-        vectorizer = pickle.load(f)
-    with open('/app/class_info.json', 'r', encoding='utf-8') as f:
-        class_info = json.load(f)
-        topic_class_names = class_info['class_names']
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
+        sentiment_model = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH).to(device)
+        print("Sentiment model loaded successfully")
+    except Exception as e:
+        raise RuntimeError(f"Ошибка при загрузке sentiment модели/tokenizer из {MODEL_PATH}: {e}")
+
+    try:
+        backend = backends.create_backend(SENTIMENT_BACKEND, sentiment_model, tokenizer, device, SENTIMENT_ONNX_DIR)
+        if SENTIMENT_PARITY_CHECK and backend.name != "torch":
+            parity = backends.check_parity(
+                backends.TorchBackend(sentiment_model, device), backend, tokenizer, REFERENCE_TEXTS
+            )
+            print(f"Sentiment backend parity check: {parity}")
+            if not parity["passed"]:
+                raise RuntimeError(f"parity check failed for backend '{backend.name}'")
+    except Exception as e:
+        print(f"Ошибка при инициализации sentiment бэкенда '{SENTIMENT_BACKEND}', используется torch: {e}")
+        backend = backends.TorchBackend(sentiment_model, device)
+
+    if backend.name == "torch" and SENTIMENT_COMPILE != "off":
+        try:
+            sample = tokenizer(
+                REFERENCE_TEXTS, truncation=True, padding=True, max_length=SENTIMENT_MAX_LENGTH, return_tensors="np"
+            )
+            backend.optimize(SENTIMENT_COMPILE, dict(sample))
+            eager = backends.TorchBackend(sentiment_model, device)
+            parity = backends.check_parity(eager, backend, tokenizer, REFERENCE_TEXTS, atol=1e-4)
+            if not parity["passed"]:
+                raise RuntimeError(f"parity check failed: {parity}")
+            # Трассированный граф может быть специализирован под форму примера: сверяем все формы length_buckets
+            rng = np.random.default_rng(0)
+            shape_parity = backends.check_shape_parity(
+                eager, backend, {shape: synthetic_batch(*shape, rng) for shape in warmup_shapes()}, atol=1e-4
+            )
+            if not shape_parity["passed"]:
+                raise RuntimeError(f"parity check failed on shapes: {shape_parity['failed_shapes']}")
+            print(f"Sentiment model optimized with '{SENTIMENT_COMPILE}'")
+        except Exception as e:
+            print(f"SENTIMENT_COMPILE={SENTIMENT_COMPILE} unavailable, running eager torch: {e}")
+            backend.reset_optimization()
+
+    if intra_op_threads is not None:
+        backend.set_num_threads(intra_op_threads)
+    sentiment_backend = backend
+    print("Sentiment backend:", sentiment_backend.name)
+
+
+def configure_threads(threads: Optional[int] = None):
+    """Потоки инференса процесса.
+
+    serve.py передаёт долю ядер воркера; при запуске через uvicorn напрямую
+    берётся TORCH_THREADS_PER_WORKER (auto — все доступные ядра) и, если
+    задан CPU_AFFINITY, процесс привязывается к этим ядрам.
+    """
+    global intra_op_threads
+
+    if threads is None:
+        pool = affinity_pool()
+        if pool:
+            pin_current_process(pool)
+        configured = os.environ.get("TORCH_THREADS_PER_WORKER", "auto")
+        threads = available_cores() if configured == "auto" else max(1, int(configured))
+    configure_interop_threads()
+    intra_op_threads = threads
+    if sentiment_backend is not None:
+        sentiment_backend.set_num_threads(threads)
+
+
+def load_topic_model():
+    global topic_model, vectorizer, topic_class_names, topic_thresholds, topic_head
+
+    if TOPIC_SOURCE not in ("sklearn", "embedding"):
+        raise RuntimeError(f"TOPIC_SOURCE must be 'sklearn' or 'embedding', got '{TOPIC_SOURCE}'")
+    if TOPIC_SOURCE == "embedding":
+        # Голова на эмбеддингах трансформера: TF-IDF и sklearn-модель не загружаются
+        try:
+            head = TopicHead.load(TOPIC_HEAD_PATH)
+            if head.dim != sentiment_model.config.hidden_size:
+                raise RuntimeError(
+                    f"topic head expects {head.dim}-d embeddings, model has {sentiment_model.config.hidden_size}"
+                )
+            thresholds = load_topic_thresholds(TOPIC_THRESHOLDS_PATH, head.class_names)
+        except Exception as e:
+            print(f"Ошибка при загрузке topic головы {TOPIC_HEAD_PATH}: {e}")
+            raise
+
+        topic_class_names = head.class_names
+        topic_thresholds = thresholds
+        topic_head = head
+        print(f"Embedding topic head loaded with {len(topic_class_names)} classes: {topic_class_names}")
+        return
+
+    try:
+        if has_arrays(TOPIC_ARRAYS_DIR):
+            # Массивы в mmap: без unpickle, страницы общие для всех воркеров
+            vec, model, class_names = load_arrays(TOPIC_ARRAYS_DIR)
+            print(f"Topic model arrays mapped from {TOPIC_ARRAYS_DIR}")
+        else:
+            with open(TOPIC_MODEL_PATH, 'rb') as f:
+                model = pickle.load(f)
+            with open(VECTORIZER_PATH, 'rb') as f:
+                vec = pickle.load(f)
+            with open(CLASS_INFO_PATH, 'r', encoding='utf-8') as f:
+                class_info = json.load(f)
+                class_names = class_info['class_names']
+        thresholds = load_topic_thresholds(TOPIC_THRESHOLDS_PATH, class_names)
+    except Exception as e:
+        print(f"Ошибка при загрузке topic модели: {e}")
+        raise
+
+    topic_class_names = class_names
+    topic_thresholds = thresholds
+    vectorizer = vec
+    topic_model = model
     print(f"Topic model loaded successfully with {len(topic_class_names)} classes: {topic_class_names}")
-except Exception as e:
-    print(f"Ошибка при загрузке topic модели: {e}")
-    topic_model = None
-    vectorizer = None
-    topic_class_names = []
+
+
+def load_fast_sentiment_model():
+    global fast_sentiment_model
+
+    if vectorizer is None:
+        raise RuntimeError("fast sentiment model needs the topic vectorizer")
+    with open(FAST_SENTIMENT_PATH, 'rb') as f:
+        fast_sentiment_model = pickle.load(f)
+    print(f"Fast sentiment model loaded, cascade threshold {CASCADE_THRESHOLD}")
+
+
+def warmup_shapes() -> List[Tuple[int, int]]:
+    """Формы (batch, tokens) для прогрева.
+
+    auto — формы, которые реально даёт length_buckets: одиночный запрос и
+    полный под-батч в пределах SENTIMENT_TOKEN_BUDGET для длин 16, 32, ...
+    до SENTIMENT_MAX_LENGTH. Иначе список вида "1x32,16x128,32x256".
+    """
+    if WARMUP_SHAPES != "auto":
+        shapes = []
+        for item in WARMUP_SHAPES.split(","):
+            if item.strip():
+                batch, length = item.strip().split("x")
+                shapes.append((max(1, int(batch)), max(2, min(int(length), SENTIMENT_MAX_LENGTH))))
+        return shapes
+
+    shapes = []
+    length = 16
+    while True:
+        length = min(length, SENTIMENT_MAX_LENGTH)
+        full = max(1, min(SENTIMENT_MAX_SUBBATCH, SENTIMENT_TOKEN_BUDGET // length))
+        shapes.append((1, length))
+        if full > 1:
+            shapes.append((full, length))
+        if length >= SENTIMENT_MAX_LENGTH:
+            return shapes
+        length *= 2
+
+
+def synthetic_batch(batch: int, length: int, rng: np.random.Generator) -> dict:
+    """Батч из случайных токенов словаря с [CLS]/[SEP] по краям, без паддинга"""
+    input_ids = rng.integers(1000, tokenizer.vocab_size, size=(batch, length), dtype=np.int64)
+    input_ids[:, 0] = tokenizer.cls_token_id
+    input_ids[:, -1] = tokenizer.sep_token_id
+    inputs = {"input_ids": input_ids, "attention_mask": np.ones((batch, length), dtype=np.int64)}
+    if "token_type_ids" in tokenizer.model_input_names:
+        inputs["token_type_ids"] = np.zeros((batch, length), dtype=np.int64)
+    return inputs
+
+
+def warm_up():
+    """Прогрев: прогон типичных форм батчей и полного пайплайна без кэша.
+
+    Первые прогоны каждой формы выбирают ядра, выделяют буферы и (при
+    SENTIMENT_COMPILE) компилируют граф, поэтому после прогрева первые
+    запросы не медленнее остальных. Отчёт с таймингами — в /stats.
+    """
+    global warmup_report
+
+    started = time.perf_counter()
+    run = sentiment_backend.encode if topic_head is not None else sentiment_backend.logits
+    rng = np.random.default_rng(0)
+    shapes = []
+    for batch, length in warmup_shapes():
+        inputs = synthetic_batch(batch, length, rng)
+        timings = []
+        for _ in range(max(1, WARMUP_ITERATIONS)):
+            shape_started = time.perf_counter()
+            run(inputs)
+            timings.append((time.perf_counter() - shape_started) * 1000)
+        shapes.append({
+            "batch": batch,
+            "tokens": length,
+            "first_ms": round(timings[0], 2),
+            "steady_ms": round(min(timings), 2),
+        })
+
+    pipeline_started = time.perf_counter()
+    _forward(REFERENCE_TEXTS, with_embeddings=topic_head is not None)
+    if topic_model is not None:
+        _predict_topics_uncached(REFERENCE_TEXTS)
+    pipeline_ms = (time.perf_counter() - pipeline_started) * 1000
+
+    warmup_report = {
+        "backend": sentiment_backend.name,
+        "optimization": getattr(sentiment_backend, "optimization", "off"),
+        "intra_op_threads": intra_op_threads,
+        "shapes": shapes,
+        "pipeline_ms": round(pipeline_ms, 2),
+        "total_s": round(time.perf_counter() - started, 3),
+    }
+    print(f"Warm-up finished: {json.dumps(warmup_report)}")
+
+
+def warm_up_or_fall_back():
+    """Прогрев; если оптимизированный граф падает на какой-то форме — откат на eager и повторный прогрев"""
+    try:
+        warm_up()
+    except Exception as e:
+        if getattr(sentiment_backend, "optimization", "off") == "off":
+            raise
+        print(f"Warm-up failed with SENTIMENT_COMPILE={sentiment_backend.optimization}, retrying eager torch: {e}")
+        sentiment_backend.reset_optimization()
+        warm_up()
+
+
+def load_models(warm: bool = True):
+    """Загружает ещё не загруженные модели и (при warm=True) прогревает их.
+
+    serve.py вызывает load_models(warm=False) в мастер-процессе до fork,
+    а прогрев выполняется уже в каждом воркере при старте приложения.
+    """
+    global models_fingerprint
+    with _load_lock:
+        if models_fingerprint is None:
+            models_fingerprint = artifacts_fingerprint(MODEL_ARTIFACT_PATHS)
+        if readiness.state("sentiment_model") == PENDING:
+            try:
+                with readiness.track("sentiment_model"):
+                    load_sentiment_model()
+            except Exception as e:
+                print(f"Sentiment model failed to load: {e}")
+                return
+        if readiness.state("topic_model") == PENDING:
+            try:
+                with readiness.track("topic_model"):
+                    load_topic_model()
+            except Exception:
+                pass
+        if SENTIMENT_CASCADE and TOPIC_SOURCE != "embedding" and readiness.state("fast_sentiment") == PENDING:
+            try:
+                with readiness.track("fast_sentiment"):
+                    load_fast_sentiment_model()
+            except Exception as e:
+                print(f"Fast sentiment model failed to load, cascade disabled: {e}")
+        if prediction_cache is not None:
+            prediction_cache.bind(models_fingerprint)
+        if warm and readiness.state("warmup") == PENDING and sentiment_model is not None:
+            try:
+                with readiness.track("warmup"):
+                    warm_up_or_fall_back()
+            except Exception as e:
+                # Без прогрева сервис работоспособен, просто первые запросы медленнее
+                print(f"Warm-up failed, serving without it: {e}")
+                readiness.degrade("warmup", str(e))
+
+
+def provision_kafka_topic():
+    try:
+        with readiness.track("kafka_topic"):
+            if not ensure_topic_exists():
+                raise RuntimeError("Kafka topic was not provisioned")
+    except Exception as e:
+        print(f"Kafka topic provisioning failed: {e}")
+
+
+def require_ready():
+    if not readiness.is_ready():
+        raise HTTPException(
+            status_code=503,
+            detail="Service is starting, models are not loaded yet",
+            headers={"Retry-After": str(max(1, round(INFERENCE_RETRY_AFTER_S)))}
+        )
+
+
+prediction_cache = None
+if PREDICTION_CACHE_ENABLED:
+    prediction_cache = PredictionCache(
+        max_bytes=PREDICTION_CACHE_MAX_BYTES,
+        ttl_seconds=PREDICTION_CACHE_TTL_SECONDS,
+        disk_path=PREDICTION_CACHE_DISK_PATH or None,
+        disk_max_bytes=PREDICTION_CACHE_DISK_MAX_BYTES,
+        maintenance_interval=PREDICTION_CACHE_MAINTENANCE_S,
+    )
 
 
 def predict_sentiment(texts: List[str]):
-    """Predict sentiment using transformer model"""
-    inputs = tokenizer(
+    """Predict sentiment, serving repeated texts from the prediction cache"""
+    if prediction_cache is None:
+        return _predict_sentiment_uncached(texts)
+
+    def compute(missing_texts):
+        return _predict_sentiment_uncached(missing_texts)[1].tolist()
+
+    num_labels = sentiment_model.config.num_labels
+    probs = np.array(
+        prediction_cache.get_or_compute(sentiment_namespace(), texts, compute),
+        dtype=np.float32
+    ).reshape(len(texts), num_labels)
+    return probs.argmax(axis=1).tolist(), probs
+
+
+def sentiment_namespace() -> str:
+    namespace = f"sentiment:{sentiment_backend.name}"
+    if SENTIMENT_LONG_TEXT:
+        namespace += f":windows-{SENTIMENT_MAX_LENGTH}-{SENTIMENT_WINDOW_STRIDE}-{SENTIMENT_WINDOW_POOLING}"
+    return namespace
+
+
+def _predict_sentiment_uncached(texts: List[str]):
+    probs, _ = _forward(texts)
+    return probs.argmax(axis=1).tolist(), probs
+
+
+def _forward(texts: List[str], with_embeddings: bool = False):
+    """Sentiment probabilities (and pooled embeddings) from one transformer pass.
+
+    Inputs are sorted by token length and run in sub-batches whose padded
+    size stays under SENTIMENT_TOKEN_BUDGET, so short reviews don't pay for
+    the longest one and peak memory doesn't grow with the request size.
+    With SENTIMENT_LONG_TEXT long reviews are scored by overlapping windows
+    instead of being truncated (see long_text.py); their embedding is the
+    mean over windows. Embeddings are None unless ``with_embeddings``.
+    """
+    num_labels = sentiment_model.config.num_labels
+    if not texts:
+        embeddings = np.empty((0, sentiment_model.config.hidden_size), dtype=np.float32) if with_embeddings else None
+        return np.empty((0, num_labels), dtype=np.float32), embeddings
+
+    def buckets(lengths):
+        return length_buckets(lengths, SENTIMENT_TOKEN_BUDGET, SENTIMENT_MAX_SUBBATCH)
+
+    if SENTIMENT_LONG_TEXT:
+        windows = dict(
+            window=SENTIMENT_MAX_LENGTH,
+            stride=SENTIMENT_WINDOW_STRIDE,
+            pooling=SENTIMENT_WINDOW_POOLING,
+            max_windows=SENTIMENT_MAX_WINDOWS,
+        )
+        if with_embeddings:
+            logits, embeddings = windowed_encode(tokenizer, texts, sentiment_backend.encode, buckets, **windows)
+            return softmax(logits), embeddings
+        return softmax(windowed_logits(tokenizer, texts, sentiment_backend.logits, buckets, **windows)), None
+
+    encoded = tokenizer(
         texts,
-        return_tensors="pt",
         truncation=True,
-        padding=True,
-        max_length=256
+        max_length=SENTIMENT_MAX_LENGTH
+    )
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+
+    probs = np.empty((len(texts), num_labels), dtype=np.float32)
+    embeddings = None
+    if with_embeddings:
+        embeddings = np.empty((len(texts), sentiment_model.config.hidden_size), dtype=np.float32)
+    for bucket in buckets(lengths):
+        features = [{key: encoded[key][i] for key in encoded.keys()} for i in bucket]
+        inputs = dict(tokenizer.pad(features, return_tensors="np"))
+        if with_embeddings:
+            logits, embeddings[bucket] = sentiment_backend.encode(inputs)
+        else:
+            logits = sentiment_backend.logits(inputs)
+        probs[bucket] = softmax(logits)
+
+    return probs, embeddings
+
+
+def predict_sentiment_and_topics(texts: List[str]):
+    """Sentiment and embedding-head topics from a single transformer pass (TOPIC_SOURCE=embedding)"""
+    def compute(missing_texts):
+        probs, embeddings = _forward(missing_texts, with_embeddings=True)
+        scores = topic_head.predict_proba(embeddings)
+        decoded = decode_topics(scores >= topic_thresholds, topic_class_names, scores)
+        return [[prob, topics, topic_scores] for prob, (topics, topic_scores) in zip(probs.tolist(), decoded)]
+
+    if prediction_cache is None:
+        values = compute(texts)
+    else:
+        values = prediction_cache.get_or_compute(f"{sentiment_namespace()}:topic-head", texts, compute)
+
+    num_labels = sentiment_model.config.num_labels
+    probs = np.array([value[0] for value in values], dtype=np.float32).reshape(len(texts), num_labels)
+    return (
+        probs.argmax(axis=1).tolist(),
+        probs,
+        [value[1] for value in values],
+        [value[2] for value in values],
     )
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    with torch.no_grad():
-        outputs = sentiment_model(**inputs)
-        logits = outputs.logits
-    probs = torch.softmax(logits, dim=1).cpu().numpy()
-    preds = torch.argmax(logits, dim=1).cpu().numpy().tolist()
-    return preds, probs
+
+
+def embed_texts(texts: List[str], dtype: str = "float32", normalize: bool = False) -> np.ndarray:
+    """Mean-pooled embeddings of the sentiment transformer's last layer"""
+    _, embeddings = _forward(texts, with_embeddings=True)
+    if normalize:
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    return embeddings.astype(dtype)
 
 
 def predict_topics(texts: List[str]) -> List[List[str]]:
     """Predict topics using sklearn multi-label model"""
+    return [topics for topics, _ in predict_topics_scored(texts)]
+
+
+def predict_topics_scored(texts: List[str]) -> List[Tuple[List[str], List[float]]]:
+    """Topics with per-topic scores (probabilities in proba mode, 1.0 for hard predict)"""
+    if topic_head is not None:
+        _, _, topics_batch, topic_scores_batch = predict_sentiment_and_topics(texts)
+        return list(zip(topics_batch, topic_scores_batch))
     if topic_model is None or vectorizer is None:
-        return [["другое"] for _ in texts]
-    
+        return [([FALLBACK_TOPIC], [0.0]) for _ in texts]
+
     try:
-        X = vectorizer.transform(texts)
-        
-        y_pred = topic_model.predict(X)
-        
-        results = []
-        for pred_row in y_pred:
-            topics = [topic_class_names[i] for i, val in enumerate(pred_row) if val == 1]
-            results.append(topics if topics else ["другое"])
-        
-        return results
+        if prediction_cache is None:
+            return _predict_topics_uncached(texts)
+        cached = prediction_cache.get_or_compute(f"topics:{TOPIC_DECODE_MODE}", texts, _predict_topics_uncached)
+        return [(topics, scores) for topics, scores in cached]
     except Exception as e:
         print(f"Error predicting topics: {e}")
-        return [["другое"] for _ in texts]
+        return [([FALLBACK_TOPIC], [0.0]) for _ in texts]
+
+
+def _predict_topics_uncached(texts: List[str]) -> List[Tuple[List[str], List[float]]]:
+    X = vectorizer.transform(texts)
+
+    if TOPIC_DECODE_MODE == "proba":
+        scores = positive_class_proba(topic_model, X)
+        return decode_topics(scores >= topic_thresholds, topic_class_names, scores)
+
+    return decode_topics(topic_model.predict(X), topic_class_names)
 
 
 def map_sentiment_to_text(label: int) -> str:
@@ -92,9 +574,122 @@ def map_sentiment_to_text(label: int) -> str:
     return sentiment_map.get(label, "нейтрально")
 
 
+def predict_sentiment_staged(texts: List[str]):
+    """Sentiment with the stage that decided each item.
+
+    With SENTIMENT_CASCADE and a loaded fast model, texts go through the
+    linear model first and only uncertain ones reach the transformer
+    (see cascade.py); otherwise every item is decided by the transformer.
+    """
+    if fast_sentiment_model is None or not texts:
+        preds, probs = predict_sentiment(texts)
+        return preds, probs, [STAGE_TRANSFORMER] * len(texts)
+
+    num_labels = sentiment_model.config.num_labels
+    return cascade_predict(
+        texts,
+        lambda batch: fast_proba(fast_sentiment_model, vectorizer, batch, num_labels),
+        predict_sentiment,
+        CASCADE_THRESHOLD,
+        audit_rate=CASCADE_AUDIT_RATE,
+        stats=cascade_stats,
+    )
+
+
+def predict_texts(texts: List[str]):
+    """Sentiment (with deciding stage) and topics (with per-topic scores) for a batch of texts"""
+    if topic_head is not None:
+        preds, probs, topics_batch, topic_scores_batch = predict_sentiment_and_topics(texts)
+        return preds, probs, topics_batch, topic_scores_batch, [STAGE_TRANSFORMER] * len(texts)
+
+    preds, probs, stages = predict_sentiment_staged(texts)
+    scored = predict_topics_scored(texts)
+    topics_batch = [topics for topics, _ in scored]
+    topic_scores_batch = [scores for _, scores in scored]
+    return preds, probs, topics_batch, topic_scores_batch, stages
+
+
+def predict_single_batch(texts: List[str]):
+    """Batched inference for coalesced /predict_single requests"""
+    preds, probs, topics_batch, topic_scores_batch, stages = predict_texts(texts)
+    return [
+        (pred, prob.tolist(), topics, topic_scores, stage)
+        for pred, prob, topics, topic_scores, stage in zip(preds, probs, topics_batch, topic_scores_batch, stages)
+    ]
+
+
+inference_scheduler = InferenceScheduler(
+    workers=INFERENCE_WORKERS,
+    max_queue={INTERACTIVE: INFERENCE_INTERACTIVE_QUEUE, BULK: INFERENCE_BULK_QUEUE},
+    interactive_burst=INFERENCE_INTERACTIVE_BURST,
+    retry_after=INFERENCE_RETRY_AFTER_S,
+)
+
+single_batcher = MicroBatcher(
+    predict_single_batch,
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    window_ms=PREDICT_BATCH_WINDOW_MS,
+    name="predict_single",
+    max_queue_size=INFERENCE_INTERACTIVE_QUEUE,
+    run=lambda handler, items: inference_scheduler.run(INTERACTIVE, handler, items),
+    retry_after=INFERENCE_RETRY_AFTER_S,
+)
+
 app = FastAPI()
 
 
+@app.on_event("startup")
+async def start_batchers():
+    if intra_op_threads is None:
+        configure_threads()
+    threading.Thread(target=load_models, name="model-loader", daemon=True).start()
+    threading.Thread(target=provision_kafka_topic, name="kafka-topic", daemon=True).start()
+    inference_scheduler.start()
+    publisher.start()
+    if prediction_cache is not None:
+        prediction_cache.start_maintenance()
+    await single_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_batchers():
+    await single_batcher.stop()
+    inference_scheduler.stop()
+    if prediction_cache is not None:
+        prediction_cache.stop_maintenance()
+    await run_in_threadpool(publisher.stop, 15)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))}
+    )
+
+
+def request_deadline(request: Request, default_timeout_ms: float) -> Optional[float]:
+    """Абсолютный дедлайн (time.monotonic) из заголовка X-Request-Timeout-Ms или значения по умолчанию"""
+    raw = request.headers.get("X-Request-Timeout-Ms")
+    try:
+        timeout_ms = float(raw) if raw is not None else default_timeout_ms
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid X-Request-Timeout-Ms header")
+    if timeout_ms <= 0:
+        return None
+    return time.monotonic() + timeout_ms / 1000
+
+
 class PredictRequest(BaseModel):
     text: str
 
@@ -108,11 +703,19 @@ class PredictBatchRequest(BaseModel):
     data: List[TextData]
 
 
+class EmbedRequest(BaseModel):
+    texts: List[str]
+    dtype: str = "float32"
+    normalize: bool = False
+
+
 class PredictResponse(BaseModel):
     text: str
     label: int
     probabilities: List[float]
     tags: List[str]
+    tag_scores: List[float] = []
+    stage: str = STAGE_TRANSFORMER
 
     def get_json_response(self):
         return {
@@ -127,73 +730,271 @@ class PredictionItem(BaseModel):
     id: int
     topics: List[str]
     sentiments: List[str]
+    topic_scores: List[float] = []
+    sentiment_stage: str = STAGE_TRANSFORMER
 
 
 class PredictBatchResponse(BaseModel):
     predictions: List[PredictionItem]
 
 
+def publish_skipped(request: Request) -> bool:
+    """Запрос с X-Skip-Publish: 1 (бенчмарк, проверки) не публикуется в Kafka"""
+    return request.headers.get(SKIP_PUBLISH_HEADER) == "1"
+
+
+async def publish_predictions(kafka_messages: List[dict], request: Request, response: Response):
+    """Публикует результаты после инференса; если очередь Kafka заполнилась за время
+    инференса, предсказание всё равно отдаётся клиенту с X-Publish-Status: rejected"""
+    if publish_skipped(request):
+        response.headers["X-Publish-Status"] = "skipped"
+        return
+    try:
+        await run_in_threadpool(build_message_batch, kafka_messages)
+    except Overloaded as e:
+        print(f"Kafka queue filled up during inference, {len(kafka_messages)} results not published: {e}")
+        response.headers["X-Publish-Status"] = "rejected"
+        response.headers["Retry-After"] = str(max(1, round(e.retry_after)))
+
+
 @app.post("/predict_single", response_model=PredictResponse)
-def predict_endpoint(req: PredictRequest):
+async def predict_endpoint(req: PredictRequest, request: Request, response: Response):
+    require_ready()
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Empty text")
+    if not publish_skipped(request):
+        publisher.admit(1)
 
-    preds, probs = predict_sentiment([req.text])
-    topics = predict_topics([req.text])[0]
+    deadline = request_deadline(request, INFERENCE_INTERACTIVE_TIMEOUT_MS)
+    try:
+        label, probabilities, topics, topic_scores, stage = await asyncio.wait_for(
+            single_batcher.submit(req.text),
+            timeout=None if deadline is None else max(0.0, deadline - time.monotonic())
+        )
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(INTERACTIVE, INFERENCE_RETRY_AFTER_S)
 
     prediction = PredictResponse(
         text=req.text,
-        label=preds[0],
-        probabilities=probs[0].tolist(),
-        tags=topics 
+        label=label,
+        probabilities=probabilities,
+        tags=topics,
+        tag_scores=topic_scores,
+        stage=stage
     )
 
-    build_message_batch([prediction.get_json_response()])
+    await publish_predictions([prediction.get_json_response()], request, response)
     return prediction
 
 
 @app.post("/predict", response_model=PredictBatchResponse)
-def predict_batch_endpoint(req: PredictBatchRequest):
+async def predict_batch_endpoint(req: PredictBatchRequest, request: Request, response: Response):
+    require_ready()
     if not req.data:
         raise HTTPException(status_code=400, detail="Empty data list")
+    if not publish_skipped(request):
+        publisher.admit(len(req.data))
 
     texts = [item.text for item in req.data]
-    
-    sentiment_preds, sentiment_probs = predict_sentiment(texts)
-    
-    topics_batch = predict_topics(texts)
 
+    sentiment_preds, _, topics_batch, topic_scores_batch, stages = await inference_scheduler.run(
+        BULK, predict_texts, texts,
+        deadline=request_deadline(request, INFERENCE_BULK_TIMEOUT_MS)
+    )
+
+    predictions, kafka_messages = build_predictions(req.data, sentiment_preds, topics_batch, topic_scores_batch, stages)
+
+    await publish_predictions(kafka_messages, request, response)
+
+    return PredictBatchResponse(predictions=predictions)
+
+
+def build_predictions(
+    items: List[TextData],
+    sentiment_preds: List[int],
+    topics_batch: List[List[str]],
+    topic_scores_batch: List[List[float]],
+    stages: List[str]
+):
+    """Ответы API и сообщения для Kafka по результатам инференса"""
     kafka_messages = []
     predictions = []
-    
-    for item, sent_pred, sent_prob, topics in zip(req.data, sentiment_preds, sentiment_probs, topics_batch):
+
+    for item, sent_pred, topics, topic_scores, stage in zip(items, sentiment_preds, topics_batch, topic_scores_batch, stages):
         sentiment_text = map_sentiment_to_text(sent_pred)
         sentiments_per_topic = [sentiment_text] * len(topics)
-        
+
         predictions.append(PredictionItem(
             id=item.id,
             topics=topics,
-            sentiments=sentiments_per_topic
+            sentiments=sentiments_per_topic,
+            topic_scores=topic_scores,
+            sentiment_stage=stage
         ))
-        
+
         kafka_messages.append({
             "text": item.text,
             "sentiment": sent_pred,
             "date": datetime.now(timezone.utc).isoformat(),
             "tags": topics
         })
-    
-    build_message_batch(kafka_messages)
-    
-    return PredictBatchResponse(predictions=predictions)
+
+    return predictions, kafka_messages
+
+
+@app.post("/embed")
+async def embed_endpoint(req: EmbedRequest, request: Request):
+    """Батч эмбеддингов (n, dim); с Accept: application/octet-stream — сырой little-endian массив"""
+    require_ready()
+    if not req.texts:
+        raise HTTPException(status_code=400, detail="Empty texts list")
+    if len(req.texts) > EMBED_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {EMBED_MAX_TEXTS} texts per request")
+    if req.dtype not in ("float16", "float32"):
+        raise HTTPException(status_code=400, detail="dtype must be 'float16' or 'float32'")
+
+    embeddings = await inference_scheduler.run(
+        BULK, embed_texts, req.texts, req.dtype, req.normalize,
+        deadline=request_deadline(request, INFERENCE_BULK_TIMEOUT_MS)
+    )
+
+    if "application/octet-stream" in request.headers.get("accept", ""):
+        return Response(
+            content=embeddings.astype(embeddings.dtype.newbyteorder("<"), copy=False).tobytes(),
+            media_type="application/octet-stream",
+            headers={
+                "X-Embedding-Shape": f"{embeddings.shape[0]},{embeddings.shape[1]}",
+                "X-Embedding-Dtype": req.dtype,
+            }
+        )
+    return {
+        "dim": embeddings.shape[1],
+        "dtype": req.dtype,
+        "embeddings": embeddings.tolist(),
+    }
+
+
+async def score_stream_batch(items: List[TextData], publish: bool = True) -> bytes:
+    """Скоринг одного внутреннего батча /predict_stream; при переполнении очередей ждёт, а не отказывает"""
+    texts = [item.text for item in items]
+    while True:
+        try:
+            sentiment_preds, _, topics_batch, topic_scores_batch, stages = await inference_scheduler.run(
+                BULK, predict_texts, texts
+            )
+            break
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+
+    predictions, kafka_messages = build_predictions(items, sentiment_preds, topics_batch, topic_scores_batch, stages)
+    while publish:
+        try:
+            await run_in_threadpool(build_message_batch, kafka_messages)
+            break
+        except Overloaded as e:
+            await asyncio.sleep(e.retry_after)
+    return b"".join(prediction.model_dump_json().encode("utf-8") + b"\n" for prediction in predictions)
+
+
+def stream_error_line(line_no: int, error: str) -> bytes:
+    return json.dumps({"line": line_no, "error": error}, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+@app.post("/predict_stream")
+async def predict_stream_endpoint(request: Request):
+    """NDJSON in ({"id": .., "text": ..} per line), NDJSON out, scored in internal batches.
+
+    The body is consumed incrementally and each batch of
+    PREDICT_STREAM_BATCH_SIZE lines is scored and streamed back before more
+    input is read, so memory stays constant regardless of upload size.
+    Malformed lines produce {"line": n, "error": ...} instead of aborting.
+    """
+    require_ready()
+    publish = not publish_skipped(request)
+
+    async def results():
+        batch = []
+        buffer = b""
+        line_no = 0
+
+        def handle_line(raw: bytes):
+            if not raw.strip():
+                return None
+            try:
+                item = TextData.model_validate_json(raw)
+            except ValueError as e:
+                return stream_error_line(line_no, str(e).splitlines()[0])
+            if not item.text.strip():
+                return stream_error_line(line_no, "Empty text")
+            batch.append(item)
+            return None
+
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for raw in lines:
+                line_no += 1
+                error = handle_line(raw)
+                if error is not None:
+                    yield error
+                if len(batch) >= PREDICT_STREAM_BATCH_SIZE:
+                    yield await score_stream_batch(batch, publish)
+                    batch = []
+            if len(buffer) > PREDICT_STREAM_MAX_LINE_BYTES:
+                yield stream_error_line(line_no + 1, "Line too long")
+                return
+
+        if buffer.strip():
+            line_no += 1
+            error = handle_line(buffer)
+            if error is not None:
+                yield error
+        if batch:
+            yield await score_stream_batch(batch, publish)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/livez")
+def livez():
+    return {"status": "alive", "uptime_s": round(time.time() - readiness.started_at, 3)}
+
+
+@app.get("/readyz")
+def readyz():
+    snapshot = readiness.snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
 
 
 @app.get("/health")
 def health():
     return {
-        "status": sentiment_model.config.num_labels == 3,
+        "status": sentiment_model is not None and sentiment_model.config.num_labels == 3,
+        "ready": readiness.is_ready(),
         "device": str(device),
-        "topic_model_loaded": topic_model is not None,
+        "sentiment_backend": sentiment_backend.name if sentiment_backend is not None else None,
+        "sentiment_optimization": getattr(sentiment_backend, "optimization", "off"),
+        "intra_op_threads": intra_op_threads,
+        "topic_model_loaded": topic_model is not None or topic_head is not None,
+        "topic_source": TOPIC_SOURCE,
+        "topic_decode_mode": TOPIC_DECODE_MODE,
         "num_topic_classes": len(topic_class_names) if topic_class_names else 0,
         "topic_classes": topic_class_names
     }
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "predict_single_batcher": single_batcher.stats(),
+        "inference_scheduler": inference_scheduler.stats(),
+        "prediction_cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "kafka_publisher": publisher.stats(),
+        "warmup": warmup_report,
+        "sentiment_cascade": {
+            "enabled": fast_sentiment_model is not None,
+            "threshold": CASCADE_THRESHOLD,
+            "audit_rate": CASCADE_AUDIT_RATE,
+            **cascade_stats.snapshot(),
+        },
+    }
@@ -0,0 +1,50 @@
+"""length_buckets: упаковка текстов по длине в пределах бюджета токенов"""
+import random
+
+import pytest
+
+from batching import length_buckets
+
+
+def padded_tokens(bucket, lengths):
+    return len(bucket) * max(lengths[i] for i in bucket)
+
+
+def test_empty():
+    assert length_buckets([], 1024, 8) == []
+
+
+def test_every_index_exactly_once_in_length_order():
+    lengths = [30, 5, 12, 5, 64, 1]
+    buckets = length_buckets(lengths, 64, 4)
+    flat = [i for bucket in buckets for i in bucket]
+    assert sorted(flat) == list(range(len(lengths)))
+    assert [lengths[i] for i in flat] == sorted(lengths)
+
+
+def test_padded_size_fits_budget():
+    assert length_buckets([10, 10, 10, 10, 30], 40, 8) == [[0, 1, 2, 3], [4]]
+
+
+def test_budget_boundary_is_inclusive():
+    assert length_buckets([16, 16, 16, 16, 16], 64, 8) == [[0, 1, 2, 3], [4]]
+
+
+def test_max_batch_size_splits_short_texts():
+    assert length_buckets([1] * 5, 10_000, 2) == [[0, 1], [2, 3], [4]]
+
+
+def test_text_longer_than_budget_gets_its_own_bucket():
+    assert length_buckets([8, 500, 8], 64, 8) == [[0, 2], [1]]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_batches_respect_limits(seed):
+    rng = random.Random(seed)
+    lengths = [rng.randint(1, 512) for _ in range(200)]
+    budget, max_batch = 2048, 16
+    buckets = length_buckets(lengths, budget, max_batch)
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    for bucket in buckets:
+        assert len(bucket) <= max_batch
+        assert len(bucket) == 1 or padded_tokens(bucket, lengths) <= budget
@@ -0,0 +1,172 @@
+"""PredictionCache: учёт байтов LRU, вытеснение, TTL, привязка к версии моделей, дисковый уровень"""
+import json
+import types
+
+import pytest
+
+import cache as cache_module
+from cache import PredictionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+def blob_size(value):
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def upper(calls):
+    def compute(texts):
+        calls.extend(texts)
+        return [text.upper() for text in texts]
+    return compute
+
+
+def make_cache(**options):
+    cache = PredictionCache(**options)
+    cache.bind("fp1")
+    return cache
+
+
+def test_unbound_cache_is_bypassed():
+    calls = []
+    cache = PredictionCache()
+    assert cache.get_or_compute("ns", ["a", "a"], upper(calls)) == ["A", "A"]
+    assert calls == ["a", "a"]
+    assert cache.stats()["entries"] == 0
+
+
+def test_bytes_follow_serialized_values(clock):
+    cache = make_cache(max_bytes=1000)
+    cache.get_or_compute("ns", ["привет", "b"], upper([]))
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["bytes"] == blob_size("ПРИВЕТ") + blob_size("B")
+
+
+def test_duplicates_and_whitespace_are_computed_once(clock):
+    calls = []
+    cache = make_cache()
+    assert cache.get_or_compute("ns", ["a  b", " a b ", "a b"], upper(calls)) == ["A  B"] * 3
+    assert calls == ["a  b"]
+    assert cache.get_or_compute("ns", ["a b"], upper(calls)) == ["A  B"]
+    assert calls == ["a  b"]
+
+
+def test_lru_eviction_keeps_bytes_under_limit(clock):
+    item = blob_size("X" * 10)
+    cache = make_cache(max_bytes=3 * item)
+    calls = []
+    for text in ("a" * 10, "b" * 10, "c" * 10):
+        cache.get_or_compute("ns", [text], upper(calls))
+    # "a" становится самым свежим, вытесняется "b"
+    cache.get_or_compute("ns", ["a" * 10], upper(calls))
+    cache.get_or_compute("ns", ["d" * 10], upper(calls))
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (3, 3 * item, 1)
+    calls.clear()
+    cache.get_or_compute("ns", ["a" * 10, "b" * 10, "c" * 10, "d" * 10], upper(calls))
+    assert calls == ["b" * 10]
+
+
+def test_value_larger_than_cache_is_not_stored(clock):
+    cache = make_cache(max_bytes=8)
+    cache.get_or_compute("ns", ["a" * 20], upper([]))
+    assert (cache.stats()["entries"], cache.stats()["bytes"]) == (0, 0)
+
+
+def test_replacing_an_entry_does_not_double_count(clock):
+    cache = make_cache(max_bytes=1000, ttl_seconds=10)
+    cache.get_or_compute("ns", ["a"], upper([]))
+    clock.now += 11
+    cache.get_or_compute("ns", ["a"], upper([]))
+    assert cache.stats()["bytes"] == blob_size("A")
+
+
+def test_expired_entries_are_recomputed(clock):
+    calls = []
+    cache = make_cache(ttl_seconds=10)
+    cache.get_or_compute("ns", ["a"], upper(calls))
+    clock.now += 9
+    cache.get_or_compute("ns", ["a"], upper(calls))
+    assert calls == ["a"]
+    clock.now += 2
+    cache.get_or_compute("ns", ["a"], upper(calls))
+    assert calls == ["a", "a"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+    assert stats["bytes"] == blob_size("A")
+
+
+def test_namespaces_do_not_collide(clock):
+    cache = make_cache()
+    cache.get_or_compute("sentiment", ["a"], lambda texts: [1])
+    assert cache.get_or_compute("topics", ["a"], lambda texts: [2]) == [2]
+
+
+def test_rebinding_to_new_models_invalidates(clock):
+    calls = []
+    cache = make_cache()
+    cache.get_or_compute("ns", ["a"], upper(calls))
+    cache.bind("fp1")
+    cache.get_or_compute("ns", ["a"], upper(calls))
+    assert calls == ["a"]
+
+    cache.bind("fp2")
+    assert (cache.stats()["bytes"], cache.stats()["invalidations"]) == (0, 1)
+    cache.get_or_compute("ns", ["a"], upper(calls))
+    assert calls == ["a", "a"]
+
+
+def test_result_computed_across_rebind_is_not_stored(clock):
+    cache = make_cache()
+
+    def compute(texts):
+        cache.bind("fp2")
+        return ["old model"] * len(texts)
+
+    assert cache.get_or_compute("ns", ["a"], compute) == ["old model"]
+    assert cache.get_or_compute("ns", ["a"], lambda texts: ["new model"]) == ["new model"]
+
+
+def test_disk_tier_is_shared_and_trimmed(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    first = make_cache(disk_path=path, ttl_seconds=10)
+    first.get_or_compute("ns", ["a", "b"], upper([]))
+
+    calls = []
+    second = make_cache(disk_path=path, ttl_seconds=10)
+    assert second.get_or_compute("ns", ["a"], upper(calls)) == ["A"]
+    assert calls == [] and second.stats()["disk_hits"] == 1
+
+    second.bind("fp2")
+    assert second.stats()["disk"]["entries"] == 0
+
+    second.get_or_compute("ns", ["c"], upper([]))
+    clock.now += 11
+    second.maintain()
+    assert second.stats()["disk"]["entries"] == 0
+
+
+def test_disk_tier_trims_oldest_over_size_limit(tmp_path, clock):
+    item = blob_size("X" * 10)
+    cache = make_cache(disk_path=str(tmp_path / "cache.sqlite3"), disk_max_bytes=2 * item)
+    for text in ("a" * 10, "b" * 10, "c" * 10):
+        cache.get_or_compute("ns", [text], upper([]))
+        clock.now += 1
+    cache.maintain()
+    assert cache.stats()["disk"]["entries"] == 2
+    assert cache.stats()["disk"]["bytes"] <= 2 * item
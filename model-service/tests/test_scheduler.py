@@ -0,0 +1,130 @@
+"""InferenceScheduler: приоритет полос, справедливость к bulk, отказы по очереди и дедлайну"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import BULK, INTERACTIVE, DeadlineExceeded, InferenceScheduler, Overloaded
+
+
+def run_with_gate(scheduler, body):
+    """Запускает body(gate) в event loop, пока единственный воркер занят заданием-воротами.
+
+    Пока ворота закрыты, задания только копятся в очередях, поэтому порядок
+    их выполнения определяется планировщиком, а не гонкой с воркером.
+    """
+    gate = threading.Event()
+    running = threading.Event()
+
+    def hold():
+        running.set()
+        gate.wait()
+
+    async def main():
+        scheduler.start()
+        try:
+            blocker = asyncio.ensure_future(scheduler.run(INTERACTIVE, hold))
+            while not running.is_set():
+                await asyncio.sleep(0.001)
+            return await body(gate), await blocker
+        finally:
+            gate.set()
+            scheduler.stop()
+
+    return asyncio.run(main())
+
+
+async def submit_and_release(scheduler, gate, jobs):
+    """Ставит (lane, name) в очередь по порядку, открывает ворота и возвращает порядок выполнения"""
+    order = []
+    tasks = []
+    for lane, name in jobs:
+        tasks.append(asyncio.ensure_future(scheduler.run(lane, order.append, name)))
+        await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_interactive_lane_goes_first():
+    scheduler = InferenceScheduler(workers=1, interactive_burst=8)
+    jobs = [(BULK, "b1"), (BULK, "b2"), (INTERACTIVE, "i1"), (INTERACTIVE, "i2")]
+    order, _ = run_with_gate(scheduler, lambda gate: submit_and_release(scheduler, gate, jobs))
+    assert order == ["i1", "i2", "b1", "b2"]
+
+
+def test_bulk_is_not_starved_by_interactive_burst():
+    scheduler = InferenceScheduler(workers=1, interactive_burst=2)
+    jobs = [(BULK, "b1"), (BULK, "b2")] + [(INTERACTIVE, f"i{n}") for n in range(1, 6)]
+    order, _ = run_with_gate(scheduler, lambda gate: submit_and_release(scheduler, gate, jobs))
+    assert order == ["i1", "i2", "b1", "i3", "i4", "b2", "i5"]
+
+
+def test_full_lane_is_rejected_with_overloaded():
+    scheduler = InferenceScheduler(workers=1, max_queue={BULK: 1}, retry_after=2.5)
+
+    async def body(gate):
+        queued = asyncio.ensure_future(scheduler.run(BULK, lambda: "ok"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as excinfo:
+            await scheduler.run(BULK, lambda: "rejected")
+        gate.set()
+        return excinfo.value, await queued
+
+    (error, result), _ = run_with_gate(scheduler, body)
+    assert (error.lane, error.retry_after, result) == (BULK, 2.5, "ok")
+    assert scheduler.stats()["lanes"][BULK]["shed_full"] == 1
+
+
+def test_past_deadline_is_rejected_on_admission():
+    scheduler = InferenceScheduler(workers=1)
+    called = []
+
+    async def main():
+        scheduler.start()
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await scheduler.run(BULK, called.append, 1, deadline=time.monotonic() - 1)
+        finally:
+            scheduler.stop()
+
+    asyncio.run(main())
+    assert called == []
+    assert scheduler.stats()["lanes"][BULK]["shed_deadline"] == 1
+
+
+def test_deadline_expiring_in_queue_skips_the_job():
+    scheduler = InferenceScheduler(workers=1)
+    called = []
+
+    async def body(gate):
+        with pytest.raises(DeadlineExceeded):
+            await scheduler.run(BULK, called.append, 1, deadline=time.monotonic() + 0.05)
+        gate.set()
+        # Следующее задание выполняется, а брошенное по дедлайну — нет
+        return await scheduler.run(BULK, lambda: "next")
+
+    result, _ = run_with_gate(scheduler, body)
+    assert result == "next"
+    assert called == []
+
+
+def test_failures_and_completions_are_counted():
+    scheduler = InferenceScheduler(workers=2)
+
+    def boom():
+        raise ValueError("boom")
+
+    async def main():
+        scheduler.start()
+        try:
+            assert await scheduler.run(INTERACTIVE, sum, [1, 2, 3]) == 6
+            with pytest.raises(ValueError):
+                await scheduler.run(INTERACTIVE, boom)
+        finally:
+            scheduler.stop()
+
+    asyncio.run(main())
+    lane = scheduler.stats()["lanes"][INTERACTIVE]
+    assert (lane["admitted"], lane["completed"], lane["failed"]) == (2, 1, 1)
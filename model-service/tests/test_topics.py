@@ -0,0 +1,68 @@
+"""decode_topics: пустые батчи, строки без тем, плотные и разреженные матрицы меток"""
+import numpy as np
+import pytest
+from scipy import sparse
+
+from topics import FALLBACK_TOPIC, decode_topics
+
+CLASSES = ["Кэшбек", "Поддержка", FALLBACK_TOPIC, "Ипотека"]
+MASK = np.array([
+    [1, 0, 0, 1],
+    [0, 0, 0, 0],
+    [0, 1, 0, 0],
+    [0, 0, 0, 0],
+], dtype=np.int8)
+SCORES = np.array([
+    [0.91234, 0.1, 0.2, 0.75],
+    [0.1, 0.2, 0.35556, 0.3],
+    [0.05, 0.6, 0.1, 0.1],
+    [0.0, 0.0, 0.0, 0.0],
+])
+
+
+@pytest.mark.parametrize("to_matrix", [np.asarray, sparse.csr_matrix, sparse.csc_matrix], ids=["dense", "csr", "csc"])
+def test_empty_batch(to_matrix):
+    assert decode_topics(to_matrix(np.zeros((0, len(CLASSES)), dtype=np.int8)), CLASSES) == []
+    assert decode_topics(to_matrix(np.zeros((0, len(CLASSES)))), CLASSES, np.zeros((0, len(CLASSES)))) == []
+
+
+@pytest.mark.parametrize("to_matrix", [np.asarray, sparse.csr_matrix, sparse.csc_matrix], ids=["dense", "csr", "csc"])
+def test_topics_with_scores(to_matrix):
+    assert decode_topics(to_matrix(MASK), CLASSES, SCORES) == [
+        (["Кэшбек", "Ипотека"], [0.9123, 0.75]),
+        ([FALLBACK_TOPIC], [0.3556]),
+        (["Поддержка"], [0.6]),
+        ([FALLBACK_TOPIC], [0.0]),
+    ]
+
+
+@pytest.mark.parametrize("to_matrix", [np.asarray, sparse.csr_matrix], ids=["dense", "csr"])
+def test_topics_without_scores(to_matrix):
+    assert decode_topics(to_matrix(MASK), CLASSES) == [
+        (["Кэшбек", "Ипотека"], [1.0, 1.0]),
+        ([FALLBACK_TOPIC], [0.0]),
+        (["Поддержка"], [1.0]),
+        ([FALLBACK_TOPIC], [0.0]),
+    ]
+
+
+def test_all_rows_empty():
+    mask = sparse.csr_matrix((3, len(CLASSES)), dtype=np.int8)
+    assert decode_topics(mask, CLASSES) == [([FALLBACK_TOPIC], [0.0])] * 3
+
+
+def test_explicit_zeros_in_sparse_input_are_ignored():
+    # Явно сохранённые нули (например, после умножения на маску порогов) не считаются темами
+    mask = sparse.csr_matrix((np.array([1, 0]), np.array([0, 1]), np.array([0, 2, 2])), shape=(2, len(CLASSES)))
+    assert mask.nnz == 2
+    assert decode_topics(mask, CLASSES) == [(["Кэшбек"], [1.0]), ([FALLBACK_TOPIC], [0.0])]
+
+
+def test_fallback_without_fallback_class():
+    classes = ["Кэшбек", "Поддержка"]
+    assert decode_topics(np.zeros((1, 2)), classes, np.full((1, 2), 0.4)) == [([FALLBACK_TOPIC], [0.0])]
+
+
+def test_last_row_only():
+    mask = sparse.csr_matrix(np.array([[0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1]]))
+    assert [topics for topics, _ in decode_topics(mask, CLASSES)] == [[FALLBACK_TOPIC], [FALLBACK_TOPIC], ["Ипотека"]]
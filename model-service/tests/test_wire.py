@@ -0,0 +1,125 @@
+"""Бинарный формат processed_data: varint, UTF-8, пустые теги, микросекунды даты.
+
+Эталонный батч из GOLDEN_MESSAGES лежит в
+storage-service/messaging/testdata/feedback_batch_v1.bin и декодируется
+Go-тестом (wire_test.go); пересоздать его после изменения формата:
+
+    python -m tests.test_wire
+"""
+import json
+import os
+
+import pytest
+
+from wire import BINARY_MAGIC, BinaryCodec, JsonCodec, _uvarint, content_type_of, decode_binary
+
+GOLDEN_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "..", "storage-service", "messaging", "testdata", "feedback_batch_v1.bin",
+)
+GOLDEN_MESSAGES = [
+    {
+        "text": "Отличный банк, кэшбек пришёл вовремя 👍",
+        "date": "2024-05-01T12:34:56.789123+00:00",
+        "sentiment": 2,
+        "tags": ["Кэшбек", "Мобильное приложение"],
+    },
+    {"text": "", "date": "1969-12-31T23:59:59.999999+00:00", "sentiment": 0, "tags": []},
+    {
+        "text": "Долго ждал ответа поддержки. " * 10,
+        "date": "2025-01-15T08:00:00.000001+00:00",
+        "sentiment": 1,
+        "tags": ["Мобильное приложение", "Поддержка", "Кэшбек"],
+    },
+]
+
+
+def pack(messages):
+    return BinaryCodec.pack([BinaryCodec.prepare(message) for message in messages])
+
+
+@pytest.mark.parametrize("value, encoded", [
+    (0, b"\x00"),
+    (1, b"\x01"),
+    (127, b"\x7f"),
+    (128, b"\x80\x01"),
+    (300, b"\xac\x02"),
+    (16383, b"\xff\x7f"),
+    (16384, b"\x80\x80\x01"),
+    (2 ** 63, b"\x80\x80\x80\x80\x80\x80\x80\x80\x80\x01"),
+])
+def test_uvarint(value, encoded):
+    out = bytearray()
+    _uvarint(out, value)
+    assert bytes(out) == encoded
+
+
+def test_round_trip():
+    assert decode_binary(pack(GOLDEN_MESSAGES)) == GOLDEN_MESSAGES
+
+
+def test_text_length_crosses_varint_byte():
+    # Длина текста 128 байт кодируется двумя байтами varint
+    text = "я" * 64
+    [record] = decode_binary(pack([{"text": text, "date": "2024-01-01T00:00:00+00:00", "sentiment": 1, "tags": []}]))
+    assert record["text"] == text
+
+
+@pytest.mark.parametrize("date", [
+    "2024-05-01T12:34:56.789123+00:00",
+    "2262-01-01T00:00:00.000001+00:00",
+    "1969-12-31T23:59:59.999999+00:00",
+    "1970-01-01T00:00:00+00:00",
+])
+def test_date_keeps_microseconds(date):
+    [record] = decode_binary(pack([{"text": "x", "date": date, "sentiment": 1, "tags": []}]))
+    assert record["date"] == date
+
+
+def test_naive_and_z_dates_are_utc():
+    records = decode_binary(pack([
+        {"text": "a", "date": "2024-05-01T12:00:00.5", "sentiment": 1, "tags": []},
+        {"text": "b", "date": "2024-05-01T12:00:00.5Z", "sentiment": 1, "tags": []},
+    ]))
+    assert [r["date"] for r in records] == ["2024-05-01T12:00:00.500000+00:00"] * 2
+
+
+def test_empty_batch_and_missing_tags():
+    assert decode_binary(pack([])) == []
+    [record] = decode_binary(pack([{"text": "x", "date": "2024-01-01T00:00:00+00:00", "sentiment": 0}]))
+    assert record["tags"] == []
+
+
+def test_tag_dictionary_is_shared():
+    data = pack(GOLDEN_MESSAGES)
+    assert data.count("Мобильное приложение".encode("utf-8")) == 1
+
+
+def test_size_estimate_is_an_upper_bound():
+    for message in GOLDEN_MESSAGES:
+        part = BinaryCodec.prepare(message)
+        assert len(BinaryCodec.pack([part])) <= BinaryCodec.envelope_size() + BinaryCodec.size(part)
+
+
+def test_content_type_by_magic():
+    assert content_type_of(pack(GOLDEN_MESSAGES)) == BinaryCodec.content_type
+    json_batch = JsonCodec.pack([json.dumps(GOLDEN_MESSAGES[0]).encode()])
+    assert content_type_of(json_batch) == JsonCodec.content_type
+
+
+def test_rejects_foreign_payload():
+    with pytest.raises(ValueError):
+        decode_binary(b'{"batch": []}')
+
+
+def test_golden_payload_is_current():
+    with open(GOLDEN_PATH, "rb") as f:
+        golden = f.read()
+    assert golden.startswith(BINARY_MAGIC)
+    assert golden == pack(GOLDEN_MESSAGES), "формат изменился: пересоздайте эталон (python -m tests.test_wire)"
+
+
+if __name__ == "__main__":
+    with open(GOLDEN_PATH, "wb") as f:
+        f.write(pack(GOLDEN_MESSAGES))
+    print(f"wrote {os.path.normpath(GOLDEN_PATH)}")
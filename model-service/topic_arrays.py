@@ -0,0 +1,221 @@
+"""Pickle-free, memory-mapped format for the TF-IDF vectorizer and topic model.
+
+`export` turns vectorizer.pkl (TfidfVectorizer) and sklearn_model.pkl
+(MultiOutputClassifier of binary LogisticRegression) into plain .npy arrays
+plus meta.json in TOPIC_ARRAYS_DIR:
+
+    vocab.npy          sorted UTF-8 terms (fixed-width bytes), searched with np.searchsorted
+    vocab_columns.npy  feature column of every sorted term
+    idf.npy            IDF weights per column
+    coef.npy           (n_classes, n_features) logistic regression coefficients
+    intercept.npy      (n_classes,)
+    meta.json          class names and the vectorizer settings the transform reproduces
+
+The arrays are opened with np.load(mmap_mode="r"): loading is near-instant,
+does not depend on the scikit-learn version, and every worker process
+shares the same page-cache pages.
+
+    python topic_arrays.py export --out topic_arrays
+    python topic_arrays.py verify --out topic_arrays --csv ../parser/banki_ru/gazprombank_reviews.csv
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import re
+from typing import List
+
+import numpy as np
+from scipy import sparse
+
+FORMAT_VERSION = 1
+META_NAME = "meta.json"
+# Коэффициенты для классов, которые модель никогда (или всегда) предсказывает
+CONSTANT_LOGIT = 30.0
+
+
+class ArrayTfidfVectorizer:
+    """TF-IDF на массивах из export_arrays; повторяет TfidfVectorizer(analyzer="word")"""
+
+    def __init__(self, directory: str, meta: dict):
+        params = meta["vectorizer"]
+        self.lowercase = params["lowercase"]
+        self.token_re = re.compile(params["token_pattern"])
+        self.min_n, self.max_n = params["ngram_range"]
+        self.sublinear_tf = params["sublinear_tf"]
+        self.norm = params["norm"]
+        self.vocab = np.load(os.path.join(directory, "vocab.npy"), mmap_mode="r")
+        self.columns = np.load(os.path.join(directory, "vocab_columns.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(directory, "idf.npy"), mmap_mode="r") if params["use_idf"] else None
+        self.n_features = meta["n_features"]
+
+    def analyze(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        terms = list(tokens) if self.min_n == 1 else []
+        for n in range(max(2, self.min_n), self.max_n + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        doc_ids, terms = [], []
+        for i, text in enumerate(texts):
+            analyzed = self.analyze(text)
+            doc_ids.extend([i] * len(analyzed))
+            terms.extend(term.encode("utf-8") for term in analyzed)
+
+        shape = (len(texts), self.n_features)
+        if not terms:
+            return sparse.csr_matrix(shape, dtype=np.float64)
+
+        # Поиск всех термов батча одним searchsorted по отсортированному словарю
+        terms = np.asarray(terms, dtype=np.bytes_)
+        positions = np.searchsorted(self.vocab, terms)
+        positions[positions == len(self.vocab)] = 0
+        known = self.vocab[positions] == terms
+        docs = np.asarray(doc_ids, dtype=np.int64)[known]
+        cols = np.asarray(self.columns[positions[known]], dtype=np.int64)
+
+        keys, counts = np.unique(docs * self.n_features + cols, return_counts=True)
+        docs, cols = keys // self.n_features, keys % self.n_features
+        values = counts.astype(np.float64)
+        if self.sublinear_tf:
+            values = np.log(values) + 1.0
+        if self.idf is not None:
+            values *= self.idf[cols]
+        if self.norm == "l2":
+            norms = np.sqrt(np.bincount(docs, weights=values * values, minlength=len(texts)))
+            values /= norms[docs]
+        elif self.norm == "l1":
+            values /= np.bincount(docs, weights=np.abs(values), minlength=len(texts))[docs]
+        return sparse.csr_matrix((values, (docs, cols)), shape=shape)
+
+
+class ArrayTopicModel:
+    """Набор независимых бинарных логистических регрессий (как MultiOutputClassifier)"""
+
+    def __init__(self, directory: str, meta: dict):
+        self.coef = np.load(os.path.join(directory, "coef.npy"), mmap_mode="r")
+        self.intercept = np.load(os.path.join(directory, "intercept.npy"), mmap_mode="r")
+        self.class_names = meta["class_names"]
+
+    def decision_function(self, X) -> np.ndarray:
+        return np.asarray(X @ self.coef.T) + self.intercept
+
+    def predict(self, X) -> np.ndarray:
+        return (self.decision_function(X) > 0).astype(np.int64)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Вероятности положительного класса (n_samples, n_classes)"""
+        return (1.0 / (1.0 + np.exp(-self.decision_function(X)))).astype(np.float32)
+
+
+def has_arrays(directory: str) -> bool:
+    return bool(directory) and os.path.exists(os.path.join(directory, META_NAME))
+
+
+def load_arrays(directory: str):
+    """(vectorizer, topic_model, class_names) из каталога export_arrays"""
+    with open(os.path.join(directory, META_NAME), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported topic arrays format {meta.get('format_version')} in {directory}")
+    return ArrayTfidfVectorizer(directory, meta), ArrayTopicModel(directory, meta), meta["class_names"]
+
+
+def export_arrays(vectorizer, topic_model, class_names: List[str], directory: str):
+    params = vectorizer.get_params()
+    unsupported = {
+        key: params[key]
+        for key in ("analyzer", "preprocessor", "tokenizer", "strip_accents", "stop_words", "binary")
+        if params[key] not in (None, False, "word")
+    }
+    if unsupported:
+        raise ValueError(f"Vectorizer settings not supported by the array format: {unsupported}")
+    if len(topic_model.estimators_) != len(class_names):
+        raise ValueError(f"{len(topic_model.estimators_)} estimators for {len(class_names)} classes")
+
+    os.makedirs(directory, exist_ok=True)
+    terms = sorted((term.encode("utf-8"), column) for term, column in vectorizer.vocabulary_.items())
+    np.save(os.path.join(directory, "vocab.npy"), np.asarray([term for term, _ in terms], dtype=np.bytes_))
+    np.save(os.path.join(directory, "vocab_columns.npy"), np.asarray([col for _, col in terms], dtype=np.int32))
+    if params["use_idf"]:
+        np.save(os.path.join(directory, "idf.npy"), np.asarray(vectorizer.idf_, dtype=np.float64))
+
+    n_features = len(vectorizer.vocabulary_)
+    coef = np.zeros((len(class_names), n_features), dtype=np.float64)
+    intercept = np.zeros(len(class_names), dtype=np.float64)
+    for j, estimator in enumerate(topic_model.estimators_):
+        classes = list(estimator.classes_)
+        if classes == [0, 1]:
+            coef[j] = estimator.coef_[0]
+            intercept[j] = estimator.intercept_[0]
+        else:
+            intercept[j] = CONSTANT_LOGIT if classes == [1] else -CONSTANT_LOGIT
+    np.save(os.path.join(directory, "coef.npy"), coef)
+    np.save(os.path.join(directory, "intercept.npy"), intercept)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "class_names": list(class_names),
+        "n_features": n_features,
+        "vectorizer": {
+            "lowercase": params["lowercase"],
+            "token_pattern": params["token_pattern"],
+            "ngram_range": list(params["ngram_range"]),
+            "sublinear_tf": params["sublinear_tf"],
+            "use_idf": params["use_idf"],
+            "norm": params["norm"],
+        },
+    }
+    with open(os.path.join(directory, META_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    logging.info(f"Topic model exported to {directory}: {n_features} features, {len(class_names)} classes")
+
+
+def verify(directory: str, vectorizer, topic_model, texts: List[str]) -> dict:
+    """Сравнение массивного пути с исходными sklearn-объектами"""
+    array_vectorizer, array_model, _ = load_arrays(directory)
+    X_ref = vectorizer.transform(texts)
+    X = array_vectorizer.transform(texts)
+    ref_labels = np.asarray(topic_model.predict(X_ref))
+    labels = array_model.predict(X)
+    ref_decision = np.column_stack([e.decision_function(X_ref) for e in topic_model.estimators_])
+    return {
+        "num_texts": len(texts),
+        "features_max_abs_diff": float(abs(X - X_ref).max()) if X.nnz or X_ref.nnz else 0.0,
+        "decision_max_abs_diff": float(np.abs(array_model.decision_function(X) - ref_decision).max()),
+        "label_agreement": float((labels == ref_labels).all(axis=1).mean()),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    parser = argparse.ArgumentParser(description="Export / verify memory-mapped topic model arrays")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("--topic-model", default=os.environ.get("TOPIC_MODEL_PATH", "sklearn_model.pkl"))
+    parser.add_argument("--vectorizer", default=os.environ.get("VECTORIZER_PATH", "vectorizer.pkl"))
+    parser.add_argument("--class-info", default=os.environ.get("CLASS_INFO_PATH", "class_info.json"))
+    parser.add_argument("--out", default=os.environ.get("TOPIC_ARRAYS_DIR", "topic_arrays"))
+    parser.add_argument("--csv", help="CSV с колонкой text для проверки")
+    parser.add_argument("--limit", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.topic_model, "rb") as f:
+        sklearn_model = pickle.load(f)
+    with open(args.vectorizer, "rb") as f:
+        sklearn_vectorizer = pickle.load(f)
+    with open(args.class_info, "r", encoding="utf-8") as f:
+        names = json.load(f)["class_names"]
+
+    if args.command == "export":
+        export_arrays(sklearn_vectorizer, sklearn_model, names, args.out)
+    else:
+        from sentiment_backend import load_reference_texts
+
+        report = verify(args.out, sklearn_vectorizer, sklearn_model, load_reference_texts(args.csv, args.limit))
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        raise SystemExit(0 if report["label_agreement"] == 1.0 else 1)
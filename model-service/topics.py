@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FALLBACK_TOPIC = "другое"
+
+
+def load_topic_thresholds(path: str, class_names: Sequence[str], default: float = 0.5) -> np.ndarray:
+    """Пороги по классам из topic_thresholds.json (рядом с class_info.json).
+
+    Формат файла: {"default": 0.5, "thresholds": {"кэшбек": 0.35, ...}}.
+    Классы без явного порога получают значение "default".
+    """
+    thresholds = np.full(len(class_names), default, dtype=np.float32)
+    if not path or not os.path.exists(path):
+        return thresholds
+
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    thresholds[:] = float(config.get("default", default))
+    for name, value in config.get("thresholds", {}).items():
+        if name in class_names:
+            thresholds[list(class_names).index(name)] = float(value)
+        else:
+            logging.warning(f"Threshold for unknown topic '{name}' ignored")
+    return thresholds
+
+
+def positive_class_proba(model, X) -> np.ndarray:
+    """Матрица вероятностей (n_samples, n_classes) для multi-label модели.
+
+    MultiOutputClassifier возвращает список массивов (n_samples, 2) — из
+    каждого берётся столбец класса 1; OneVsRest-подобные модели сразу
+    отдают (n_samples, n_classes).
+    """
+    proba = model.predict_proba(X)
+    if not isinstance(proba, list):
+        return np.asarray(proba, dtype=np.float32)
+
+    columns = np.zeros((X.shape[0], len(proba)), dtype=np.float32)
+    for j, (estimator, class_proba) in enumerate(zip(model.estimators_, proba)):
+        classes = list(estimator.classes_)
+        if 1 in classes:
+            columns[:, j] = class_proba[:, classes.index(1)]
+    return columns
+
+
+def _nonzero_rows(mask) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-major (rows, cols) of non-zero entries for dense or scipy sparse input"""
+    if hasattr(mask, "tocsr"):
+        csr = mask.tocsr()
+        csr.eliminate_zeros()
+        rows = np.repeat(np.arange(csr.shape[0]), np.diff(csr.indptr))
+        return rows, csr.indices
+    return np.nonzero(np.asarray(mask))
+
+
+def decode_topics(
+    mask,
+    class_names: Sequence[str],
+    scores: Optional[np.ndarray] = None,
+) -> List[Tuple[List[str], List[float]]]:
+    """Переводит матрицу меток (n_samples, n_classes) в списки тем и их скоров.
+
+    Все ненулевые позиции находятся одним вызовом nonzero по всей матрице,
+    после чего массив столбцов режется по строкам. Без ``scores`` скор
+    каждой темы равен 1.0. Строки без тем получают FALLBACK_TOPIC со скором
+    соответствующего класса (или 0.0, если скоров нет).
+    """
+    n_rows = mask.shape[0]
+    if n_rows == 0:
+        # np.split без точек разреза всё равно даёт один (пустой) кусок
+        return []
+    rows, cols = _nonzero_rows(mask)
+    names = np.asarray(class_names, dtype=object)
+    splits = np.searchsorted(rows, np.arange(1, n_rows))
+
+    if scores is None:
+        row_scores = np.ones(len(cols), dtype=np.float64)
+    else:
+        row_scores = np.asarray(scores, dtype=np.float64)[rows, cols].round(4)
+
+    fallback_index = list(class_names).index(FALLBACK_TOPIC) if FALLBACK_TOPIC in class_names else None
+    results = []
+    for i, (row_cols, row_vals) in enumerate(zip(np.split(cols, splits), np.split(row_scores, splits))):
+        if len(row_cols):
+            results.append((names[row_cols].tolist(), row_vals.tolist()))
+            continue
+        fallback_score = 0.0 if scores is None or fallback_index is None else round(float(scores[i, fallback_index]), 4)
+        results.append(([FALLBACK_TOPIC], [fallback_score]))
+    return results
@@ -0,0 +1,175 @@
+"""Wire formats for processed_data events.
+
+KAFKA_WIRE_FORMAT selects how a batch of reviews is encoded; the format is
+announced in the ``content-type`` Kafka header and storage-service decodes
+whatever it receives (no header means JSON):
+
+    json    - application/json, {"batch": [{"text", "date", "sentiment", "tags"}]}
+    binary  - application/x-feedback-batch; v=1, layout below
+
+Binary v1 (all integers are unsigned LEB128 varints unless noted):
+
+    "FB" 0x01                      magic + version
+    n_tags, n_tags x (len, utf-8)  tag dictionary of this message
+    n_records
+    per record:
+        len, utf-8                 text
+        zigzag varint              date, unix microseconds UTC
+        1 byte                     sentiment
+        n, n x tag index           tags as indices into the dictionary
+
+The dictionary is per message rather than the indices of class_info.json,
+so storage-service doesn't have to ship (and keep in sync) the topic
+model's class list; for a batch it costs a few hundred bytes once.
+storage-service/messaging/wire.go is the Go counterpart.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence
+
+JSON_CONTENT_TYPE = b"application/json"
+BINARY_CONTENT_TYPE = b"application/x-feedback-batch; v=1"
+BINARY_MAGIC = b"FB\x01"
+WIRE_FORMATS = ("json", "binary")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _uvarint(out: bytearray, value: int):
+    if value < 0x80:
+        out.append(value)
+        return
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _date_micros(value) -> int:
+    if isinstance(value, datetime):
+        date = value
+    else:
+        try:
+            date = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            date = datetime.now(timezone.utc)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    # Целочисленно: через float timestamp() микросекунды теряются
+    return (date - _EPOCH) // _MICROSECOND
+
+
+def content_type_of(value: bytes) -> bytes:
+    """Content type записи по её первым байтам (записи outbox хранятся без заголовков)"""
+    return BINARY_CONTENT_TYPE if value.startswith(BINARY_MAGIC) else JSON_CONTENT_TYPE
+
+
+class JsonCodec:
+    name = "json"
+    content_type = JSON_CONTENT_TYPE
+
+    def __init__(self, dumps):
+        self.dumps = dumps
+
+    def prepare(self, message: dict) -> bytes:
+        return self.dumps(message)
+
+    @staticmethod
+    def size(part: bytes) -> int:
+        return len(part) + 2
+
+    @staticmethod
+    def envelope_size() -> int:
+        return len(b'{"batch": []}')
+
+    @staticmethod
+    def pack(parts: Sequence[bytes]) -> bytes:
+        return b'{"batch": [' + b", ".join(parts) + b"]}"
+
+
+class BinaryCodec:
+    name = "binary"
+    content_type = BINARY_CONTENT_TYPE
+
+    @staticmethod
+    def prepare(message: dict) -> tuple:
+        text = str(message.get("text", "")).encode("utf-8")
+        tags = [str(tag) for tag in message.get("tags") or []]
+        # Верхняя оценка размера: теги посчитаны так, будто каждый попадёт в словарь
+        size = len(text) + 16 + sum(len(tag) * 2 + 3 for tag in tags)
+        return text, _date_micros(message.get("date")), int(message.get("sentiment", 1)), tags, size
+
+    @staticmethod
+    def size(part: tuple) -> int:
+        return part[4]
+
+    @staticmethod
+    def envelope_size() -> int:
+        return len(BINARY_MAGIC) + 10
+
+    @staticmethod
+    def pack(parts: Sequence[tuple]) -> bytes:
+        dictionary = {}
+        for _, _, _, tags, _ in parts:
+            for tag in tags:
+                dictionary.setdefault(tag, len(dictionary))
+
+        out = bytearray(BINARY_MAGIC)
+        _uvarint(out, len(dictionary))
+        for tag in dictionary:
+            encoded = tag.encode("utf-8")
+            _uvarint(out, len(encoded))
+            out += encoded
+
+        _uvarint(out, len(parts))
+        for text, micros, sentiment, tags, _ in parts:
+            _uvarint(out, len(text))
+            out += text
+            _uvarint(out, (micros << 1) ^ (micros >> 63))
+            out.append(sentiment & 0xFF)
+            _uvarint(out, len(tags))
+            for tag in tags:
+                _uvarint(out, dictionary[tag])
+        return bytes(out)
+
+
+def decode_binary(data: bytes) -> List[dict]:
+    """Обратное преобразование (для отладки и сверки с Go-декодером)"""
+    pos = 0
+
+    def uvarint() -> int:
+        nonlocal pos
+        result = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def string() -> str:
+        nonlocal pos
+        length = uvarint()
+        value = data[pos:pos + length].decode("utf-8")
+        pos += length
+        return value
+
+    if not data.startswith(BINARY_MAGIC):
+        raise ValueError("not a binary feedback batch")
+    pos = len(BINARY_MAGIC)
+    dictionary = [string() for _ in range(uvarint())]
+    records = []
+    for _ in range(uvarint()):
+        text = string()
+        zigzag = uvarint()
+        micros = (zigzag >> 1) ^ -(zigzag & 1)
+        sentiment = data[pos]
+        pos += 1
+        tags = [dictionary[uvarint()] for _ in range(uvarint())]
+        records.append({
+            "text": text,
+            "date": (_EPOCH + micros * _MICROSECOND).isoformat(),
+            "sentiment": sentiment,
+            "tags": tags,
+        })
+    return records
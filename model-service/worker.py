@@ -0,0 +1,239 @@
+"""Kafka-driven inference worker.
+
+Consumes raw reviews from RAW_REVIEWS_TOPIC as a member of
+WORKER_GROUP_ID, scores them in large batches with the same models as the
+HTTP service and publishes the results to processed_data through
+build_message_batch. Offsets are committed only after the broker has
+confirmed the publish, so a crash or a Kafka outage leads to reprocessing,
+never to lost reviews. Throughput scales by starting more workers (up to
+the number of partitions of the raw topic).
+
+A batch that keeps failing (an exception while scoring or publishing) is
+retried WORKER_MAX_ATTEMPTS times, then processed record by record: the
+records that still fail, and the records whose results cannot be
+published at all (not encodable or larger than KAFKA_MAX_MESSAGE_BYTES),
+go to WORKER_DEAD_LETTER_TOPIC with the error, and the rest of the batch
+is committed. A broker outage is not a record problem and is retried
+indefinitely.
+
+Accepted message values (JSON):
+    {"text": "...", "date": "...", "source": "..."}
+    [{"text": ...}, ...]  or  {"batch": [{"text": ...}, ...]}
+
+    python worker.py
+"""
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from kafka import KafkaConsumer
+from kafka.errors import CommitFailedError
+from kafka.structs import OffsetAndMetadata
+
+RAW_REVIEWS_TOPIC = os.getenv("RAW_REVIEWS_TOPIC", "raw_reviews")
+WORKER_GROUP_ID = os.getenv("WORKER_GROUP_ID", "model-service-workers")
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "512"))
+WORKER_POLL_TIMEOUT_MS = int(os.getenv("WORKER_POLL_TIMEOUT_MS", "1000"))
+WORKER_MAX_POLL_INTERVAL_MS = int(os.getenv("WORKER_MAX_POLL_INTERVAL_MS", "600000"))
+WORKER_RETRY_BACKOFF_MAX_S = float(os.getenv("WORKER_RETRY_BACKOFF_MAX_S", "30"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "3"))
+WORKER_DEAD_LETTER_TOPIC = os.getenv("WORKER_DEAD_LETTER_TOPIC", "raw_reviews_dlq")
+DEAD_LETTER_MAX_VALUE_BYTES = int(os.getenv("DEAD_LETTER_MAX_VALUE_BYTES", str(256 * 1024)))
+
+
+class PublishFailed(Exception):
+    """Брокер не подтвердил публикацию: проблема не в записях, батч повторяется целиком"""
+
+
+def parse_reviews(value: bytes) -> List[dict]:
+    """Отзывы из одного сообщения; битые сообщения и отзывы без текста пропускаются"""
+    try:
+        payload = json.loads(value)
+    except (TypeError, ValueError) as e:
+        logging.error(f"[worker] Malformed message skipped: {e}")
+        return []
+    if isinstance(payload, dict):
+        payload = payload.get("batch", [payload])
+    if not isinstance(payload, list):
+        return []
+    return [
+        review for review in payload
+        if isinstance(review, dict) and isinstance(review.get("text"), str) and review["text"].strip()
+    ]
+
+
+def score_reviews(server, reviews: List[dict]) -> List[dict]:
+    texts = [review["text"] for review in reviews]
+    sentiment_preds, _, topics_batch, _, _ = server.predict_texts(texts)
+    now = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "text": review["text"],
+            "date": review.get("date") or now,
+            "sentiment": int(sentiment),
+            "tags": topics,
+            "source": review.get("source"),
+        }
+        for review, sentiment, topics in zip(reviews, sentiment_preds, topics_batch)
+    ]
+
+
+def rewind(consumer, records):
+    """Возвращает позиции партиций к началу необработанного батча"""
+    for tp, messages in records.items():
+        consumer.seek(tp, messages[0].offset)
+
+
+def process(server, build_message_batch, messages) -> List[Tuple[object, str]]:
+    """Размечает и публикует отзывы из сообщений Kafka.
+
+    Возвращает (сообщение, причина) для сообщений, результат которых не
+    может быть опубликован никогда; PublishFailed — если брокер не подтвердил.
+    """
+    reviews, origins = [], []
+    for message in messages:
+        for review in parse_reviews(message.value):
+            reviews.append(review)
+            origins.append(message)
+    if not reviews:
+        return []
+    result = build_message_batch(score_reviews(server, reviews), wait=True)
+    if result["status"] != "ok":
+        raise PublishFailed(f"{len(reviews)} reviews were not confirmed by the broker")
+    return [(origins[index], reason) for index, reason in result["dropped"]]
+
+
+def process_isolated(server, build_message_batch, messages) -> List[Tuple[object, str]]:
+    """Поштучная обработка батча, который падает целиком: отделяет плохие записи от хороших"""
+    dead = []
+    for message in messages:
+        try:
+            dead.extend(process(server, build_message_batch, [message]))
+        except PublishFailed:
+            raise
+        except Exception as e:
+            logging.exception(f"[worker] Record {message.topic}/{message.partition}@{message.offset} failed")
+            dead.append((message, f"{type(e).__name__}: {e}"))
+    return dead
+
+
+def dead_letter(producer, dead: List[Tuple[object, str]]):
+    """Пишет записи с ошибкой в WORKER_DEAD_LETTER_TOPIC и ждёт подтверждения"""
+    unique = {}
+    for message, reason in dead:
+        unique.setdefault((message.topic, message.partition, message.offset), (message, reason))
+    if not unique:
+        return
+    if producer is None:
+        raise PublishFailed("Kafka producer is not available for the dead-letter topic")
+    futures = []
+    for message, reason in unique.values():
+        value = message.value or b""
+        payload = {
+            "topic": message.topic,
+            "partition": message.partition,
+            "offset": message.offset,
+            "error": reason,
+            "value": value[:DEAD_LETTER_MAX_VALUE_BYTES].decode("utf-8", errors="replace"),
+            "value_truncated": len(value) > DEAD_LETTER_MAX_VALUE_BYTES,
+        }
+        futures.append(producer.send(WORKER_DEAD_LETTER_TOPIC, value=json.dumps(payload, ensure_ascii=False).encode("utf-8")))
+    try:
+        for future in futures:
+            future.get(timeout=30)
+    except Exception as e:
+        raise PublishFailed(f"dead-letter publish failed: {e}")
+    logging.warning(f"[worker] {len(unique)} records sent to '{WORKER_DEAD_LETTER_TOPIC}'")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    import server
+    from producer import KAFKA_BROKER_DOCKER, build_message_batch, ensure_topic_exists, get_producer
+
+    server.configure_threads()
+    server.load_models()
+    if server.sentiment_model is None:
+        logging.error("[worker] Sentiment model failed to load")
+        return 1
+    ensure_topic_exists()
+    ensure_topic_exists(RAW_REVIEWS_TOPIC)
+    ensure_topic_exists(WORKER_DEAD_LETTER_TOPIC)
+
+    consumer = KafkaConsumer(
+        RAW_REVIEWS_TOPIC,
+        bootstrap_servers=KAFKA_BROKER_DOCKER,
+        group_id=WORKER_GROUP_ID,
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+        max_poll_records=WORKER_BATCH_SIZE,
+        max_poll_interval_ms=WORKER_MAX_POLL_INTERVAL_MS,
+    )
+
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    logging.info(f"[worker] Consuming '{RAW_REVIEWS_TOPIC}' as '{WORKER_GROUP_ID}', batch {WORKER_BATCH_SIZE}")
+    backoff = 0.0
+    attempts = 0
+    while not stopping:
+        records = consumer.poll(timeout_ms=WORKER_POLL_TIMEOUT_MS, max_records=WORKER_BATCH_SIZE)
+        if not records:
+            continue
+
+        started = time.perf_counter()
+        messages = [m for partition_messages in records.values() for m in partition_messages]
+        try:
+            if attempts < WORKER_MAX_ATTEMPTS:
+                dead = process(server, build_message_batch, messages)
+            else:
+                logging.warning(f"[worker] Batch failed {attempts} times, processing {len(messages)} records one by one")
+                dead = process_isolated(server, build_message_batch, messages)
+            dead_letter(get_producer(), dead)
+        except PublishFailed as e:
+            backoff = min(WORKER_RETRY_BACKOFF_MAX_S, max(1.0, backoff * 2))
+            logging.warning(f"[worker] Publish failed ({e}), retrying {len(messages)} records in {backoff:.0f}s")
+            rewind(consumer, records)
+            time.sleep(backoff)
+            continue
+        except Exception:
+            attempts += 1
+            backoff = min(WORKER_RETRY_BACKOFF_MAX_S, max(1.0, backoff * 2))
+            logging.exception(f"[worker] Batch failed (attempt {attempts}/{WORKER_MAX_ATTEMPTS}), retrying in {backoff:.0f}s")
+            rewind(consumer, records)
+            time.sleep(backoff)
+            continue
+        backoff = 0.0
+        attempts = 0
+
+        try:
+            consumer.commit({
+                tp: OffsetAndMetadata(partition_messages[-1].offset + 1, None)
+                for tp, partition_messages in records.items()
+            })
+        except CommitFailedError as e:
+            # Партиции ушли другому воркеру при ребалансе: он перечитает батч с последнего коммита
+            logging.warning(f"[worker] Commit failed after a rebalance, re-polling: {e}")
+            continue
+        elapsed = time.perf_counter() - started
+        logging.info(f"[worker] Processed {len(messages)} records in {elapsed:.2f}s ({len(messages) / elapsed:.0f} records/s)")
+
+    consumer.close(autocommit=False)
+    logging.info("[worker] Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
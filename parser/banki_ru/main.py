@@ -1,47 +1,74 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from bs4 import BeautifulSoup
 import logging
 import pandas as pd
-import time
 import re
 from datetime import datetime
 import json
+import argparse
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from page_extract import css, exists, first_text, parse_html
+from browser import acquire_driver, release_driver
+from waits import (AdaptiveTimeout, IterationTimings, count_at_least, install_request_tracker, network_idle,
+                   scroll_to_bottom, wait_until)
+
+# Селекторы компилируются один раз; применяются к снимку всей страницы
+REVIEW = css('[data-test="responses__response"]')
+TITLE = css('div[class*="StyledTitleItem"] a')
+TEXT = css('div[class*="StyledItemText"] a')
+RATING = css('div.Grade__sc-m0t12o-0')
+DATE = css('span[class*="StyledItemSmallText"]')
+ANSWERED = css('[data-test="responses__response-tag-answered"]')
+DOCUMENTS = css('[data-test="responses__response-tag-documents"]')
+RESPONSE_ID = re.compile(r'/response/(\d+)')
+NEW_REVIEWS = '[data-test="responses__response"]:not([data-scraped])'
+SHOW_MORE = (By.XPATH, "//span[contains(text(), 'Показать еще')]")
+
+# Отдаёт outerHTML только ещё не обработанных отзывов и помечает их (или удаляет
+# из DOM при prune); стоимость итерации не зависит от того, сколько уже загружено
+TAKE_NEW_REVIEWS_JS = """
+const prune = arguments[0];
+const nodes = document.querySelectorAll(arguments[1]);
+const html = [];
+for (const node of nodes) {
+    html.push(node.outerHTML);
+    if (prune) {
+        node.remove();
+    } else {
+        node.setAttribute('data-scraped', '1');
+    }
+}
+return html;
+"""
 
 class GazprombankScraper:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, prune_dom=False):
+        """prune_dom — удалять обработанные отзывы из DOM, чтобы страница не росла"""
         self.driver = None
+        self.prune_dom = prune_dom
+        # Таймауты ожиданий подстраиваются под то, как быстро отвечает сайт
+        self.load_timeout = AdaptiveTimeout(initial=10.0, minimum=2.0, maximum=30.0)
+        self.button_timeout = AdaptiveTimeout(initial=5.0, minimum=1.0, maximum=15.0)
+        self.idle_timeout = AdaptiveTimeout(initial=5.0, minimum=1.0, maximum=15.0)
         self.setup_driver(headless)
         
     def setup_driver(self, headless):
-        """Настройка браузера"""
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-        
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        """Облегчённый Chrome из общего пула (browser.py)"""
+        self.driver = acquire_driver(headless)
         self.wait = WebDriverWait(self.driver, 20)
 
     def expand_all_reviews(self):
         """Кликает по кнопке 'Показать полностью' во всех отзывах"""
         try:
-            buttons = self.driver.find_elements(By.CLASS_NAME, "responses-item__more")
-            for btn in buttons:
-                try:
-                    self.driver.execute_script("arguments[0].click();", btn)
-                    time.sleep(0.3)
-                except Exception:
-                    pass
+            self.driver.execute_script(
+                "document.querySelectorAll('.responses-item__more').forEach(btn => btn.click());"
+            )
+            wait_until(self.driver, network_idle(), self.idle_timeout, "раскрытие отзывов")
         except Exception as e:
             logging.warning(f"Ошибка при попытке раскрытия отзывов: {e}")
 
@@ -82,65 +109,66 @@ class GazprombankScraper:
             logging.exception(e)
             return date_text
     
-    def extract_review_data(self, review_element):
-        """Извлечение данных из отзыва (обновлённая версия под новую верстку)"""
+    def extract_review_data(self, node):
+        """Извлечение данных из lxml-узла отзыва (обновлённая версия под новую верстку)"""
         try:
-            html = review_element.get_attribute('outerHTML')
-            soup = BeautifulSoup(html, 'lxml')
-
-
-            title_tag = soup.select_one('div[class*="StyledTitleItem"] a')
-            title = title_tag.text.strip() if title_tag else 'Без заголовка'
-
-
-            text_tag = soup.select_one('div[class*="StyledItemText"] a')
-            text = text_tag.text.strip() if text_tag else ''
-            text = self.clean_text(text)
-
+            title = first_text(node, TITLE) or 'Без заголовка'
+            text = self.clean_text(first_text(node, TEXT))
 
-            rating_tag = soup.select_one('div.Grade__sc-m0t12o-0')
-            rating = int(rating_tag.text.strip()) if rating_tag else 0
+            rating_text = first_text(node, RATING)
+            rating = int(rating_text) if rating_text else 0
 
-
-            date_tag = soup.select_one('span[class*="StyledItemSmallText"]')
-            date_text = date_tag.text.strip() if date_tag else ''
+            date_text = first_text(node, DATE)
             try:
                 date = datetime.strptime(date_text, '%d.%m.%Y %H:%M').strftime('%Y-%m-%d %H:%M')
             except Exception as e:
                 logging.exception(e)
                 date = date_text
 
-            has_bank_reply = bool(soup.select_one('[data-test="responses__response-tag-answered"]'))
-            has_docs = bool(soup.select_one('[data-test="responses__response-tag-documents"]'))
-
             return {
                 'title': title,
                 'text': text,
                 'rating': rating,
                 'date': date,
-                'has_bank_reply': has_bank_reply,
-                'has_docs': has_docs,
+                'has_bank_reply': exists(node, ANSWERED),
+                'has_docs': exists(node, DOCUMENTS),
                 'source': 'banki.ru'
             }
 
         except Exception as e:
             logging.warning(f"Ошибка извлечения данных: {e}")
             return None
-        except Exception as e:
-            logging.info(f"Ошибка извлечения данных: {e}")
-            return None
-    
+
+    def review_id(self, node, review_data):
+        """Стабильный id отзыва: data-id/id узла, номер из ссылки на отзыв или хэш содержимого"""
+        node_id = node.get('data-id') or node.get('id')
+        if node_id:
+            return node_id
+        for link in TITLE(node):
+            match = RESPONSE_ID.search(link.get('href') or '')
+            if match:
+                return match.group(1)
+        content = f"{review_data['title']}|{review_data['date']}|{review_data['text']}"
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def take_new_review_nodes(self):
+        """Узлы отзывов, появившиеся после прошлой итерации (один RPC, HTML только новых)"""
+        fragments = self.driver.execute_script(TAKE_NEW_REVIEWS_JS, self.prune_dom, NEW_REVIEWS)
+        if not fragments:
+            return []
+        return REVIEW(parse_html('<html><body>' + ''.join(fragments) + '</body></html>'))
+
     def scrape_gazprombank_reviews(self, max_clicks=10):
         """Скрейпит отзывы с подгрузкой по кнопке 'Показать ещё'"""
         url = "https://www.banki.ru/services/responses/bank/gazprombank/"
-        all_reviews = set()
-        seen_elements = set()
+        all_reviews = {}
 
         try:
             logging.info("Запускаем скрейпинг Газпромбанка...")
             logging.info(f"Запланировано итераций: {max_clicks}")
             self.driver.get(url)
-            time.sleep(5)
+            install_request_tracker(self.driver)
+            wait_until(self.driver, count_at_least(NEW_REVIEWS, 1), self.load_timeout, "первые отзывы")
 
             """
             try:
@@ -155,47 +183,52 @@ class GazprombankScraper:
             for click_num in range(max_clicks):
                 logging.info(f"🔁 Подгрузка блока {click_num + 1} из {max_clicks}...")
 
-                self.scroll_page()
-                time.sleep(1)
-
-                review_elements = self.driver.find_elements(By.CSS_SELECTOR, '[data-test="responses__response"]')
-                logging.info(f"📦 Найдено {len(review_elements)} отзывов на текущем этапе")
-
-                for el in review_elements:
-                    el_id = el.get_attribute("outerHTML")
-                    if el_id in seen_elements:
-                        continue
-                    seen_elements.add(el_id)
-
-                    review_data = self.extract_review_data(el)
-                    if review_data:
-                        all_reviews.add(json.dumps(review_data, ensure_ascii=False))
-
-                try:
-                    show_more = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.XPATH, "//span[contains(text(), 'Показать еще')]"))
+                timings = IterationTimings()
+                with timings.phase("прокрутка"):
+                    self.scroll_page()
+
+                with timings.phase("извлечение"):
+                    review_nodes = self.take_new_review_nodes()
+                    added = 0
+                    for node in review_nodes:
+                        review_data = self.extract_review_data(node)
+                        if not review_data:
+                            continue
+                        review_id = self.review_id(node, review_data)
+                        if review_id not in all_reviews:
+                            all_reviews[review_id] = review_data
+                            added += 1
+                    logging.info(f"📦 Новых узлов: {len(review_nodes)}, новых отзывов: {added}, всего: {len(all_reviews)}")
+
+                with timings.phase("кнопка"):
+                    show_more = wait_until(
+                        self.driver, EC.element_to_be_clickable(SHOW_MORE), self.button_timeout, "кнопка 'Показать ещё'"
                     )
-                    self.driver.execute_script("arguments[0].click();", show_more)
-                    time.sleep(2)
-                except Exception:
+                if not show_more:
+                    timings.log(f"Итерация {click_num + 1}")
                     logging.info("🔚 Кнопка 'Показать ещё' не найдена — конец отзывов.")
                     break
 
+                with timings.phase("подгрузка"):
+                    self.driver.execute_script("arguments[0].click();", show_more)
+                    wait_until(self.driver, count_at_least(NEW_REVIEWS, 1), self.load_timeout, "новые отзывы")
+                timings.log(f"Итерация {click_num + 1}")
+
         except Exception as e:
             logging.error(f"Ошибка при скрейпинге: {e}")
         finally:
-            self.driver.quit()
+            # Драйвер не закрываем: он возвращается в пул прогретым
+            release_driver(self.driver)
+            self.driver = None
 
 
-        parsed_reviews = [json.loads(r) for r in all_reviews]
-        return parsed_reviews
+        return list(all_reviews.values())
 
     def scroll_page(self):
-        """Прокрутка страницы"""
+        """Прокрутка страницы до конца и ожидание, пока догрузится ленивый контент"""
         try:
-            for i in range(3):
-                self.driver.execute_script(f"window.scrollTo(0, document.body.scrollHeight*{(i+1)/3});")
-                time.sleep(1.5)
+            scroll_to_bottom(self.driver)
+            wait_until(self.driver, network_idle(), self.idle_timeout, "сеть после прокрутки")
         except Exception as e:
             logging.exception(e)
             pass
@@ -207,7 +240,7 @@ class GazprombankScraper:
             
             if next_buttons:
                 next_buttons[0].click()
-                time.sleep(2)
+                wait_until(self.driver, EC.staleness_of(next_buttons[0]), self.load_timeout, "следующая страница")
                 return True
             return False
             
@@ -240,6 +273,11 @@ class GazprombankScraper:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-clicks", type=int, default=420)
+    parser.add_argument("--prune-dom", action="store_true", help="удалять обработанные отзывы из DOM")
+    args = parser.parse_args()
+
     try:
         logging.basicConfig(
             level=logging.INFO,
@@ -248,10 +286,10 @@ if __name__ == "__main__":
         )
         logging.info("🚀 Запуск скрейпера Газпромбанка...")
 
-        scraper = GazprombankScraper(headless=False)
+        scraper = GazprombankScraper(headless=False, prune_dom=args.prune_dom)
         
 
-        reviews = scraper.scrape_gazprombank_reviews(max_clicks=420)
+        reviews = scraper.scrape_gazprombank_reviews(max_clicks=args.max_clicks)
 
         if reviews:
             df = scraper.save_results(reviews)
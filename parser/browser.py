@@ -0,0 +1,229 @@
+"""Shared Chrome factory and warm driver pool for the Selenium scrapers.
+
+The profile is trimmed for scraping:
+- images and extensions are disabled;
+- page loading is "eager": it returns at DOMContentLoaded;
+- fonts, media and third-party trackers are blocked through CDP
+  Network.setBlockedURLs, so pages download only HTML, CSS and scripts.
+
+The chromedriver path is resolved by ChromeDriverManager once and cached
+on disk. Later runs, including those without network access, start
+straight from the cached binary. If Chrome has been updated and refuses
+the cached driver (SessionNotCreatedException), the cache is dropped and
+the driver is reinstalled once.
+
+Drivers are not quit when a scrape finishes. They go back to a small pool
+and are reused by the next source or page in the same process. The pool
+quits them at exit:
+
+    driver = acquire_driver(headless=True)
+    try:
+        driver.get(url)
+    finally:
+        release_driver(driver)
+
+CHROMEDRIVER_PATH   explicit chromedriver binary (skips ChromeDriverManager)
+DRIVER_POOL_SIZE    warm drivers kept per headless mode (default 2)
+BLOCK_RESOURCES     set to 0 to load every resource type (for debugging selectors)
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH", "")
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", "2"))
+BLOCK_RESOURCES = os.environ.get("BLOCK_RESOURCES", "1") != "0"
+DRIVER_PATH_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "gazprom_parser", "chromedriver.json")
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/91.0.4472.124 Safari/537.36"
+)
+# Отзывы приходят в HTML/JSON; картинки, шрифты, медиа и счётчики не нужны
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*mc.yandex.ru*",
+    "*top-fwz1.mail.ru*", "*vk.com/rtrg*", "*facebook.net*", "*criteo*", "*adfox*", "*adriver*",
+]
+
+_driver_path_lock = threading.Lock()
+_driver_path = None
+
+
+def chromedriver_path(stale: Optional[str] = None) -> str:
+    """Путь к chromedriver: CHROMEDRIVER_PATH, кэш на диске или ChromeDriverManager (один раз).
+
+    stale — путь, с которым Chrome не запустился (не подходит к обновившемуся
+    Chrome): кэш сбрасывается и драйвер ставится заново. Если другой поток уже
+    переустановил драйвер, возвращается новый путь без повторной установки.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        refresh = stale is not None and _driver_path in (stale, None)
+        if refresh:
+            _driver_path = None
+            try:
+                os.remove(DRIVER_PATH_CACHE)
+            except OSError:
+                pass
+        if _driver_path:
+            return _driver_path
+        if CHROMEDRIVER_PATH:
+            _driver_path = CHROMEDRIVER_PATH
+            return _driver_path
+        if not refresh:
+            try:
+                with open(DRIVER_PATH_CACHE, "r", encoding="utf-8") as f:
+                    cached = json.load(f).get("path")
+                if cached and os.path.exists(cached):
+                    _driver_path = cached
+                    return _driver_path
+            except (OSError, ValueError):
+                pass
+
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        _driver_path = ChromeDriverManager().install()
+        try:
+            os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+            with open(DRIVER_PATH_CACHE, "w", encoding="utf-8") as f:
+                json.dump({"path": _driver_path}, f)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить путь chromedriver в кэш: {e}")
+        return _driver_path
+
+
+def lightweight_options(headless: bool) -> Options:
+    chrome_options = Options()
+    if headless:
+        chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    chrome_options.add_argument('--disable-background-networking')
+    chrome_options.add_argument('--disable-renderer-backgrounding')
+    chrome_options.add_argument('--mute-audio')
+    chrome_options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+    })
+    chrome_options.page_load_strategy = "eager"
+    return chrome_options
+
+
+def block_resources(driver):
+    """Блокировка лишних ресурсов через CDP; действует на все последующие загрузки драйвера"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except Exception as e:
+        logging.warning(f"CDP-блокировка ресурсов недоступна: {e}")
+
+
+def create_driver(headless: bool = False):
+    path = chromedriver_path()
+    try:
+        driver = webdriver.Chrome(service=Service(path), options=lightweight_options(headless))
+    except SessionNotCreatedException as e:
+        if CHROMEDRIVER_PATH:
+            raise
+        # Обычно это обновившийся Chrome при старом закэшированном chromedriver
+        logging.warning(f"Chrome не запустился с закэшированным chromedriver, переустанавливаем: {e.msg}")
+        driver = webdriver.Chrome(
+            service=Service(chromedriver_path(stale=path)), options=lightweight_options(headless)
+        )
+    if BLOCK_RESOURCES:
+        block_resources(driver)
+    return driver
+
+
+def driver_alive(driver) -> bool:
+    try:
+        driver.execute_script("return 1;")
+        return True
+    except Exception:
+        return False
+
+
+class DriverPool:
+    """Небольшой пул прогретых драйверов; отдельный набор на каждый режим headless"""
+
+    def __init__(self, size: int = DRIVER_POOL_SIZE):
+        self.size = size
+        self._idle: Dict[bool, List] = {True: [], False: []}
+        self._modes: Dict[int, bool] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, headless: bool = False):
+        while True:
+            with self._lock:
+                driver = self._idle[headless].pop() if self._idle[headless] else None
+            if driver is None:
+                driver = create_driver(headless)
+                with self._lock:
+                    self._modes[id(driver)] = headless
+                logging.info(f"🧭 Запущен новый Chrome (headless={headless})")
+                return driver
+            if driver_alive(driver):
+                logging.info("♻️ Используем прогретый Chrome из пула")
+                return driver
+            self._discard(driver)
+
+    def release(self, driver):
+        """Вернуть драйвер в пул: чистая вкладка, без cookies; лишние драйверы закрываются"""
+        if driver is None:
+            return
+        with self._lock:
+            headless = self._modes.get(id(driver), False)
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except Exception:
+            self._discard(driver)
+            return
+        with self._lock:
+            if len(self._idle[headless]) < self.size:
+                self._idle[headless].append(driver)
+                return
+        self._discard(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            self._modes.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._lock:
+            drivers = self._idle[True] + self._idle[False]
+            self._idle = {True: [], False: []}
+        for driver in drivers:
+            self._discard(driver)
+
+
+_pool = DriverPool()
+atexit.register(_pool.close)
+
+
+def acquire_driver(headless: bool = False):
+    return _pool.acquire(headless)
+
+
+def release_driver(driver):
+    _pool.release(driver)
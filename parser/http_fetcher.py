@@ -0,0 +1,191 @@
+"""Async HTTP fetch backend for review sources that render pages on the server.
+
+Pages are downloaded with one pooled aiohttp session. Every host gets its own
+concurrency limit and token bucket (requests per second with a burst), and
+failed requests (connection errors, timeouts, 429 and 5xx) are retried with
+exponential backoff and full jitter, honouring Retry-After. The HTML is
+handed to the scrapers' existing BeautifulSoup extraction; Selenium is only
+needed for sources that build the page with JavaScript.
+
+Used by recommend/main.py and gzpb_site/main.py:
+
+    from http_fetcher import fetch_pages
+    pages = fetch_pages(urls, rate=2.0, concurrency=4)
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlsplit
+
+import aiohttp
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    def __init__(self, url: str, reason: str, status: Optional[int] = None):
+        super().__init__(f"{url}: {reason}")
+        self.url = url
+        self.status = status
+
+
+class TokenBucket:
+    """Не больше ``rate`` запросов в секунду в среднем, пачками до ``burst``"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class FetchStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def summary(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "elapsed_s": round(elapsed, 2),
+            "requests_per_s": round(self.requests / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class AsyncFetcher:
+    """Пул соединений aiohttp с лимитами на хост, token bucket и ретраями.
+
+    async with AsyncFetcher(rate=2.0, concurrency=4) as fetcher:
+        html = await fetcher.fetch(url)
+    """
+
+    def __init__(
+        self,
+        rate: float = 2.0,
+        burst: int = 2,
+        concurrency: int = 4,
+        retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 30.0,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {**DEFAULT_HEADERS, **(headers or {})}
+        self.stats = FetchStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.concurrency, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=self.headers)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    def _host_limits(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self._limits:
+            self._limits[host] = asyncio.Semaphore(self.concurrency)
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._limits[host], self._buckets[host]
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter: равномерно от 0 до экспоненциального потолка
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def fetch(self, url: str) -> str:
+        """HTML страницы; FetchError, если попытки исчерпаны или ответ не ретраится"""
+        limit, bucket = self._host_limits(url)
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            async with limit:
+                await bucket.acquire()
+                self.stats.requests += 1
+                try:
+                    async with self._session.get(url) as response:
+                        if response.status == 200:
+                            body = await response.read()
+                            self.stats.bytes += len(body)
+                            return body.decode(response.get_encoding(), errors="replace")
+                        if response.status not in RETRY_STATUSES:
+                            self.stats.failures += 1
+                            raise FetchError(url, f"HTTP {response.status}", response.status)
+                        retry_after = response.headers.get("Retry-After")
+                        reason = f"HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    reason = f"{type(e).__name__}: {e}"
+
+            if attempt == self.retries:
+                self.stats.failures += 1
+                raise FetchError(url, f"giving up after {attempt + 1} attempts ({reason})")
+            delay = self._backoff(attempt, retry_after)
+            self.stats.retries += 1
+            logging.warning(f"{url}: {reason}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def fetch_many(self, urls: List[str]) -> List[Union[str, FetchError]]:
+        """HTML в порядке urls; неудачные страницы — FetchError вместо текста"""
+        async def one(url):
+            try:
+                return await self.fetch(url)
+            except FetchError as e:
+                logging.error(f"Не удалось загрузить {e}")
+                return e
+
+        return await asyncio.gather(*(one(url) for url in urls))
+
+
+def fetch_pages(urls: List[str], **options) -> List[Union[str, FetchError]]:
+    """Синхронная обёртка для скриптов парсеров"""
+    async def run():
+        async with AsyncFetcher(**options) as fetcher:
+            pages = await fetcher.fetch_many(urls)
+            logging.info(f"HTTP fetch: {fetcher.stats.summary()}")
+            return pages
+
+    return asyncio.run(run())
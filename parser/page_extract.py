@@ -0,0 +1,70 @@
+"""Page-level review extraction with lxml and precompiled selectors.
+
+A scraper takes one snapshot of the page (``driver.page_source`` or the
+HTTP response body), parses it once with lxml and pulls every review out
+in a single pass. Selectors are compiled to XPath once at import time, so
+no WebDriver round trips and no per-review re-parsing happen inside the
+loop:
+
+    REVIEW = css('[data-test="responses__response"]')
+    TITLE = css('div[class*="StyledTitleItem"] a')
+
+    root = parse_html(driver.page_source)
+    for node in REVIEW(root):
+        title = first_text(node, TITLE)
+
+Selectors match descendants of the node they are applied to, like
+BeautifulSoup's ``select``/``select_one``, so selectors written for the
+old per-element soup keep their meaning.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from cssselect import HTMLTranslator
+from lxml import etree
+from lxml import html as lxml_html
+
+_translator = HTMLTranslator()
+
+
+def css(selector: str) -> etree.XPath:
+    """CSS-селектор, скомпилированный в XPath по потомкам узла"""
+    return etree.XPath(_translator.css_to_xpath(selector, prefix="descendant::"))
+
+
+def xpath(expression: str) -> etree.XPath:
+    return etree.XPath(expression)
+
+
+def parse_html(source: str):
+    """Корень документа; пустая или битая страница даёт пустой <html>"""
+    if not source or not source.strip():
+        return lxml_html.fromstring("<html></html>")
+    return lxml_html.document_fromstring(source)
+
+
+def node_text(node) -> str:
+    return node.text_content().strip()
+
+
+def first_text(node, selector) -> str:
+    """Текст первого совпадения или '' (аналог select_one(...).text.strip())"""
+    matches = selector(node)
+    return node_text(matches[0]) if matches else ""
+
+
+def exists(node, selector) -> bool:
+    return bool(selector(node))
+
+
+def outer_html(node) -> str:
+    return lxml_html.tostring(node, encoding="unicode")
+
+
+@contextmanager
+def timed(label: str):
+    """Лог времени извлечения: сколько занял разбор снимка страницы"""
+    started = time.perf_counter()
+    yield
+    logging.info(f"⏱ {label}: {(time.perf_counter() - started) * 1000:.1f} мс")
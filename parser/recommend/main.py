@@ -1,35 +1,52 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from bs4 import BeautifulSoup
 import logging
 import pandas as pd
-import time
 import re
 from datetime import datetime
 import json
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_fetcher import FetchError, fetch_pages
+from page_extract import css, exists, first_text, outer_html, parse_html, timed
+from browser import acquire_driver, release_driver
+from waits import AdaptiveTimeout, IterationTimings, count_at_least, network_idle, scroll_to_bottom, wait_until
+
+BASE_URL = "https://irecommend.ru/content/gazprombank"
+
+REVIEW_SELECTOR = 'div.reviews-list-item'
+
+# Селекторы компилируются один раз; применяются к снимку всей страницы
+REVIEW = css(REVIEW_SELECTOR)
+TITLE = css('.reviewTitle')
+TEXT = css('.reviewTeaserText')
+DATE = css('.created')
+RATING_WIDGET = css('.fivestarWidgetStatic')
+STAR = css('.star')
+STAR_ON = css('.on')
+
 
 class GazprombankScraperIrecommend:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, backend="http", base_url=BASE_URL, rate=2.0, concurrency=4):
+        """backend="http" — загрузка страниц через http_fetcher, "selenium" — через Chrome"""
         self.driver = None
-        self.setup_driver(headless)
+        self.backend = backend
+        self.base_url = base_url
+        self.rate = rate
+        self.concurrency = concurrency
+        # Таймауты ожиданий браузера подстраиваются под то, как быстро отвечает сайт
+        self.load_timeout = AdaptiveTimeout(initial=10.0, minimum=2.0, maximum=30.0)
+        self.idle_timeout = AdaptiveTimeout(initial=5.0, minimum=1.0, maximum=15.0)
+        if backend == "selenium":
+            self.setup_driver(headless)
         
     def setup_driver(self, headless):
-        """Настройка браузера"""
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-        
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        """Облегчённый Chrome из общего пула (browser.py)"""
+        self.driver = acquire_driver(headless)
         self.wait = WebDriverWait(self.driver, 20)
 
     def clean_text(self, text):
@@ -57,41 +74,16 @@ class GazprombankScraperIrecommend:
             logging.exception(e)
             return date_text
     
-    def extract_review_data(self, review_element):
-        """Извлечение данных из отзыва (обновлённая версия под новую верстку)"""
+    def extract_review_data(self, node):
+        """Извлечение данных из lxml-узла отзыва (обновлённая версия под новую верстку)"""
         try:
-            html = review_element.get_attribute('outerHTML')
-            soup = BeautifulSoup(html, 'lxml')
-
-
-
-            title_tag = soup.select_one('.reviewTitle')
-            text_tag = soup.select_one('.reviewTeaserText')
-
-            title = title_tag.text.strip() if title_tag else ''
-            text = text_tag.text.strip() if text_tag else ''
-
-
-            title = self.clean_text(title)
-            text = self.clean_text(text)
-
-
-            rating_tag = soup.select_one('div.Grade__sc-m0t12o-0')
-            rating = int(rating_tag.text.strip()) if rating_tag else 0 # TODO
-
-
-            date_tag = soup.select_one('.created')
-            date_text = date_tag.text.strip() if date_tag else ''
-
-
-
-
-            rating = 0
-            rating_container = soup.select_one('.fivestarWidgetStatic')
-            if rating_container:
-                stars = rating_container.select('.star')
-                rating = sum(1 for star in stars if star.select_one('.on'))
+            title = self.clean_text(first_text(node, TITLE))
+            text = self.clean_text(first_text(node, TEXT))
+            date_text = first_text(node, DATE)
 
+            # Звёзды только первого виджета рейтинга, как select_one('.fivestarWidgetStatic')
+            widgets = RATING_WIDGET(node)
+            rating = sum(1 for star in STAR(widgets[0]) if exists(star, STAR_ON)) if widgets else 0
 
             try:
                 date = datetime.strptime(date_text, '%d.%m.%Y').strftime('%Y-%m-%d %H:%M')
@@ -99,7 +91,6 @@ class GazprombankScraperIrecommend:
                 logging.exception(e)
                 date = date_text
 
-
             return {
                 'title': title,
                 'text': text,
@@ -113,55 +104,93 @@ class GazprombankScraperIrecommend:
         except Exception as e:
             logging.warning(f"Ошибка извлечения данных: {e}")
             return None
-        except Exception as e:
-            logging.info(f"Ошибка извлечения данных: {e}")
-            return None
     
+    def page_urls(self, max_pages):
+        return [f"{self.base_url}?page={page_num}" if page_num > 1 else self.base_url for page_num in range(1, max_pages + 1)]
+
+    def parse_page(self, html):
+        """Отзывы со страницы целиком: один разбор lxml, один проход по узлам"""
+        reviews = []
+        for node in REVIEW(parse_html(html)):
+            review_data = self.extract_review_data(node)
+            if review_data:
+                reviews.append(review_data)
+        return reviews
+
     def scrape_gazprombank_reviews(self, max_pages=10):
-        """Скрейпит отзывы, переходя по страницам с параметром ?page=N"""
-        base_url = "https://irecommend.ru/content/gazprombank"
+        """Скрейпит отзывы со страниц ?page=N"""
+        if self.backend == "selenium":
+            return self.scrape_with_selenium(max_pages)
+
+        logging.info(f"🔍 Загружаем {max_pages} страниц по HTTP...")
+        all_reviews = set()
+        pages = fetch_pages(self.page_urls(max_pages), rate=self.rate, concurrency=self.concurrency)
+        failed = []
+        for page_num, html in enumerate(pages, start=1):
+            if isinstance(html, FetchError):
+                logging.warning(f"⚠️ Страница {page_num} пропущена: {html}")
+                failed.append(html.url)
+                continue
+            with timed(f"Извлечение, страница {page_num}"):
+                reviews = self.parse_page(html)
+            logging.info(f"📦 Страница {page_num}: {len(reviews)} отзывов")
+            for review_data in reviews:
+                all_reviews.add(json.dumps(review_data, ensure_ascii=False))
+
+        if failed:
+            logging.error(f"❌ Не загружено {len(failed)} из {len(pages)} страниц: {', '.join(failed)}")
+        else:
+            logging.info(f"✅ Загружены все {len(pages)} страниц")
+        return [json.loads(r) for r in all_reviews]
+
+    def scrape_with_selenium(self, max_pages=10):
+        """Скрейпит отзывы через браузер, переходя по страницам с параметром ?page=N"""
         all_reviews = set()
         seen_elements = set()
 
         try:
             logging.info("🔍 Начинаем скрейпинг по страницам...")
             
-            for page_num in range(1, max_pages + 1):
-                page_url = f"{base_url}?page={page_num}" if page_num > 1 else base_url
+            for page_num, page_url in enumerate(self.page_urls(max_pages), start=1):
                 logging.info(f"📄 Переход на страницу {page_num}: {page_url}")
                 
-                self.driver.get(page_url)
-                time.sleep(2)
-                self.scroll_page()
-                time.sleep(2)
-
-                review_elements = self.driver.find_elements(By.CSS_SELECTOR, 'div.reviews-list-item')
-                logging.info(f"📦 Найдено {len(review_elements)} отзывов на странице")
-
-                for el in review_elements:
-                    el_id = el.get_attribute("outerHTML")
-                    if el_id in seen_elements:
-                        continue
-                    seen_elements.add(el_id)
-
-                    review_data = self.extract_review_data(el)
-                    if review_data:
-                        all_reviews.add(json.dumps(review_data, ensure_ascii=False))
+                timings = IterationTimings()
+                with timings.phase("загрузка"):
+                    self.driver.get(page_url)
+                    wait_until(self.driver, count_at_least(REVIEW_SELECTOR, 1), self.load_timeout, "отзывы на странице")
+                with timings.phase("прокрутка"):
+                    self.scroll_page()
+
+                with timings.phase("извлечение"):
+                    review_nodes = REVIEW(parse_html(self.driver.page_source))
+                    logging.info(f"📦 Найдено {len(review_nodes)} отзывов на странице")
+
+                    for node in review_nodes:
+                        node_id = outer_html(node)
+                        if node_id in seen_elements:
+                            continue
+                        seen_elements.add(node_id)
+
+                        review_data = self.extract_review_data(node)
+                        if review_data:
+                            all_reviews.add(json.dumps(review_data, ensure_ascii=False))
+                timings.log(f"Страница {page_num}")
 
         except Exception as e:
             logging.error(f"Ошибка при скрейпинге: {e}")
         finally:
-            self.driver.quit()
+            # Драйвер не закрываем: он возвращается в пул прогретым
+            release_driver(self.driver)
+            self.driver = None
 
         parsed_reviews = [json.loads(r) for r in all_reviews]
         return parsed_reviews
 
     def scroll_page(self):
-        """Прокрутка страницы"""
+        """Прокрутка страницы до конца и ожидание, пока догрузится ленивый контент"""
         try:
-            for i in range(3):
-                self.driver.execute_script(f"window.scrollTo(0, document.body.scrollHeight*{(i+1)/3});")
-                time.sleep(1.5)
+            scroll_to_bottom(self.driver)
+            wait_until(self.driver, network_idle(), self.idle_timeout, "сеть после прокрутки")
         except Exception as e:
             logging.exception(e)
             pass
@@ -179,7 +208,7 @@ class GazprombankScraperIrecommend:
                 return False
 
             self.driver.execute_script("arguments[0].click();", next_btn)
-            time.sleep(2)
+            wait_until(self.driver, EC.staleness_of(next_btn), self.load_timeout, "следующая страница")
             return True
 
         except Exception as e:
@@ -213,6 +242,14 @@ class GazprombankScraperIrecommend:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["http", "selenium"], default="http")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--max-pages", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=2.0, help="запросов в секунду на хост")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
     try:
         logging.basicConfig(
             level=logging.INFO,
@@ -221,10 +258,11 @@ if __name__ == "__main__":
         )
         logging.info("🚀 Запуск скрейпера Газпромбанка...")
 
-        scraper = GazprombankScraperIrecommend(headless=False)
-        
+        scraper = GazprombankScraperIrecommend(
+            headless=False, backend=args.backend, base_url=args.base_url, rate=args.rate, concurrency=args.concurrency
+        )
 
-        reviews = scraper.scrape_gazprombank_reviews(max_pages=8)
+        reviews = scraper.scrape_gazprombank_reviews(max_pages=args.max_pages)
 
         if reviews:
             df = scraper.save_results(reviews)
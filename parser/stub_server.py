@@ -0,0 +1,104 @@
+"""Local stub of the review sites for testing the HTTP fetch backend.
+
+`record` saves pages through the same fetcher the scrapers use; `serve`
+replays them from the directory, optionally with added latency and a share
+of 503 responses to exercise retries:
+
+    python stub_server.py record --dir recorded https://irecommend.ru/content/gazprombank --pages 3
+    python stub_server.py serve --dir recorded --port 8765 --latency-ms 50 --fail-rate 0.1
+    python recommend/main.py --base-url http://127.0.0.1:8765/content/gazprombank --max-pages 3
+"""
+import argparse
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+def recorded_name(url: str) -> str:
+    """Имя файла записи: путь и query без хоста, так что запись подходит для любого base-url"""
+    parts = urlsplit(url)
+    key = parts.path.strip("/") or "index"
+    if parts.query:
+        key += "?" + parts.query
+    return re.sub(r"[^\w.=-]+", "_", key) + ".html"
+
+
+def record(directory: str, base_url: str, pages: int):
+    from http_fetcher import FetchError, fetch_pages
+
+    os.makedirs(directory, exist_ok=True)
+    urls = [base_url] + [f"{base_url}?page={n}" for n in range(2, pages + 1)]
+    for url, html in zip(urls, fetch_pages(urls, rate=1.0, concurrency=2)):
+        if isinstance(html, FetchError):
+            logging.warning(f"Не записана: {html}")
+            continue
+        path = os.path.join(directory, recorded_name(url))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        logging.info(f"{url} -> {path}")
+
+
+def make_handler(directory: str, latency_ms: float, fail_rate: float, fail_first: int = 0):
+    """fail_first — сколько первых запросов к каждому пути получают 503 (детерминированно, для тестов)"""
+    attempts = Counter()
+    attempts_lock = threading.Lock()
+
+    class RecordedPages(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            with attempts_lock:
+                attempts[self.path] += 1
+                forced_failure = attempts[self.path] <= fail_first
+            if forced_failure or (fail_rate and random.random() < fail_rate):
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.end_headers()
+                return
+            path = os.path.join(directory, recorded_name(self.path))
+            if not os.path.exists(path):
+                self.send_error(404)
+                return
+            with open(path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+    return RecordedPages
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    parser = argparse.ArgumentParser(description="Record / serve review pages for the HTTP fetcher")
+    parser.add_argument("command", choices=["record", "serve"])
+    parser.add_argument("url", nargs="?", help="base url источника (для record)")
+    parser.add_argument("--dir", default="recorded")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--fail-first", type=int, default=0, help="503 на первые N запросов к каждому пути")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if not args.url:
+            parser.error("record needs a url")
+        record(args.dir, args.url, args.pages)
+    else:
+        handler = make_handler(args.dir, args.latency_ms, args.fail_rate, args.fail_first)
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+        logging.info(f"Serving {args.dir} on http://127.0.0.1:{args.port}")
+        server.serve_forever()
@@ -0,0 +1,73 @@
+"""fetch_pages против stub_server: ретраи на 503, лимит частоты, отчёт о неудачных страницах"""
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_fetcher import FetchError, fetch_pages
+from stub_server import make_handler, recorded_name
+
+PAGES = 4
+LATENCY_MS = 30
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    base = "http://stub/content/gazprombank"
+    urls = [base] + [f"{base}?page={n}" for n in range(2, PAGES + 1)]
+    for n, url in enumerate(urls, start=1):
+        (tmp_path / recorded_name(url)).write_text(f"<html><body>страница {n}</body></html>", encoding="utf-8")
+    return tmp_path
+
+
+def serve(directory, fail_first=0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(str(directory), LATENCY_MS, 0.0, fail_first))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/content/gazprombank"
+    urls = [base] + [f"{base}?page={n}" for n in range(2, PAGES + 1)]
+    return server, urls
+
+
+def test_retries_injected_503(recorded, caplog):
+    server, urls = serve(recorded, fail_first=2)
+    try:
+        with caplog.at_level("WARNING"):
+            pages = fetch_pages(urls, rate=0, concurrency=2, retries=3, backoff_base=0.01)
+    finally:
+        server.shutdown()
+
+    assert [page for page in pages if isinstance(page, FetchError)] == []
+    assert [f"страница {n}" in page for n, page in enumerate(pages, start=1)] == [True] * PAGES
+    # Две неудачные попытки на каждую страницу, каждая залогирована как ретрай
+    assert sum("HTTP 503, retry" in record.getMessage() for record in caplog.records) == 2 * PAGES
+
+
+def test_gives_up_after_retries(recorded):
+    server, urls = serve(recorded, fail_first=10)
+    try:
+        pages = fetch_pages(urls[:1], rate=0, concurrency=1, retries=2, backoff_base=0.01)
+    finally:
+        server.shutdown()
+
+    assert isinstance(pages[0], FetchError)
+    assert pages[0].url == urls[0]
+    assert "3 attempts" in str(pages[0])
+
+
+def test_rate_limit(recorded):
+    server, urls = serve(recorded)
+    rate = 10.0
+    try:
+        started = time.monotonic()
+        pages = fetch_pages(urls, rate=rate, burst=1, concurrency=4)
+        elapsed = time.monotonic() - started
+    finally:
+        server.shutdown()
+
+    assert not any(isinstance(page, FetchError) for page in pages)
+    # Первый запрос уходит сразу, остальные не чаще rate в секунду
+    assert elapsed >= (PAGES - 1) / rate
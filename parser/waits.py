@@ -0,0 +1,148 @@
+"""Condition-based waits for the Selenium scrapers.
+
+Fixed ``time.sleep`` calls are replaced by waits that return as soon as the
+page is ready. A wait can end when more reviews have been appended, when the
+network has gone quiet, or when the "Показать еще" button has become
+clickable. Every kind of wait has its own AdaptiveTimeout. The timeout
+follows the observed wait times (a smoothed average times a factor, clamped
+to [minimum, maximum]), so a fast site is crawled quickly and a slow one is
+not cut off early. IterationTimings logs where each iteration spent its
+time:
+
+    timings = IterationTimings()
+    with timings.phase("scroll"):
+        scroll_to_bottom(driver)
+        wait_until(driver, network_idle(), idle_timeout, "network idle")
+    timings.log("Итерация 1")
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+POLL_INTERVAL = 0.1
+
+COUNT_JS = "return document.querySelectorAll(arguments[0]).length;"
+# Число загруженных ресурсов и незавершённых fetch/XHR (счётчик ставит install_request_tracker)
+NETWORK_STATE_JS = """
+return [
+    document.readyState,
+    performance.getEntriesByType('resource').length,
+    window.__pendingRequests === undefined ? 0 : window.__pendingRequests,
+];
+"""
+# Оборачивает fetch и XMLHttpRequest счётчиком активных запросов; повторный вызов ничего не делает
+REQUEST_TRACKER_JS = """
+if (window.__pendingRequests !== undefined) { return; }
+window.__pendingRequests = 0;
+const done = () => { window.__pendingRequests = Math.max(0, window.__pendingRequests - 1); };
+const originalFetch = window.fetch;
+if (originalFetch) {
+    window.fetch = function () {
+        window.__pendingRequests += 1;
+        return originalFetch.apply(this, arguments).finally(done);
+    };
+}
+const originalSend = XMLHttpRequest.prototype.send;
+XMLHttpRequest.prototype.send = function () {
+    window.__pendingRequests += 1;
+    this.addEventListener('loadend', done, { once: true });
+    return originalSend.apply(this, arguments);
+};
+"""
+
+
+class AdaptiveTimeout:
+    """Таймаут ожидания, подстраивающийся под фактическое время ответа сайта"""
+
+    def __init__(self, initial=10.0, minimum=2.0, maximum=30.0, factor=3.0, alpha=0.3):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.alpha = alpha
+        self.average: Optional[float] = None
+
+    @property
+    def timeout(self) -> float:
+        if self.average is None:
+            return self.initial
+        return min(self.maximum, max(self.minimum, self.average * self.factor))
+
+    def observe(self, seconds: float):
+        self.average = seconds if self.average is None else (1 - self.alpha) * self.average + self.alpha * seconds
+
+    def expired(self):
+        """Ожидание не дождалось условия: следующий раз ждём дольше"""
+        self.average = min(self.maximum, self.timeout)
+
+
+class IterationTimings:
+    """Время по фазам одной итерации скрейпинга"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def log(self, label: str):
+        total = time.perf_counter() - self.started
+        parts = ", ".join(f"{name} {seconds:.2f}с" for name, seconds in self.phases.items())
+        logging.info(f"⏱ {label}: {total:.2f}с ({parts})")
+
+
+def wait_until(driver, condition: Callable, adaptive: AdaptiveTimeout, description: str = ""):
+    """Результат condition(driver) или None, если не дождались за adaptive.timeout"""
+    timeout = adaptive.timeout
+    started = time.perf_counter()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        adaptive.expired()
+        logging.info(f"⌛ Не дождались за {timeout:.1f}с: {description}")
+        return None
+    adaptive.observe(time.perf_counter() - started)
+    return result
+
+
+def element_count(driver, selector: str) -> int:
+    return driver.execute_script(COUNT_JS, selector)
+
+
+def count_at_least(selector: str, count: int):
+    """Условие: узлов по selector стало не меньше count"""
+    def condition(driver):
+        return element_count(driver, selector) >= count
+    return condition
+
+
+def install_request_tracker(driver):
+    driver.execute_script(REQUEST_TRACKER_JS)
+
+
+def network_idle(quiet: float = 0.5):
+    """Условие: документ загружен, активных запросов нет и новых ресурсов не было quiet секунд"""
+    state = {"resources": None, "since": None}
+
+    def condition(driver):
+        ready, resources, pending = driver.execute_script(NETWORK_STATE_JS)
+        now = time.perf_counter()
+        if ready != "complete" or pending or resources != state["resources"]:
+            state["resources"], state["since"] = resources, now
+            return False
+        return now - state["since"] >= quiet
+    return condition
+
+
+def scroll_to_bottom(driver):
+    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
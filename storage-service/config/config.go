@@ -23,8 +23,10 @@ type Config struct {
 		DropEveryRelaunch bool `mapstructure:"drop_every_relaunch"`
 	} `mapstructure:"db"`
 	Kafka struct {
-		Brokers  string `mapstructure:"brokers"`
-		GroupIDs struct {
+		Brokers    string `mapstructure:"brokers"`
+		Partitions int    `mapstructure:"partitions"`
+		Consumers  int    `mapstructure:"consumers"`
+		GroupIDs   struct {
 			ModelsService string `mapstructure:"models_service"`
 		} `mapstructure:"group_ids"`
 		Topics struct {
@@ -2,7 +2,6 @@ package messaging
 
 import (
 	"context"
-	"encoding/json"
 	"log/slog"
 	"os"
 	"strings"
@@ -18,10 +17,21 @@ type ProcessedDataEvent struct {
 	Batch []models.Datum `json:"batch"`
 }
 
+// StartConsumers запускает читателей одной consumer group; Kafka раздаёт им партиции топика,
+// поэтому больше читателей, чем партиций, смысла не имеет.
 func StartConsumers(ctx context.Context, dataStore *store.DataStore) {
-	go startTopicConsumer(ctx, ProcessedDataTopic, config.Cfg.Kafka.GroupIDs.ModelsService, func(ctx context.Context, msg kafka.Message) {
-		handleProcessedData(ctx, msg, dataStore)
-	})
+	consumers := config.Cfg.Kafka.Consumers
+	if consumers < 1 {
+		consumers = 1
+	}
+	if consumers > numPartitions() {
+		consumers = numPartitions()
+	}
+	for i := 0; i < consumers; i++ {
+		go startTopicConsumer(ctx, ProcessedDataTopic, config.Cfg.Kafka.GroupIDs.ModelsService, func(ctx context.Context, msg kafka.Message) {
+			handleProcessedData(ctx, msg, dataStore)
+		})
+	}
 }
 
 func startTopicConsumer(ctx context.Context, topic, groupID string, handler func(ctx context.Context, msg kafka.Message)) {
@@ -61,7 +71,7 @@ func startTopicConsumer(ctx context.Context, topic, groupID string, handler func
 				slog.Error("failed to read message", "topic", topic, "error", err)
 				continue
 			}
-			slog.Info("processing message", "topic", topic)
+			slog.Info("processing message", "topic", topic, "partition", m.Partition, "offset", m.Offset)
 			handler(ctx, m)
 
 			if err := r.CommitMessages(ctx, m); err != nil {
@@ -74,17 +84,17 @@ func startTopicConsumer(ctx context.Context, topic, groupID string, handler func
 func handleProcessedData(ctx context.Context, msg kafka.Message, dataStore *store.DataStore) {
 	slog.Info("handling data batch", "topic", ProcessedDataTopic)
 
-	var event ProcessedDataEvent
-	if err := json.Unmarshal(msg.Value, &event); err != nil {
-		slog.Error("failed to unmarshal Kafka message", "error", err)
+	batch, err := decodeProcessedData(msg)
+	if err != nil {
+		slog.Error("failed to decode Kafka message", "error", err)
 		return
 	}
-	slog.Info("processing batch of data", "count", len(event.Batch))
+	slog.Info("processing batch of data", "count", len(batch))
 
-	if err := dataStore.AddMany(ctx, event.Batch); err != nil {
+	if err := dataStore.AddMany(ctx, batch); err != nil {
 		slog.Error("failed to insert batch into Clickhouse", "error", err)
 		return
 	}
 
-	slog.Info("data successfully inserted into database", "count", len(event.Batch))
+	slog.Info("data successfully inserted into database", "count", len(batch))
 }
@@ -55,7 +55,7 @@ func InitTopics() {
 	for _, topic := range Topics {
 		topicConfigs = append(topicConfigs, kafka.TopicConfig{
 			Topic:             topic,
-			NumPartitions:     1,
+			NumPartitions:     numPartitions(),
 			ReplicationFactor: 1,
 		})
 	}
@@ -67,3 +67,10 @@ func InitTopics() {
 		slog.Info("topics successfully created or already exist")
 	}
 }
+
+func numPartitions() int {
+	if config.Cfg.Kafka.Partitions < 1 {
+		return 1
+	}
+	return config.Cfg.Kafka.Partitions
+}
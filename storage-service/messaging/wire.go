@@ -0,0 +1,157 @@
+package messaging
+
+import (
+	"bytes"
+	"encoding/binary"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"strings"
+	"time"
+
+	"github.com/Segun228/gazprom_feedback_analyzer_man/storage-service/models"
+	"github.com/segmentio/kafka-go"
+)
+
+// Форматы сообщений processed_data, см. model-service/wire.py.
+const (
+	contentTypeHeader = "content-type"
+	jsonContentType   = "application/json"
+	binaryContentType = "application/x-feedback-batch"
+)
+
+var (
+	binaryMagic       = []byte("FB\x01")
+	errTruncatedBatch = errors.New("truncated binary batch")
+)
+
+// decodeProcessedData выбирает формат по заголовку content-type; без заголовка
+// (старые продюсеры) сообщение считается JSON.
+func decodeProcessedData(msg kafka.Message) ([]models.Datum, error) {
+	contentType := jsonContentType
+	for _, h := range msg.Headers {
+		if strings.EqualFold(h.Key, contentTypeHeader) {
+			contentType = string(h.Value)
+			break
+		}
+	}
+
+	mediaType, params, _ := strings.Cut(contentType, ";")
+	switch strings.TrimSpace(mediaType) {
+	case jsonContentType:
+		var event ProcessedDataEvent
+		if err := json.Unmarshal(msg.Value, &event); err != nil {
+			return nil, err
+		}
+		return event.Batch, nil
+	case binaryContentType:
+		if version := strings.TrimSpace(params); version != "" && version != "v=1" {
+			return nil, fmt.Errorf("unsupported binary batch version %q", version)
+		}
+		return decodeBinaryBatch(msg.Value)
+	default:
+		return nil, fmt.Errorf("unsupported content type %q", contentType)
+	}
+}
+
+type binaryReader struct {
+	data []byte
+	pos  int
+}
+
+func (r *binaryReader) uvarint() (uint64, error) {
+	v, n := binary.Uvarint(r.data[r.pos:])
+	if n <= 0 {
+		return 0, errTruncatedBatch
+	}
+	r.pos += n
+	return v, nil
+}
+
+func (r *binaryReader) bytes() ([]byte, error) {
+	n, err := r.uvarint()
+	if err != nil {
+		return nil, err
+	}
+	if n > uint64(len(r.data)-r.pos) {
+		return nil, errTruncatedBatch
+	}
+	b := r.data[r.pos : r.pos+int(n)]
+	r.pos += int(n)
+	return b, nil
+}
+
+func decodeBinaryBatch(data []byte) ([]models.Datum, error) {
+	if !bytes.HasPrefix(data, binaryMagic) {
+		return nil, errors.New("binary batch magic mismatch")
+	}
+	r := &binaryReader{data: data, pos: len(binaryMagic)}
+
+	tagCount, err := r.uvarint()
+	if err != nil {
+		return nil, err
+	}
+	if tagCount > uint64(len(data)) {
+		return nil, errTruncatedBatch
+	}
+	dictionary := make([]string, tagCount)
+	for i := range dictionary {
+		tag, err := r.bytes()
+		if err != nil {
+			return nil, err
+		}
+		dictionary[i] = string(tag)
+	}
+
+	count, err := r.uvarint()
+	if err != nil {
+		return nil, err
+	}
+	if count > uint64(len(data)) {
+		return nil, errTruncatedBatch
+	}
+	batch := make([]models.Datum, count)
+	for i := range batch {
+		text, err := r.bytes()
+		if err != nil {
+			return nil, err
+		}
+		micros, n := binary.Varint(r.data[r.pos:])
+		if n <= 0 {
+			return nil, errTruncatedBatch
+		}
+		r.pos += n
+		if r.pos >= len(r.data) {
+			return nil, errTruncatedBatch
+		}
+		sentiment := r.data[r.pos]
+		r.pos++
+
+		tagsLen, err := r.uvarint()
+		if err != nil {
+			return nil, err
+		}
+		if tagsLen > uint64(len(data)-r.pos) {
+			return nil, errTruncatedBatch
+		}
+		tags := make([]string, tagsLen)
+		for j := range tags {
+			idx, err := r.uvarint()
+			if err != nil {
+				return nil, err
+			}
+			if idx >= uint64(len(dictionary)) {
+				return nil, fmt.Errorf("tag index %d out of range", idx)
+			}
+			tags[j] = dictionary[idx]
+		}
+
+		batch[i] = models.Datum{
+			Text:      string(text),
+			DateField: time.UnixMicro(micros).UTC(),
+			Sentiment: sentiment,
+			Tags:      tags,
+		}
+	}
+	return batch, nil
+}
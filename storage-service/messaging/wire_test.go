@@ -0,0 +1,95 @@
+package messaging
+
+import (
+	"os"
+	"reflect"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/Segun228/gazprom_feedback_analyzer_man/storage-service/models"
+	"github.com/segmentio/kafka-go"
+)
+
+// testdata/feedback_batch_v1.bin пишет model-service/tests/test_wire.py
+// (GOLDEN_MESSAGES): python -m tests.test_wire из каталога model-service.
+func goldenBatch() []models.Datum {
+	return []models.Datum{
+		{
+			Text:      "Отличный банк, кэшбек пришёл вовремя 👍",
+			DateField: time.Date(2024, 5, 1, 12, 34, 56, 789123000, time.UTC),
+			Sentiment: 2,
+			Tags:      []string{"Кэшбек", "Мобильное приложение"},
+		},
+		{
+			Text:      "",
+			DateField: time.Date(1969, 12, 31, 23, 59, 59, 999999000, time.UTC),
+			Sentiment: 0,
+			Tags:      []string{},
+		},
+		{
+			Text:      strings.Repeat("Долго ждал ответа поддержки. ", 10),
+			DateField: time.Date(2025, 1, 15, 8, 0, 0, 1000, time.UTC),
+			Sentiment: 1,
+			Tags:      []string{"Мобильное приложение", "Поддержка", "Кэшбек"},
+		},
+	}
+}
+
+func readGolden(t *testing.T) []byte {
+	t.Helper()
+	data, err := os.ReadFile("testdata/feedback_batch_v1.bin")
+	if err != nil {
+		t.Fatalf("read golden payload: %v", err)
+	}
+	return data
+}
+
+func TestDecodeBinaryBatchGolden(t *testing.T) {
+	batch, err := decodeBinaryBatch(readGolden(t))
+	if err != nil {
+		t.Fatalf("decodeBinaryBatch: %v", err)
+	}
+	want := goldenBatch()
+	if len(batch) != len(want) {
+		t.Fatalf("got %d records, want %d", len(batch), len(want))
+	}
+	for i := range want {
+		if !reflect.DeepEqual(batch[i], want[i]) {
+			t.Errorf("record %d:\n got %+v\nwant %+v", i, batch[i], want[i])
+		}
+	}
+}
+
+func TestDecodeProcessedDataByContentType(t *testing.T) {
+	binaryMsg := kafka.Message{
+		Value:   readGolden(t),
+		Headers: []kafka.Header{{Key: "Content-Type", Value: []byte("application/x-feedback-batch; v=1")}},
+	}
+	batch, err := decodeProcessedData(binaryMsg)
+	if err != nil || len(batch) != len(goldenBatch()) {
+		t.Fatalf("binary: got %d records, err %v", len(batch), err)
+	}
+
+	jsonMsg := kafka.Message{
+		Value: []byte(`{"batch": [{"text": "ок", "date": "2024-05-01T12:34:56.789123Z", "sentiment": 1, "tags": []}]}`),
+	}
+	batch, err = decodeProcessedData(jsonMsg)
+	if err != nil || len(batch) != 1 || batch[0].Text != "ок" {
+		t.Fatalf("json without header: got %+v, err %v", batch, err)
+	}
+
+	binaryMsg.Headers[0].Value = []byte("application/x-feedback-batch; v=2")
+	if _, err := decodeProcessedData(binaryMsg); err == nil {
+		t.Fatal("expected an error for an unknown binary version")
+	}
+}
+
+func TestDecodeBinaryBatchTruncated(t *testing.T) {
+	data := readGolden(t)
+	for n := len(binaryMagic); n < len(data); n++ {
+		if _, err := decodeBinaryBatch(data[:n]); err == nil {
+			t.Fatalf("prefix of %d/%d bytes decoded without an error", n, len(data))
+		}
+	}
+}